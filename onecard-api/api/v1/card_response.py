@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
+from core.rate_limit import card_response_rate_limit
+from core.resources import AppResources, get_resources
 from services.card_response import get_card_response
 from schemas.card import CardDataRequest
 from logging import getLogger
@@ -8,13 +10,15 @@ from logging_config import EndPointAdapter
 
 card_response_router = APIRouter(prefix="/api/v1", tags=["NFC tagging response"])
 
-@card_response_router.post("/card-response")
-def card_response(data:CardDataRequest, 
-                  db:Session=Depends(get_db)):
+@card_response_router.post("/card-response", dependencies=[Depends(card_response_rate_limit)])
+async def card_response(data:CardDataRequest, 
+                        db:AsyncSession=Depends(get_async_db),
+                        resources:AppResources=Depends(get_resources)):
     
     logger = getLogger(__name__)
     adapter = EndPointAdapter(logger, {"endpoint":"POST /api/v1/card-response"})
     
-    return get_card_response(data=data,  
-                             db=db,
-                             logger=adapter)
\ No newline at end of file
+    return await get_card_response(data=data,  
+                                   db=db,
+                                   resources=resources,
+                                   logger=adapter)
\ No newline at end of file
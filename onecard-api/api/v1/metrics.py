@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+from core.conn_noti_server import get_notification_pool_stats
+from core.key_pool import key_pool
+from core.crypto_executor import crypto_executor
+from core.pubkey_cache import pubkey_cache
+from core.client_registry import client_registry
+from core.token_cache import token_cache
+from core.database import get_database_pool_stats
+from core.resources import AppResources, get_resources
+from logging_config import get_log_queue_stats
+from utils.admin_auth import require_admin_token
+
+metrics_router = APIRouter(prefix="/api/v1", tags=["Monitoring"], dependencies=[Depends(require_admin_token)])
+
+@metrics_router.get("/metrics")
+def get_metrics(resources:AppResources=Depends(get_resources)):
+    """
+    Runtime statistics of shared resources held by this worker (requires ADMIN_API_TOKEN)
+    """
+    return {
+        "startup_ms" : resources.startup_ms,
+        "push_client" : get_notification_pool_stats(),
+        "key_pool" : key_pool.stats(),
+        "crypto_executor" : crypto_executor.stats(),
+        "pubkey_cache" : pubkey_cache.stats(),
+        "client_registry" : client_registry.stats(),
+        "token_cache" : token_cache.stats(),
+        "db_pool" : get_database_pool_stats(resources.db_engine),
+        "log_queue" : get_log_queue_stats()
+    }
@@ -1,12 +1,34 @@
-from fastapi import APIRouter, Query
-from services.nfc_satus import get_nfc_authentication_status
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from services.nfc_satus import get_nfc_authentication_status, open_nfc_status_stream
 from schemas.nfc import NfcStatusResponse
+from core.resources import get_redis
+import redis.asyncio as aioredis
 
 nfc_router = APIRouter(prefix="/api/v1", tags=["NFC status polling"])
 
 @nfc_router.get("/nfc-status/{attempt_id}", response_model=NfcStatusResponse)
-def nfc_status(attempt_id:str,
-               client_id:str):
+async def nfc_status(attempt_id:str,
+                     client_id:str,
+                     rd:aioredis.Redis=Depends(get_redis)):
     
-    return get_nfc_authentication_status(attempt_id=attempt_id,
-                                         client_id=client_id)
\ No newline at end of file
+    return await get_nfc_authentication_status(attempt_id=attempt_id,
+                                               client_id=client_id,
+                                               rd=rd)
+
+@nfc_router.get("/nfc-status/{attempt_id}/stream")
+async def nfc_status_stream(attempt_id:str,
+                            client_id:str,
+                            rd:aioredis.Redis=Depends(get_redis)):
+    """
+    Server-Sent Events stream of the attempt status. The polling endpoint above remains as a fallback
+    """
+    events = await open_nfc_status_stream(attempt_id=attempt_id,
+                                          client_id=client_id,
+                                          rd=rd)
+    return StreamingResponse(events,
+                             media_type="text/event-stream",
+                             headers={
+                                 "Cache-Control" : "no-cache",
+                                 "X-Accel-Buffering" : "no"
+                             })
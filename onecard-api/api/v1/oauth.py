@@ -3,27 +3,31 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from jose import JWTError
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from core.database import get_db
-from core.token import Token
+from core.database import get_async_db
+from core.token import TokenEngine
+from core.resources import AppResources, get_resources, get_redis, get_token_engine
+from core.token_cache import token_cache
+from core.rate_limit import authorize_rate_limit
 from services.init_login import init_login
 from services.get_authorization import issue_authorization_code
 from services.token_service import handle_token_request
 from services.logout import logout_user
-from utils.get_current_session import get_current_session, get_employee_from_session_id
+from utils.get_current_session import get_current_session, get_session_claims
 from schemas.userinfo import UserInfoResponse
 from logging import getLogger
+import redis.asyncio as aioredis
 from logging_config import EndPointAdapter
 
-token = Token()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/token")
 oauth_router = APIRouter(prefix="/api/v1", tags=["OAuth API"])
 templates = Jinja2Templates(directory="templates")
 
-@oauth_router.api_route("/authorize", methods=["GET", "POST"])
+@oauth_router.api_route("/authorize", methods=["GET", "POST"], dependencies=[Depends(authorize_rate_limit)])
 async def handle_authorization_flwo(request:Request,
-                                    db:Session=Depends(get_db)):
+                                    db:AsyncSession=Depends(get_async_db),
+                                    resources:AppResources=Depends(get_resources)):
     """
     Orchestrate the entire authentication / authorization flow for OIDC compatiblity
     - GET(First Time): Save parameters to session(FastAPI Session) and display employee number enrty page
@@ -56,6 +60,8 @@ async def handle_authorization_flwo(request:Request,
             redirect_uri=redirect_uri,
             state=state,
             db=db,
+            rd=resources.redis,
+            http_client=resources.http_client,
             logger=adapter
         )
         return templates.TemplateResponse("waiting.html", {
@@ -64,7 +70,7 @@ async def handle_authorization_flwo(request:Request,
             "client_id" : client_id,
             "redirect_uri" : redirect_uri,
             "state" : state,
-            "polling_interval" : 3000 # 3 seconds
+            "polling_interval" : 3000 # 3 seconds. Fallback when the status stream is unavailable
         })
     # --- Processing GET request ---
     elif request.method == "GET":
@@ -73,13 +79,14 @@ async def handle_authorization_flwo(request:Request,
         
         # If attempt_id exists (final authorization code issued after NFC success)
         if attempt_id:
-            return issue_authorization_code(
+            return await issue_authorization_code(
                 response_type=params.get("response_type"),
                 client_id=params.get("client_id"),
                 redirect_uri=params.get("redirect_uri"),
                 state=params.get("state"),
                 attempt_id=attempt_id,
                 db=db,
+                rd=resources.redis,
                 logger=adapter
             )
         # --- First entry: Display the page to enter employee number ---
@@ -124,21 +131,22 @@ async def handle_authorization_flwo(request:Request,
 #                              logger=adapter)
     
 @oauth_router.post("/token")
-def token(
+async def token(
     grant_type: str = Form(..., description="The type of grant being requested. 'authorization_code' or 'refresh_token'."),
     client_id: str = Form(..., description="The service's unique identifier."),
     client_secret: str = Form(..., description="The service's secret key."),
     redirect_uri: Optional[str] = Form(None, description="The redirection URI used in the initial authorization request."),
     code: Optional[str] = Form(None, description="The authorization code received from the authorization endpoint."),
     refresh_token: Optional[str] = Form(None, description="The refresh token issued to the client."),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_async_db),
+    resources: AppResources = Depends(get_resources)):
     """
     Handles token requests for both Authorization Code and Refresh Token grants.
     """
     logger = getLogger(__name__)
     adapter = EndPointAdapter(logger, {"endpoint":"POST /api/v1/token"})
     
-    return handle_token_request(
+    return await handle_token_request(
         grant_type=grant_type,
         client_id=client_id,
         client_secret=client_secret,
@@ -146,21 +154,26 @@ def token(
         code=code,
         refresh_token=refresh_token,
         db=db,
+        resources=resources,
         logger=adapter
     )
 
 @oauth_router.post("/logout")
-def logout(access_token:str=Depends(oauth2_scheme)):
+async def logout(access_token:str=Depends(oauth2_scheme),
+                 rd:aioredis.Redis=Depends(get_redis),
+                 token_engine:TokenEngine=Depends(get_token_engine)):
     logger = getLogger(__name__)
     adapter = EndPointAdapter(logger, {"endpoint" : "POST /api/v1/logout"})
     try:
-        payload = token.verify_token(access_token, is_refresh=False)
+        payload = token_cache.verify(access_token, token_engine.verify_token)
         s_id = payload.get("sub")
         if not s_id:
             adapter.warning(f"Invalid Session ID", extra={"payload":payload})
             raise HTTPException(status_code=401,
                                 detail="Invalid Session ID")
-        return logout_user(s_id=s_id, access_token=access_token, logger=adapter)
+        result = await logout_user(s_id=s_id, access_token=access_token, rd=rd, logger=adapter)
+        token_cache.invalidate(access_token)
+        return result
     except JWTError as je:
         logger.error(f"JWTError Occured: {str(je)}")
         raise HTTPException(status_code=401,
@@ -171,12 +184,14 @@ def logout(access_token:str=Depends(oauth2_scheme)):
                             detail="Internal Server Error")
         
 @oauth_router.get("/userinfo", response_model=UserInfoResponse)
-def get_userinfo(s_id:str=Depends(get_current_session), db:Session=Depends(get_db)):
+async def get_userinfo(s_id:str=Depends(get_current_session),
+                       db:AsyncSession=Depends(get_async_db),
+                       rd:aioredis.Redis=Depends(get_redis)):
     
-    employee = get_employee_from_session_id(s_id=s_id, db=db)
+    claims = await get_session_claims(s_id=s_id, db=db, rd=rd)
     
     return UserInfoResponse(
-        sub=employee.emp_no,
-        name=employee.name,
-        email=employee.email
+        sub=claims["sub"],
+        name=claims["name"],
+        email=claims["email"]
     )
\ No newline at end of file
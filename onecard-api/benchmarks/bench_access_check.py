@@ -0,0 +1,90 @@
+"""
+Benchmark of the init_login access check as the service's blocklist grows
+- relationship: previous check, loads Services.employees and evaluates `emp in service.employees`
+- exists: access_check_query, one row with employee existence and block status
+Run from onecard-api with its .env in place: python -m benchmarks.bench_access_check
+BENCH_DATABASE_URL selects the database (default: in-memory SQLite through aiosqlite)
+Use a scratch PostgreSQL database for realistic numbers, the tables are created and dropped
+"""
+import asyncio
+import datetime
+import statistics
+import time
+import uuid
+import os
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import selectinload
+from core.database import Base
+from models.employee import Employee
+from models.pubkey import Pubkey
+from models.permission import permission_table
+from models.service import Services, Users, RedirectUris
+from services.init_login import access_check_query
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "sqlite+aiosqlite://")
+BLOCKLIST_SIZES = [10, 100, 1000, 10000]
+ROUNDS = 200
+
+async def seed(db, service_id:int, blocked:int):
+    """
+    Block `blocked` employees from the service. The probed employee (emp_0) stays allowed
+    """
+    await db.execute(permission_table.delete())
+    await db.execute(Employee.__table__.delete())
+    await db.execute(insert(Employee), [{
+        "emp_no" : f"emp_{i}", "name" : "bench", "phone_num" : "010", "position" : "staff",
+        "department" : "bench", "birth" : datetime.date(2000, 1, 1), "email" : "bench@example.com"
+    } for i in range(blocked + 1)])
+    await db.execute(insert(permission_table), [{"service_id" : service_id, "emp_no" : f"emp_{i}"} for i in range(1, blocked + 1)])
+    await db.commit()
+
+async def relationship_check(db, client_id:str, emp_no:str)->bool:
+    emp = (await db.execute(select(Employee).where(Employee.emp_no == emp_no))).scalars().first()
+    service = (await db.execute(
+        select(Services).options(selectinload(Services.employees)).where(Services.client_id == client_id)
+    )).scalars().first()
+    return emp in service.employees
+
+async def exists_check(db, service_id:int, emp_no:str)->bool:
+    access = (await db.execute(access_check_query(service_id, emp_no))).first()
+    return access.blocked
+
+async def measure(session_factory, check, *args)->float:
+    timings = []
+    for _ in range(ROUNDS):
+        async with session_factory() as db:
+            start = time.perf_counter()
+            await check(db, *args)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+async def main():
+    engine = create_async_engine(BENCH_DATABASE_URL)
+    tables = [Users.__table__, Services.__table__, RedirectUris.__table__, Employee.__table__, Pubkey.__table__, permission_table]
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=tables)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async with session_factory() as db:
+        owner = Users(id=uuid.uuid4())
+        service = Services(client_id="bench-client", client_secret="bench-secret", owner=owner,
+                           name="bench", created_at=datetime.datetime.now())
+        db.add_all([owner, service])
+        await db.commit()
+        service_id = service.id
+
+    print(f"{'blocklist':>10} {'relationship ms':>16} {'exists ms':>10}")
+    for size in BLOCKLIST_SIZES:
+        async with session_factory() as db:
+            await seed(db, service_id, size)
+        relationship_ms = await measure(session_factory, relationship_check, "bench-client", "emp_0")
+        exists_ms = await measure(session_factory, exists_check, service_id, "emp_0")
+        print(f"{size:>10} {relationship_ms:>16.3f} {exists_ms:>10.3f}")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all, tables=tables)
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+"""
+Throughput and line size of the JSON log formatter on a login-path record
+- previous: the formatter before the compact field set (reserved keys checked against a list, absolute pathname)
+- current: logging_config.JsonFormatter
+Run from onecard-api: python -m benchmarks.bench_log_formatter
+"""
+from datetime import datetime
+import json
+import logging
+import time
+from logging_config import JsonFormatter
+
+ROUNDS = 100000
+
+class PreviousJsonFormatter(logging.Formatter):
+    def format(self, record):
+        log_record = {
+            "timestamp" : datetime.fromtimestamp(record.created).isoformat(),
+            "level" : record.levelname,
+            "message" : record.getMessage(),
+            "pathname" : record.pathname,
+            "lineno" : record.lineno
+        }
+        for key, value in record.__dict__.items():
+            if key not in log_record and key not in ['args', 'asctime', 'created', 'exc_info', 'exc_text', 'filename', 'funcName', 'levelname', 'levelno', 'lineno', 'module', 'msecs', 'message', 'msg', 'name', 'pathname', 'process', 'processName', 'relativeCreated', 'stack_info', 'thread', 'threadName']:
+                log_record[key] = value
+        if record.exc_info:
+            log_record['exception'] = self.formatException(record.exc_info)
+        return json.dumps(log_record)
+
+def login_record()->logging.LogRecord:
+    return logging.getLogger("services.init_login").makeRecord(
+        "services.init_login", logging.INFO, "/app/onecard-api/services/init_login.py", 120,
+        "Login process completed successfully", None, None,
+        extra={"endpoint" : "POST /api/v1/authorize", "service_name" : "groupware", "client_id" : "c0ffee",
+               "emp_no" : "20240001", "status" : "success", "response_time_ms" : 12.34}
+    )
+
+def run(label:str, formatter:logging.Formatter, record:logging.LogRecord):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        line = formatter.format(record)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>9}: {ROUNDS / elapsed:10.0f} records/s {len(line.encode('utf-8')):5d} bytes/line")
+
+def main():
+    record = login_record()
+    run("previous", PreviousJsonFormatter(), record)
+    run("current", JsonFormatter(), record)
+
+if __name__ == "__main__":
+    main()
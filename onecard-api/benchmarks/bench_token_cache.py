@@ -0,0 +1,32 @@
+"""
+Microbenchmark of access token verification as done by get_current_session
+- uncached: token_engine.verify_token (HMAC and claim parsing) on every call
+- cached: TokenCache.verify, a relying service calling /userinfo repeatedly with the same bearer token
+Run from onecard-api with its .env in place: python -m benchmarks.bench_token_cache
+"""
+import time
+import uuid
+from core.token import TokenEngine
+from core.token_cache import TokenCache
+
+ROUNDS = 20000
+TOKENS = 100
+
+def run(label:str, verify, tokens):
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        verify(tokens[i % len(tokens)])
+    elapsed = time.perf_counter() - start
+    print(f"{label:>10}: {elapsed / ROUNDS * 1e6:8.2f} us/call")
+
+def main():
+    token_engine = TokenEngine()
+    tokens = [token_engine.create_access_token(data={"sub" : str(uuid.uuid4())}, client_id="bench-client") for _ in range(TOKENS)]
+    cache = TokenCache(maxsize=TOKENS)
+
+    run("uncached", token_engine.verify_token, tokens)
+    run("cached", lambda t: cache.verify(t, token_engine.verify_token), tokens)
+    print(f"cache stats: {cache.stats()}")
+
+if __name__ == "__main__":
+    main()
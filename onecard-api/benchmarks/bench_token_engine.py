@@ -0,0 +1,39 @@
+"""
+Throughput of token minting and verification
+- jose: python-jose jwt.encode / jwt.decode with the secret resolved per call (previous core.token.Token)
+- engine: core.token.TokenEngine with prepared keys and cached header segments
+Run from onecard-api with its .env in place: python -m benchmarks.bench_token_engine
+"""
+from jose import jwt
+import time
+import uuid
+from core.token import TokenEngine
+
+ROUNDS = 20000
+
+def throughput(fn, items)->float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - start)
+
+def main():
+    token_engine = TokenEngine()
+    secret = "bench-secret"
+    algorithm = token_engine.ALGORITHM
+    claims = [{"sub" : str(uuid.uuid4()), "exp" : int(time.time()) + 300} for _ in range(ROUNDS)]
+
+    jose_tokens = [jwt.encode(claim, secret, algorithm=algorithm) for claim in claims]
+    engine_tokens = [token_engine.create_access_token(data={"sub" : claim["sub"]}, client_id="bench-client") for claim in claims]
+
+    results = {
+        "jose mint" : throughput(lambda claim: jwt.encode(claim, secret, algorithm=algorithm), claims),
+        "engine mint" : throughput(lambda claim: token_engine.create_access_token(data={"sub" : claim["sub"]}, client_id="bench-client"), claims),
+        "jose verify" : throughput(lambda token: jwt.decode(token, secret, algorithms=[algorithm]), jose_tokens),
+        "engine verify" : throughput(token_engine.verify_token, engine_tokens),
+    }
+    for label, ops in results.items():
+        print(f"{label:>14}: {ops:10.0f} tokens/s")
+
+if __name__ == "__main__":
+    main()
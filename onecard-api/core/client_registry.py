@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import Dict, FrozenSet, Optional, Tuple
+from models.service import Services
+import time
+import os
+
+load_dotenv()
+
+@dataclass(frozen=True)
+class RegisteredClient:
+    id:int
+    client_id:str
+    name:str
+    client_secret:str
+    redirect_uris:FrozenSet[str]
+
+class ClientRegistry:
+    """
+    In-process cache of registered OAuth clients (Services + RedirectUris) keyed by client_id.
+    Entries expire after ttl seconds and are invalidated earlier over Redis pub/sub
+    whenever onecard-web creates, edits or removes a service.
+    Unknown client_ids are cached too, so a bad client cannot force a DB query per request.
+    Args:
+    - ttl: seconds an entry is trusted without invalidation
+    - maxsize: maximum number of cached client_ids
+    """
+    def __init__(self, ttl:int, maxsize:int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries:Dict[str, Tuple[float, Optional[RegisteredClient]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, client_id:str, db:AsyncSession)->Optional[RegisteredClient]:
+        """
+        Return the registered client or None if client_id is not registered
+        """
+        entry = self._entries.get(client_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        result = await db.execute(
+            select(Services).options(selectinload(Services.redirect_uris)).where(Services.client_id == client_id)
+        )
+        service = result.scalars().first()
+        client = None
+        if service:
+            client = RegisteredClient(id=service.id,
+                                      client_id=service.client_id,
+                                      name=service.name,
+                                      client_secret=service.client_secret,
+                                      redirect_uris=frozenset(uri.uris for uri in service.redirect_uris))
+        if len(self._entries) >= self.maxsize:
+            self._evict_expired()
+        self._entries[client_id] = (time.monotonic() + self.ttl, client)
+        return client
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for client_id in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[client_id]
+        if len(self._entries) >= self.maxsize:
+            self._entries.clear()
+
+    def invalidate(self, client_id:str):
+        self._entries.pop(client_id, None)
+
+    def on_invalidate_message(self, channel:str, client_id:str):
+        """
+        Pub/sub handler of REDIS_CLIENT_INVALIDATE_CHANNEL, the message is the client_id to drop
+        """
+        self.invalidate(client_id)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self)->dict:
+        lookups = self.hits + self.misses
+        return {
+            "size" : len(self._entries),
+            "ttl" : self.ttl,
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "hit_rate" : round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+client_registry = ClientRegistry(ttl=int(os.getenv("CLIENT_REGISTRY_TTL", "300")),
+                                 maxsize=int(os.getenv("CLIENT_REGISTRY_MAX_SIZE", "10000")))
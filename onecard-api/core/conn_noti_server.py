@@ -1,9 +1,103 @@
 from fastapi import HTTPException
 import os
+import time
 import httpx
 import logging
 
-async def notification_server_communication(attempt_id:str,
+_pool_stats = {
+    "requests" : 0,
+    "requests_in_flight" : 0,
+    "requests_in_flight_max" : 0,
+    "connections_opened" : 0,
+    "connections_reused" : 0,
+    "queue_wait_ms_total" : 0.0,
+    "queue_wait_ms_max" : 0.0
+}
+
+def create_notification_client()->httpx.AsyncClient:
+    """
+    Build the keep-alive client used to reach the push notification server.
+    Pool limits and timeouts are read from the environment:
+    - PUSH_MAX_CONNECTIONS / PUSH_MAX_KEEPALIVE_CONNECTIONS / PUSH_KEEPALIVE_EXPIRY: pool limits
+    - PUSH_CONNECT_TIMEOUT / PUSH_READ_TIMEOUT / PUSH_WRITE_TIMEOUT / PUSH_POOL_TIMEOUT: seconds
+    - PUSH_HTTP2: negotiate HTTP/2 where the server supports it (requires the 'h2' package)
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("PUSH_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("PUSH_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("PUSH_KEEPALIVE_EXPIRY", "30"))
+    )
+    timeout = httpx.Timeout(
+        connect=float(os.getenv("PUSH_CONNECT_TIMEOUT", "2.0")),
+        read=float(os.getenv("PUSH_READ_TIMEOUT", "5.0")),
+        write=float(os.getenv("PUSH_WRITE_TIMEOUT", "5.0")),
+        pool=float(os.getenv("PUSH_POOL_TIMEOUT", "2.0"))
+    )
+    http2 = os.getenv("PUSH_HTTP2", "true").lower() == "true"
+    if http2:
+        try:
+            import h2 # noqa: F401
+        except ImportError:
+            logging.warning("PUSH_HTTP2 is enabled but the 'h2' package is not installed. Falling back to HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(limits=limits,
+                             timeout=timeout,
+                             http2=http2,
+                             headers={
+                                 "Content-Type" : "application/json",
+                                 "Accept" : "application/json"
+                             })
+
+def get_notification_pool_stats()->dict:
+    """
+    Report the usage of the push server client, counted around each request and by its trace hook (httpx keeps its pool private)
+    - requests: number of push requests sent
+    - requests_in_flight / requests_in_flight_max: requests currently waiting for the push server, and the peak since startup.
+      These are requests, not connections: requests queued for the pool count too, and HTTP/2 requests share one connection
+    - connections_opened / connections_reused: requests that opened a new TCP connection or were sent on a pooled one
+    - queue_wait_ms_avg / queue_wait_ms_max: time spent waiting for a free connection
+    """
+    requests = _pool_stats["requests"]
+
+    return {
+        "requests" : requests,
+        "requests_in_flight" : _pool_stats["requests_in_flight"],
+        "requests_in_flight_max" : _pool_stats["requests_in_flight_max"],
+        "connections_opened" : _pool_stats["connections_opened"],
+        "connections_reused" : _pool_stats["connections_reused"],
+        "queue_wait_ms_avg" : round(_pool_stats["queue_wait_ms_total"] / requests, 3) if requests else 0.0,
+        "queue_wait_ms_max" : round(_pool_stats["queue_wait_ms_max"], 3)
+    }
+
+def _queue_wait_tracer(started_at:float):
+    """
+    httpcore trace hook recording how long a request waited for a pooled connection,
+    and whether it was sent on a new or a reused connection.
+    The wait ends when the request opens a new connection or starts writing on a reused one.
+    """
+    recorded = False
+    connected = False
+
+    async def trace(event_name:str, info:dict):
+        nonlocal recorded, connected
+        if event_name == "connection.connect_tcp.complete":
+            connected = True
+            _pool_stats["connections_opened"] += 1
+        elif event_name.endswith("send_request_headers.started") and not connected:
+            connected = True
+            _pool_stats["connections_reused"] += 1
+        if recorded or not event_name.endswith(".started"):
+            return
+        if event_name.startswith("connection.connect_tcp") or "send_request_headers" in event_name:
+            recorded = True
+            wait_ms = (time.perf_counter() - started_at) * 1000
+            _pool_stats["queue_wait_ms_total"] += wait_ms
+            _pool_stats["queue_wait_ms_max"] = max(_pool_stats["queue_wait_ms_max"], wait_ms)
+    return trace
+
+async def notification_server_communication(client:httpx.AsyncClient,
+                                            attempt_id:str,
                                             emp_no:str,
                                             client_id:str,
                                             service_name:str,
@@ -12,6 +106,7 @@ async def notification_server_communication(attempt_id:str,
     Communicates with the notification server to send a data.
     Authentication attempt to a push notification server, which forwards data to user's mobile application.
     Args:
+    - client: application-lifetime keep-alive client (AppResources.http_client)
     - attempt_id:  attempt identification ID
     - emp_no: employee identification number
     - client_id: client_id of registered service
@@ -20,11 +115,7 @@ async def notification_server_communication(attempt_id:str,
     - JSON: response
     """
     url = str(os.getenv("PUSH_SERVER_URL"))
-    headers = {
-        "Content-Type" : "application/json",
-        "Accept" : "application/json"
-    }
-    
+
     data = {
         "message" : "OneCard Login Success",
         "attempt_id" : str(attempt_id),
@@ -34,16 +125,17 @@ async def notification_server_communication(attempt_id:str,
         "service_name" : str(service_name),
         "status" : 200
     }
+    _pool_stats["requests"] += 1
+    _pool_stats["requests_in_flight"] += 1
+    _pool_stats["requests_in_flight_max"] = max(_pool_stats["requests_in_flight_max"], _pool_stats["requests_in_flight"])
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url=url,
-                                         headers=headers,
-                                         json=data,
-                                         timeout=5.0)
-        response.raise_for_status() 
-        
+        response = await client.post(url=url,
+                                     json=data,
+                                     extensions={"trace" : _queue_wait_tracer(time.perf_counter())})
+        response.raise_for_status()
+
         return response.json()
-    
+
     except httpx.TimeoutException:
             logging.error("Notification Sever request Timeout")
             raise HTTPException(status_code=504, detail="Server Timeout: The server is not responding")
@@ -58,4 +150,6 @@ async def notification_server_communication(attempt_id:str,
             raise HTTPException(status_code=502, detail=f"Request error: {str(e)}")
     except Exception as e:
             logging.error(f"Unexpected error in push server communication: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    finally:
+        _pool_stats["requests_in_flight"] -= 1
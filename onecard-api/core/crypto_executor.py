@@ -0,0 +1,109 @@
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from dotenv import load_dotenv
+from typing import Callable, Optional
+from collections import defaultdict
+import multiprocessing
+import threading
+import asyncio
+import logging
+import time
+import os
+
+load_dotenv()
+
+def _timed_call(fn:Callable, *args):
+    """
+    Run fn inside the executor and report when it started and how long it took.
+    Defined at module level so it can be pickled for a process pool.
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, started_at, (time.perf_counter() - start) * 1000
+
+class CryptoExecutor:
+    """
+    Dedicated executor for CPU-bound cryptography (ECDH, AES).
+    Keeps card verification off the event loop and out of the shared Starlette threadpool.
+    Args:
+    - kind: 'thread' or 'process'
+    - max_workers: number of worker threads or processes
+    """
+    def __init__(self, kind:str, max_workers:int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unsupported crypto executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor:Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._timings = defaultdict(lambda: {"count" : 0, "run_ms_total" : 0.0, "run_ms_max" : 0.0, "queue_wait_ms_total" : 0.0})
+
+    def start(self):
+        with self._lock:
+            if self._executor is not None:
+                return
+            if self.kind == "process":
+                # spawn: the parent already runs threads (event loop, key pool), fork is not safe
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="crypto")
+        logging.info(f"Crypto executor started (kind:{self.kind}, workers:{self.max_workers})")
+
+    def stop(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    async def run(self, operation:str, fn:Callable, *args):
+        """
+        Run fn(*args) in the executor and await its result.
+        Args:
+        - operation: name under which the timing is recorded
+        - fn: module-level function (must be picklable for a process pool)
+        Returns:
+        - result of fn
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            result, started_at, run_ms = await loop.run_in_executor(self._executor, _timed_call, fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        with self._lock:
+            timing = self._timings[operation]
+            timing["count"] += 1
+            timing["run_ms_total"] += run_ms
+            timing["run_ms_max"] = max(timing["run_ms_max"], run_ms)
+            timing["queue_wait_ms_total"] += max(started_at - submitted_at, 0.0) * 1000
+        return result
+
+    def stats(self)->dict:
+        with self._lock:
+            operations = {
+                operation : {
+                    "count" : timing["count"],
+                    "run_ms_avg" : round(timing["run_ms_total"] / timing["count"], 3),
+                    "run_ms_max" : round(timing["run_ms_max"], 3),
+                    "queue_wait_ms_avg" : round(timing["queue_wait_ms_total"] / timing["count"], 3)
+                }
+                for operation, timing in self._timings.items() if timing["count"]
+            }
+            return {
+                "kind" : self.kind,
+                "max_workers" : self.max_workers,
+                "in_flight" : self._in_flight,
+                "queue_depth" : max(self._in_flight - self.max_workers, 0),
+                "operations" : operations
+            }
+
+crypto_executor = CryptoExecutor(kind=os.getenv("CRYPTO_EXECUTOR_KIND", "thread"),
+                                 max_workers=int(os.getenv("CRYPTO_EXECUTOR_WORKERS", "4")))
@@ -1,31 +1,69 @@
 import os
-from sqlalchemy import create_engine, exc
-from sqlalchemy.orm import declarative_base, sessionmaker
+from fastapi import Request
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import declarative_base
+from typing import AsyncIterator
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-# SQLAlchemy Engine Creation
-try:
-    engine = create_engine(DATABASE_URL)
-except exc.SQLAlchemyError as se:
-    raise se 
 
+# Pool configuration. Size the pool per worker: pool_size + max_overflow connections per uvicorn worker
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5")) # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # Seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
+def async_database_url(url:str)->str:
+    """
+    Use the asyncpg driver regardless of the driver in DATABASE_URL (postgresql://, postgresql+psycopg2://)
+    """
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+def create_database_engine()->AsyncEngine:
+    """
+    SQLAlchemy async engine (asyncpg) with the pool configured above. Created once per worker by AppResources
+    """
+    try:
+        return create_async_engine(async_database_url(DATABASE_URL),
+                                   pool_size=DB_POOL_SIZE,
+                                   max_overflow=DB_MAX_OVERFLOW,
+                                   pool_timeout=DB_POOL_TIMEOUT,
+                                   pool_recycle=DB_POOL_RECYCLE,
+                                   pool_pre_ping=DB_POOL_PRE_PING)
+    except exc.SQLAlchemyError as se:
+        raise se
+
+def create_session_factory(engine:AsyncEngine)->async_sessionmaker:
+    # expire_on_commit=False: ORM objects stay readable after the request transaction commits
+    return async_sessionmaker(bind=engine, autoflush=True, expire_on_commit=False)
 
 Base = declarative_base()
 
 # Database Connection Pooling Method
 # Transaction Manage
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-        db.commit()
-    except exc.SQLAlchemyError as se:
-        db.rollback()
-        raise se
-    finally:
-        db.close()
\ No newline at end of file
+async def get_async_db(request:Request)->AsyncIterator[AsyncSession]:
+    async with request.app.state.resources.session_factory() as db:
+        try:
+            yield db
+            await db.commit()
+        except exc.SQLAlchemyError as se:
+            await db.rollback()
+            raise se
+
+def get_database_pool_stats(engine:AsyncEngine)->dict:
+    pool = engine.pool
+    if not hasattr(pool, "size"):
+        # Pools without a fixed size (e.g. StaticPool of a local SQLite stand-in)
+        return {"status" : pool.status()}
+    return {
+        "size" : pool.size(),
+        "checked_out" : pool.checkedout(),
+        "overflow" : pool.overflow(),
+        "max_overflow" : DB_MAX_OVERFLOW,
+        "pool_timeout" : DB_POOL_TIMEOUT
+    }
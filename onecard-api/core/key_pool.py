@@ -0,0 +1,114 @@
+"""
+ECDH key pair pool of the login challenge
+onecard-app/core/key_pool.py is a vendored copy of this module (each service is built from its own directory).
+Change this file first and copy it over; tests/test_key_pool.py fails while the two copies differ.
+"""
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.backends import default_backend
+from dotenv import load_dotenv
+from typing import Tuple
+import threading
+import logging
+import queue
+import os
+
+load_dotenv()
+
+class EphemeralKeyPool:
+    """
+    Bounded pool of pre-generated SECP256R1 key pairs used for the ECDH login challenge.
+    A worker thread keeps the pool topped up so a login only pays a queue pop.
+    Every key pair is handed out exactly once and is never returned to the pool.
+    Args:
+    - size: maximum number of ready key pairs. The worker refills the pool up to this size
+    - low_watermark: the worker is woken up when the pool drops to this many key pairs
+    """
+    def __init__(self, size:int, low_watermark:int):
+        self.size = size
+        self.low_watermark = min(low_watermark, size)
+        self._keys = queue.Queue(maxsize=size)
+        self._refill = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.acquired = 0
+        self.generated = 0
+        self.dry = 0
+
+    @staticmethod
+    def generate()->Tuple[ec.EllipticCurvePrivateKey, bytes]:
+        """
+        Generate a key pair and its 65 bytes uncompressed public point (0x04 + x + y)
+        """
+        private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        public_bytes = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.X962,
+            format=serialization.PublicFormat.UncompressedPoint
+        )
+        return private_key, public_bytes
+
+    def start(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopped.clear()
+            self._refill.set()
+            self._worker = threading.Thread(target=self._run, name="ecdh-key-pool", daemon=True)
+            self._worker.start()
+        logging.info(f"ECDH key pool started (size:{self.size}, low_watermark:{self.low_watermark})")
+
+    def stop(self):
+        self._stopped.set()
+        self._refill.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._refill.wait()
+            self._refill.clear()
+            while not self._stopped.is_set() and not self._keys.full():
+                try:
+                    self._keys.put_nowait(self.generate())
+                except queue.Full:
+                    break
+                with self._lock:
+                    self.generated += 1
+
+    def acquire(self)->Tuple[ec.EllipticCurvePrivateKey, bytes]:
+        """
+        Take a ready key pair out of the pool.
+        If the pool has run dry the key pair is generated inline and the miss is counted.
+        Returns:
+        - tuple: (private key, uncompressed public key bytes)
+        """
+        try:
+            key_pair = self._keys.get_nowait()
+            dry = False
+        except queue.Empty:
+            key_pair = self.generate()
+            dry = True
+        with self._lock:
+            self.acquired += 1
+            if dry:
+                self.dry += 1
+        if self._keys.qsize() <= self.low_watermark:
+            self._refill.set()
+        return key_pair
+
+    def stats(self)->dict:
+        with self._lock:
+            return {
+                "size" : self.size,
+                "low_watermark" : self.low_watermark,
+                "available" : self._keys.qsize(),
+                "acquired" : self.acquired,
+                "generated" : self.generated,
+                "dry" : self.dry,
+                "dry_rate" : round(self.dry / self.acquired, 4) if self.acquired else 0.0
+            }
+
+key_pool = EphemeralKeyPool(size=int(os.getenv("KEY_POOL_SIZE", "64")),
+                            low_watermark=int(os.getenv("KEY_POOL_LOW_WATERMARK", "16")))
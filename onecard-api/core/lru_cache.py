@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import threading
+
+class LruCache:
+    """
+    Bounded, thread-safe LRU map with hit/miss counters, the base of the in-process caches.
+    Subclasses decide how keys are derived and how a missing value is produced; values are never None.
+    Args:
+    - maxsize: maximum number of entries kept in memory
+    """
+    def __init__(self, maxsize:int):
+        self.maxsize = maxsize
+        self._entries:"OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key:Hashable, is_fresh:Optional[Callable[[Any], bool]]=None)->Optional[Any]:
+        """
+        Return the cached value (a hit) or None (a miss). A value rejected by is_fresh is dropped and counts as a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                if is_fresh is None or is_fresh(value):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _store(self, key:Hashable, value:Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _discard(self, key:Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self)->dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size" : len(self._entries),
+                "maxsize" : self.maxsize,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "hit_rate" : round(self.hits / lookups, 4) if lookups else 0.0
+            }
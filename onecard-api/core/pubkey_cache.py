@@ -0,0 +1,26 @@
+from cryptography.hazmat.primitives.asymmetric import ec
+from dotenv import load_dotenv
+from core.lru_cache import LruCache
+import os
+
+load_dotenv()
+
+class PubkeyCache(LruCache):
+    """
+    Bounded LRU cache of parsed card public keys keyed by the Pubkey.pubkey hex.
+    Parsing includes the on-curve point validation, so it only runs once per registered card.
+    Thread-safe: lookups run inside the crypto executor threads.
+    Args:
+    - maxsize: maximum number of parsed keys kept in memory
+    """
+    def get(self, pubkey_hex:str)->ec.EllipticCurvePublicKey:
+        public_key = self._lookup(pubkey_hex)
+        if public_key is None:
+            public_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), bytes.fromhex(pubkey_hex))
+            self._store(pubkey_hex, public_key)
+        return public_key
+
+    def invalidate(self, pubkey_hex:str):
+        self._discard(pubkey_hex)
+
+pubkey_cache = PubkeyCache(maxsize=int(os.getenv("PUBKEY_CACHE_SIZE", "10000")))
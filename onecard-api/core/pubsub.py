@@ -0,0 +1,107 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+import redis.asyncio as aioredis
+import asyncio
+import inspect
+import logging
+
+RESUBSCRIBE_DELAY_MIN = 1 # Seconds before the first resubscription, doubled after every failed attempt
+RESUBSCRIBE_DELAY_MAX = 30
+
+class PubSubDispatcher:
+    """
+    Single Redis pub/sub connection per worker that dispatches messages to registered handlers.
+    Handlers receive (channel, data) as strings and may be plain functions or coroutines.
+    Register handlers with on() / on_pattern() before start(). The listening connection comes from the shared client's pool.
+    on_connect() callbacks run after every (re)subscription, since messages published while disconnected are lost.
+    The listener only stops with stop(): a failing message or handler is logged and skipped,
+    and any Redis error resubscribes with exponential backoff.
+    """
+    def __init__(self):
+        self._handlers:Dict[str, List[Callable]] = defaultdict(list)
+        self._pattern_handlers:Dict[str, List[Callable]] = defaultdict(list)
+        self._connect_callbacks:List[Callable] = []
+        self._task:Optional[asyncio.Task] = None
+        self._rd:Optional[aioredis.Redis] = None
+
+    def on(self, channel:str, handler:Callable):
+        self._handlers[channel].append(handler)
+
+    def on_pattern(self, pattern:str, handler:Callable):
+        self._pattern_handlers[pattern].append(handler)
+
+    def on_connect(self, callback:Callable):
+        self._connect_callbacks.append(callback)
+
+    async def start(self, rd:aioredis.Redis):
+        if self._task is not None or not (self._handlers or self._pattern_handlers):
+            return
+        self._rd = rd
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._rd = None
+
+    async def _listen(self):
+        delay = RESUBSCRIBE_DELAY_MIN
+        while True:
+            pubsub = self._rd.pubsub(ignore_subscribe_messages=True)
+            try:
+                if self._handlers:
+                    await pubsub.subscribe(*self._handlers.keys())
+                if self._pattern_handlers:
+                    await pubsub.psubscribe(*self._pattern_handlers.keys())
+                logging.info(f"Subscribed to Redis channels: {list(self._handlers.keys()) + list(self._pattern_handlers.keys())}")
+                delay = RESUBSCRIBE_DELAY_MIN
+                for callback in self._connect_callbacks:
+                    try:
+                        callback()
+                    except Exception:
+                        logging.exception("Pub/sub on_connect callback failed")
+                async for message in pubsub.listen():
+                    try:
+                        await self._dispatch(message)
+                    except Exception:
+                        # A malformed message must not end the subscription
+                        logging.exception(f"Failed to dispatch pub/sub message: {message!r}")
+            except asyncio.CancelledError:
+                await self._close(pubsub)
+                raise
+            except aioredis.RedisError as re:
+                logging.warning(f"Redis pub/sub failed, resubscribing in {delay}s: {str(re)}")
+            except Exception:
+                logging.exception(f"Unexpected pub/sub error, resubscribing in {delay}s")
+            await self._close(pubsub)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESUBSCRIBE_DELAY_MAX)
+
+    @staticmethod
+    async def _close(pubsub):
+        try:
+            await pubsub.aclose()
+        except (aioredis.RedisError, OSError) as e:
+            logging.debug(f"Closing the pub/sub connection failed: {str(e)}")
+
+    async def _dispatch(self, message:dict):
+        channel = message["channel"].decode('utf-8')
+        data = message["data"].decode('utf-8') if isinstance(message["data"], bytes) else str(message["data"])
+        if message["type"] == "pmessage":
+            handlers = self._pattern_handlers.get(message["pattern"].decode('utf-8'), [])
+        else:
+            handlers = self._handlers.get(channel, [])
+        for handler in handlers:
+            try:
+                result = handler(channel, data)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logging.error(f"Pub/sub handler failed for channel {channel}: {str(e)}", exc_info=True)
+
+pubsub_dispatcher = PubSubDispatcher()
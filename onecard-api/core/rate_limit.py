@@ -0,0 +1,141 @@
+from fastapi import HTTPException, Request
+from typing import Awaitable, Callable, Dict, Optional
+from logging import getLogger
+from logging_config import EndPointAdapter
+from utils.redis_const import REDIS_RATE_LIMIT_PREFIX
+from dotenv import load_dotenv
+import redis.asyncio as aioredis
+import math
+import os
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Take the client IP from the first X-Forwarded-For entry. Enable only behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+class BucketLimit:
+    """
+    Token bucket holding up to capacity requests, refilled completely over period seconds
+    Args:
+    - capacity: burst size
+    - period: seconds to refill an empty bucket
+    """
+    def __init__(self, capacity:int, period:float):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / (period * 1000) # tokens per millisecond
+
+    @classmethod
+    def from_env(cls, env_name:str, default:str)->Optional["BucketLimit"]:
+        """
+        Parse a "capacity/seconds" limit such as "5/60" ("5" means 5/60). "0", "disabled" or an empty value disables the bucket
+        A malformed value raises ValueError at import, so a typo cannot silently disable the limit
+        """
+        value = os.getenv(env_name, default).strip()
+        if value.lower() in ("", "0", "disabled"):
+            return None
+        capacity, _, period = value.partition("/")
+        try:
+            limit = cls(int(capacity), float(period or 60))
+        except (ValueError, ZeroDivisionError):
+            limit = None
+        if limit is None or limit.capacity < 1 or not 0 < limit.period < math.inf:
+            raise ValueError(f"Invalid {env_name}={value!r}, expected capacity/seconds such as 5/60, 0 or disabled")
+        return limit
+
+def client_ip(request:Request)->Optional[str]:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+class RateLimiter:
+    """
+    FastAPI dependency limiting an endpoint with one token bucket per scope (ip, client, employee)
+    All buckets of a request are checked and charged in a single Redis script call.
+    Rejected requests get 429 with Retry-After. Redis errors let the request through.
+    Args:
+    - endpoint: endpoint label used in the bucket keys and logs
+    - limits: scope name -> BucketLimit (None disables the scope)
+    - identify: coroutine returning scope name -> identifier of the request (None skips the scope)
+    """
+    def __init__(self,
+                 endpoint:str,
+                 limits:Dict[str, Optional[BucketLimit]],
+                 identify:Callable[[Request], Awaitable[Dict[str, Optional[str]]]]):
+        self.endpoint = endpoint
+        self.limits = {scope: limit for scope, limit in limits.items() if limit}
+        self.identify = identify
+        self.logger = EndPointAdapter(getLogger(__name__), {"endpoint":endpoint})
+        self._key_prefix = f"{REDIS_RATE_LIMIT_PREFIX}{endpoint.replace(' ', ':')}:"
+
+    async def __call__(self, request:Request):
+        if not RATE_LIMIT_ENABLED or not self.limits:
+            return
+        identifiers = await self.identify(request)
+        scopes, keys, args = [], [], []
+        for scope, limit in self.limits.items():
+            identifier = identifiers.get(scope)
+            if not identifier:
+                continue
+            scopes.append(scope)
+            keys.append(f"{self._key_prefix}{scope}:{identifier}")
+            args.extend([limit.capacity, repr(limit.rate)])
+        if not keys:
+            return
+        try:
+            take_tokens = request.app.state.resources.scripts.take_tokens
+            wait_ms, exhausted = await take_tokens(keys=keys, args=args)
+        except aioredis.RedisError as re:
+            self.logger.warning(f"Rate limiter unavailable, request allowed: {re}")
+            return
+        if wait_ms:
+            scope = scopes[exhausted - 1]
+            retry_after = max(1, math.ceil(wait_ms / 1000))
+            self.logger.warning("Rate limit exceeded", extra={
+                "status" : "rate_limited",
+                "scope" : scope,
+                "client_id" : identifiers.get("client"),
+                "emp_no" : identifiers.get("employee"),
+                "ip" : identifiers.get("ip"),
+                "retry_after" : retry_after
+            })
+            raise HTTPException(status_code=429,
+                                detail="Too many requests. Please try again later.",
+                                headers={"Retry-After" : str(retry_after)})
+
+async def _authorize_identifiers(request:Request)->Dict[str, Optional[str]]:
+    # Only the login attempt (POST) generates keys and sends a push
+    if request.method != "POST":
+        return {}
+    oauth_params = request.session.get('oauth_params') or {}
+    form_data = await request.form()
+    return {"ip" : client_ip(request),
+            "client" : oauth_params.get("client_id"),
+            "employee" : form_data.get("emp_no")}
+
+async def _card_response_identifiers(request:Request)->Dict[str, Optional[str]]:
+    # The body was already read and validated by FastAPI, request.json() reuses it
+    try:
+        body = await request.json()
+    except ValueError:
+        body = {}
+    return {"ip" : client_ip(request),
+            "client" : body.get("client_id") if isinstance(body, dict) else None}
+
+authorize_rate_limit = RateLimiter(
+    "POST /api/v1/authorize",
+    {"ip" : BucketLimit.from_env("RATE_LIMIT_AUTHORIZE_IP", "30/60"),
+     "client" : BucketLimit.from_env("RATE_LIMIT_AUTHORIZE_CLIENT", "600/60"),
+     "employee" : BucketLimit.from_env("RATE_LIMIT_AUTHORIZE_EMPLOYEE", "5/60")},
+    _authorize_identifiers
+)
+
+card_response_rate_limit = RateLimiter(
+    "POST /api/v1/card-response",
+    {"ip" : BucketLimit.from_env("RATE_LIMIT_CARD_RESPONSE_IP", "30/60"),
+     "client" : BucketLimit.from_env("RATE_LIMIT_CARD_RESPONSE_CLIENT", "600/60")},
+    _card_response_identifiers
+)
@@ -1,19 +1,28 @@
-import os 
+import os
 from dotenv import load_dotenv
-import redis
+import redis.asyncio as aioredis
 import logging
 
 load_dotenv()
 
-def redis_config():
+def async_redis_config():
+    """
+    Create a redis.asyncio client backed by a connection pool.
+    Commands are awaited so a slow Redis reply does not block the event loop.
+    Pool size is configurable with REDIS_MAX_CONNECTIONS (default 50).
+    """
     REDIS_HOST=os.getenv("REDIS_HOST")
     REDIS_PORT=int(os.getenv("REDIS_PORT"))
     REDIS_DATABASE=int(os.getenv("REDIS_DATABASE"))
-    
+    REDIS_MAX_CONNECTIONS=int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+
     try:
-        rd = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DATABASE)
-        logging.info("Redis Connected Successfully")
+        pool = aioredis.ConnectionPool(host=REDIS_HOST,
+                                       port=REDIS_PORT,
+                                       db=REDIS_DATABASE,
+                                       max_connections=REDIS_MAX_CONNECTIONS)
+        rd = aioredis.Redis(connection_pool=pool)
+        logging.info("Async Redis connection pool created")
         return rd
-    except redis.ConnectionError as ce:
+    except aioredis.ConnectionError as ce:
         raise ce
-    
\ No newline at end of file
@@ -0,0 +1,79 @@
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncEngine
+from core.redis import async_redis_config
+from core.database import create_database_engine, create_session_factory
+from core.conn_noti_server import create_notification_client
+from core.token import TokenEngine
+from utils.redis_scripts import (
+    CARD_RESPONSE_SUCCESS_SCRIPT,
+    TOKEN_AUTH_CODE_SCRIPT,
+    TOKEN_REFRESH_SCRIPT,
+    RATE_LIMIT_SCRIPT
+)
+import redis.asyncio as aioredis
+import httpx
+import logging
+import time
+
+class RedisScripts:
+    """
+    Lua scripts of utils.redis_scripts registered on the shared Redis client
+    """
+    def __init__(self, rd:aioredis.Redis):
+        self.complete_attempt = rd.register_script(CARD_RESPONSE_SUCCESS_SCRIPT)
+        self.redeem_auth_code = rd.register_script(TOKEN_AUTH_CODE_SCRIPT)
+        self.rotate_refresh_session = rd.register_script(TOKEN_REFRESH_SCRIPT)
+        self.take_tokens = rd.register_script(RATE_LIMIT_SCRIPT)
+
+class AppResources:
+    """
+    Connections and keys shared by every request of a worker.
+    Built once in the FastAPI lifespan (app.state.resources) and closed on shutdown.
+    Endpoints receive them through the get_* dependencies below, so tests can put local stand-ins in app.state.
+    Args:
+    - redis: redis.asyncio client, the single Redis connection pool of the worker
+    - db_engine: SQLAlchemy async engine
+    - http_client: keep-alive client of the push notification server
+    - token_engine: JWT signing and verification keys
+    """
+    def __init__(self,
+                 redis:aioredis.Redis,
+                 db_engine:AsyncEngine,
+                 http_client:httpx.AsyncClient,
+                 token_engine:TokenEngine):
+        self.redis = redis
+        self.scripts = RedisScripts(redis)
+        self.db_engine = db_engine
+        self.session_factory = create_session_factory(db_engine)
+        self.http_client = http_client
+        self.token_engine = token_engine
+        self.startup_ms = 0.0
+
+    @classmethod
+    def create(cls)->"AppResources":
+        """
+        Build every resource from the environment. No connection is opened until first use
+        """
+        start_time = time.perf_counter()
+        resources = cls(redis=async_redis_config(),
+                        db_engine=create_database_engine(),
+                        http_client=create_notification_client(),
+                        token_engine=TokenEngine())
+        resources.startup_ms = round((time.perf_counter() - start_time) * 1000, 3)
+        logging.info(f"Application resources created in {resources.startup_ms} ms")
+        return resources
+
+    async def close(self):
+        await self.http_client.aclose()
+        await self.redis.aclose(close_connection_pool=True)
+        await self.db_engine.dispose()
+        logging.info("Application resources closed")
+
+def get_resources(request:Request)->AppResources:
+    return request.app.state.resources
+
+def get_redis(request:Request)->aioredis.Redis:
+    return request.app.state.resources.redis
+
+def get_token_engine(request:Request)->TokenEngine:
+    return request.app.state.resources.token_engine
@@ -1,57 +1,356 @@
-from jose import jwt, JWTError
+from jose import JWTError
+from jose.exceptions import ExpiredSignatureError
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
 from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
 import datetime
+import binascii
+import base64
+import hashlib
+import hmac
+import json
+import time
 import os
 
 load_dotenv()
 
-class Token:
+_HMAC_DIGESTS = {"HS256" : hashlib.sha256, "HS384" : hashlib.sha384, "HS512" : hashlib.sha512}
+
+def _b64encode(data:bytes)->bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64decode(data:bytes)->bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+def _header_segment(algorithm:str, kid:Optional[str], typ:str)->bytes:
+    header = {"alg" : algorithm, "typ" : typ}
+    if kid is not None:
+        header["kid"] = kid
+    return _b64encode(json.dumps(header, separators=(",", ":"), sort_keys=True).encode('utf-8'))
+
+ACCESS_TOKEN_TYPE = "at+jwt" # JWT header typ of access tokens (RFC 9068), so no other token of ours passes as one
+DEFAULT_TOKEN_TYPE = "JWT" # JWT header typ of refresh and ID tokens
+
+class SigningKey:
+    """
+    HMAC key prepared once: the keyed hash object is copied per signature.
+    Args:
+    - kid: key id written in the JWT header (None for tokens issued before key rotation)
+    - secret: HMAC secret
+    - algorithm: HS256, HS384 or HS512
+    """
+    def __init__(self, kid:Optional[str], secret:str, algorithm:str):
+        self.kid = kid
+        self.algorithm = algorithm
+        self._mac = hmac.new(secret.encode('utf-8'), digestmod=_HMAC_DIGESTS[algorithm])
+
+    def sign(self, signing_input:bytes)->bytes:
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def verify(self, signing_input:bytes, signature:bytes)->bool:
+        return hmac.compare_digest(self.sign(signing_input), signature)
+
+class EcSigningKey:
+    """
+    ES256 (ECDSA P-256 / SHA-256) key. Relying services verify its tokens locally with the public key
+    published at /.well-known/jwks.json
+    Args:
+    - kid: key id written in the JWT header and the JWKS
+    - private_key: P-256 private key
+    """
+    algorithm = "ES256"
+
+    def __init__(self, kid:str, private_key:ec.EllipticCurvePrivateKey):
+        if not isinstance(private_key.curve, ec.SECP256R1):
+            raise ValueError(f"ES256 key {kid} must be on the P-256 curve")
+        self.kid = kid
+        self._private_key = private_key
+        self._public_key = private_key.public_key()
+
+    def sign(self, signing_input:bytes)->bytes:
+        # JWS uses the raw 64 byte r || s form instead of DER
+        r, s = decode_dss_signature(self._private_key.sign(signing_input, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    def verify(self, signing_input:bytes, signature:bytes)->bool:
+        if len(signature) != 64:
+            return False
+        der_signature = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+        try:
+            self._public_key.verify(der_signature, signing_input, ec.ECDSA(hashes.SHA256()))
+            return True
+        except InvalidSignature:
+            return False
+
+    def public_jwk(self)->dict:
+        numbers = self._public_key.public_numbers()
+        return {
+            "kty" : "EC",
+            "crv" : "P-256",
+            "use" : "sig",
+            "alg" : self.algorithm,
+            "kid" : self.kid,
+            "x" : _b64encode(numbers.x.to_bytes(32, "big")).decode('ascii'),
+            "y" : _b64encode(numbers.y.to_bytes(32, "big")).decode('ascii')
+        }
+
+    @staticmethod
+    def list_from_env(keys_env:str)->List["EcSigningKey"]:
+        """
+        keys_env: comma separated kid:PEM file path pairs, signing key first
+        (e.g. "2025b:/run/secrets/es256-2025b.pem,2025a:/run/secrets/es256-2025a.pem")
+        """
+        keys = []
+        for entry in filter(None, (entry.strip() for entry in os.getenv(keys_env, "").split(","))):
+            kid, separator, path = entry.partition(":")
+            if not separator or not kid or not path:
+                raise ValueError(f"{keys_env} entries must be kid:path")
+            with open(path, "rb") as pem:
+                keys.append(EcSigningKey(kid, serialization.load_pem_private_key(pem.read(), password=None)))
+        return keys
+
+class KeyRing:
+    """
+    Active keys of one token type. The first key signs, every key verifies.
+    Tokens without kid are verified with the legacy key, so rotation does not invalidate issued tokens.
+    Only tokens whose header typ is the ring's typ are accepted, so a key shared by two rings
+    (ES256 access and ID tokens) does not make their tokens interchangeable
+    """
+    def __init__(self, keys:List[SigningKey], legacy:Optional[SigningKey], typ:str=DEFAULT_TOKEN_TYPE):
+        self.keys = keys
+        self.legacy = legacy
+        self.typ = typ
+        # A ring of only the legacy key verifies but never signs
+        self.signing_key = keys[0] if keys else None
+        self.signing_header = _header_segment(self.signing_key.algorithm, self.signing_key.kid, typ) if keys else None
+        self._by_kid:Dict[str, SigningKey] = {key.kid: key for key in keys}
+        if len(self._by_kid) != len(keys):
+            raise ValueError(f"Duplicate kid in {[key.kid for key in keys]}")
+        # Fast path: header segments produced by this server map straight to their key
+        self._by_header:Dict[bytes, SigningKey] = {_header_segment(key.algorithm, key.kid, typ): key for key in keys}
+        if legacy is not None:
+            self._by_header[_header_segment(legacy.algorithm, None, typ)] = legacy
+
+    def lookup(self, header_segment:bytes)->SigningKey:
+        key = self._by_header.get(header_segment)
+        if key is not None:
+            return key
+        try:
+            header = json.loads(_b64decode(header_segment))
+        except (binascii.Error, ValueError):
+            raise JWTError("Error decoding token headers.")
+        if not isinstance(header, dict):
+            raise JWTError("Invalid header string: must be a json object")
+        if header.get("typ") != self.typ:
+            raise JWTError("Invalid token type")
+        if "kid" in header and not isinstance(header["kid"], str):
+            raise JWTError("Invalid kid: must be a string")
+        key = self._by_kid.get(header["kid"]) if "kid" in header else self.legacy
+        if key is None:
+            raise JWTError("Unknown signing key")
+        if header.get("alg") != key.algorithm:
+            raise JWTError("The specified alg value is not allowed")
+        return key
+
+    @classmethod
+    def from_env(cls, keys_env:str, secret_env:str, algorithm:str, typ:str=DEFAULT_TOKEN_TYPE)->"KeyRing":
+        """
+        keys_env: comma separated kid:secret pairs, signing key first (e.g. "2025b:new-secret,2025a:old-secret")
+        secret_env: single secret used before rotation. It verifies tokens without kid,
+        and signs with a kid derived from its hash when keys_env is not set
+        """
+        legacy_secret = os.getenv(secret_env)
+        keys = []
+        for entry in filter(None, (entry.strip() for entry in os.getenv(keys_env, "").split(","))):
+            kid, separator, secret = entry.partition(":")
+            if not separator or not kid or not secret:
+                raise ValueError(f"{keys_env} entries must be kid:secret")
+            keys.append(SigningKey(kid, secret, algorithm))
+        legacy = SigningKey(None, legacy_secret, algorithm) if legacy_secret else None
+        if not keys:
+            if not legacy_secret:
+                raise ValueError(f"{keys_env} or {secret_env} must be set")
+            keys.append(SigningKey(hashlib.sha256(legacy_secret.encode('utf-8')).hexdigest()[:8], legacy_secret, algorithm))
+        return cls(keys, legacy, typ)
+
+class TokenEngine:
+    """
+    Mints and verifies the JWTs of onecard-api (access, refresh and ID tokens).
+    One instance per worker, held by AppResources: env vars and keys are read once at startup.
+    Errors are raised as python-jose JWTError / ExpiredSignatureError, as before.
+    With ES256_SIGNING_KEYS set, ID tokens are signed with ES256, and access tokens too when
+    ACCESS_TOKEN_ALGORITHM=ES256, so relying services can verify them locally against the JWKS.
+    HMAC access tokens stay verifiable until they expire. Refresh tokens are only read by us and stay HMAC.
+    Access tokens carry the at+jwt header typ and the iss, aud and client_id claims (RFC 9068).
+    A relying service verifying one locally must check typ, iss and that aud is its own client_id.
+    Access tokens minted before at+jwt (typ JWT, no kid, only sub and exp, signed with ACCESS_SECRET_KEY)
+    are still accepted until they expire, so a deploy does not log every client out. No new ones are minted,
+    so after AT_EXPIRE_MINUTES this path only rejects. Refresh tokens carry the client_id they were issued to as aud.
+    """
     def __init__(self):
-        self.ACCESS_SECRET_KEY = os.getenv("ACCESS_SECRET_KEY")
-        self.REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY")
-        self.ALGORITHM = os.getenv("ALGORITHM")
+        self.ALGORITHM = os.getenv("ALGORITHM", "HS256")
+        if self.ALGORITHM not in _HMAC_DIGESTS:
+            raise ValueError(f"Unsupported ALGORITHM {self.ALGORITHM}, expected one of {list(_HMAC_DIGESTS)}")
         self.AT_EXPIRE_MINUTES = int(os.getenv("AT_EXPIRE_MINUTES"))
         self.RT_EXPIRE_MINUTES = int(os.getenv("RT_EXPIRE_MINUTES"))
-    
+        self.ISSUER = os.getenv("TOKEN_ISSUER", "onecard-api") # iss of access and ID tokens, published by OIDC discovery
+        self._access_keys = KeyRing.from_env("ACCESS_SECRET_KEYS", "ACCESS_SECRET_KEY", self.ALGORITHM, ACCESS_TOKEN_TYPE)
+        self._refresh_keys = KeyRing.from_env("REFRESH_SECRET_KEYS", "REFRESH_SECRET_KEY", self.ALGORITHM)
+        self._ec_keys = EcSigningKey.list_from_env("ES256_SIGNING_KEYS")
+        self._id_keys = KeyRing(self._ec_keys or self._access_keys.keys, None)
+        legacy_access_key = self._access_keys.legacy
+        self._legacy_access_keys = KeyRing([], legacy_access_key, DEFAULT_TOKEN_TYPE) if legacy_access_key else None
+
+        self.ACCESS_TOKEN_ALGORITHM = os.getenv("ACCESS_TOKEN_ALGORITHM", self.ALGORITHM)
+        if self.ACCESS_TOKEN_ALGORITHM == EcSigningKey.algorithm:
+            if not self._ec_keys:
+                raise ValueError("ACCESS_TOKEN_ALGORITHM=ES256 requires ES256_SIGNING_KEYS")
+            self._access_keys = KeyRing(self._ec_keys + self._access_keys.keys, self._access_keys.legacy, ACCESS_TOKEN_TYPE)
+        elif self.ACCESS_TOKEN_ALGORITHM != self.ALGORITHM:
+            raise ValueError(f"ACCESS_TOKEN_ALGORITHM must be {self.ALGORITHM} or {EcSigningKey.algorithm}")
+
+        self._jwks_body, self._jwks_etag = self._build_jwks()
+
+    def _encode(self, claims:dict, key_ring:KeyRing)->str:
+        key = key_ring.signing_key
+        signing_input = key_ring.signing_header + b"." + _b64encode(json.dumps(claims, separators=(",", ":")).encode('utf-8'))
+        return (signing_input + b"." + _b64encode(key.sign(signing_input))).decode('ascii')
+
+    def _decode(self, token:str, key_ring:KeyRing)->dict:
+        try:
+            header_segment, payload_segment, signature_segment = token.encode('ascii').split(b".")
+        except (UnicodeEncodeError, ValueError):
+            raise JWTError("Not enough segments")
+        key = key_ring.lookup(header_segment)
+        try:
+            signature = _b64decode(signature_segment)
+        except (binascii.Error, ValueError):
+            raise JWTError("Invalid crypto padding")
+        if not key.verify(header_segment + b"." + payload_segment, signature):
+            raise JWTError("Signature verification failed.")
+        try:
+            payload = json.loads(_b64decode(payload_segment))
+        except (binascii.Error, ValueError):
+            raise JWTError("Invalid payload string")
+        if not isinstance(payload, dict):
+            raise JWTError("Invalid payload string: must be a json object")
+
+        now = time.time()
+        exp = payload.get("exp")
+        if exp is not None:
+            if not isinstance(exp, (int, float)):
+                raise JWTError("Expiration Time claim (exp) must be an integer.")
+            if exp < now:
+                raise ExpiredSignatureError("Signature has expired.")
+        nbf = payload.get("nbf")
+        if isinstance(nbf, (int, float)) and nbf > now:
+            raise JWTError("The token is not yet valid (nbf)")
+        return payload
+
     def create_access_token(self,
                             data:dict,
+                            client_id:str,
                             expire_delta:datetime.timedelta=None):
+        """
+        Access token issued to client_id, which is also its audience
+        """
         to_encode = data.copy()
-        
-        if expire_delta:
-            expire = datetime.datetime.now() + expire_delta
-        else:
-            expire = datetime.datetime.now() + datetime.timedelta(minutes=self.AT_EXPIRE_MINUTES)
-        
-        to_encode.update({"exp":int(expire.timestamp())})
-        return jwt.encode(to_encode, self.ACCESS_SECRET_KEY, algorithm=self.ALGORITHM)
-    
+        now = int(time.time())
+        lifetime = expire_delta.total_seconds() if expire_delta else self.AT_EXPIRE_MINUTES * 60
+        to_encode.update({"iss" : self.ISSUER, "aud" : client_id, "client_id" : client_id,
+                          "iat" : now, "exp" : int(now + lifetime)})
+        return self._encode(to_encode, self._access_keys)
+
     def create_refresh_token(self,
-                             data:dict):
+                             data:dict,
+                             client_id:str):
+        """
+        Refresh token issued to client_id, which is also its audience
+        """
         to_encode = data.copy()
-        expire = datetime.datetime.now() + datetime.timedelta(minutes=self.RT_EXPIRE_MINUTES)
-        to_encode.update({"exp":expire})
-        return jwt.encode(to_encode, self.REFRESH_SECRET_KEY, algorithm=self.ALGORITHM)
-    
-    def verify_token(self, token:str, is_refresh:bool=False):
-        try:
-            secret_key = self.REFRESH_SECRET_KEY if is_refresh else self.ACCESS_SECRET_KEY
-            payload = jwt.decode(token, secret_key, algorithms=[self.ALGORITHM])
+        to_encode.update({"aud" : client_id, "exp" : int(time.time() + self.RT_EXPIRE_MINUTES * 60)})
+        return self._encode(to_encode, self._refresh_keys)
+
+    def verify_token(self, token:str, is_refresh:bool=False, audience:Optional[str]=None):
+        """
+        Verify an access token, or a refresh token with is_refresh
+        Args:
+        - audience: client_id the token is presented by, when known. The token must have been issued to it
+        (refresh tokens issued before they carried aud are accepted for any client until they expire)
+        """
+        if is_refresh:
+            payload = self._decode(token, self._refresh_keys)
+            if "aud" in payload:
+                self.check_audience(payload, audience)
             return payload
-        except JWTError as je:
-            raise je
-        
+        if self._is_legacy_access_token(token):
+            return self._verify_legacy_access_token(token)
+        # The access key ring only accepts the at+jwt typ, so ID and refresh tokens are refused by the header
+        payload = self._decode(token, self._access_keys)
+        if payload.get("iss") != self.ISSUER:
+            raise JWTError("Invalid issuer")
+        self.check_audience(payload, audience)
+        return payload
+
+    @staticmethod
+    def check_audience(payload:dict, audience:Optional[str]=None):
+        """
+        aud must be a client_id, and the given audience when known. Also usable on a payload served by the token cache
+        """
+        aud = payload.get("aud")
+        if not isinstance(aud, str) or (audience is not None and aud != audience):
+            raise JWTError("Invalid audience")
+
+    def _is_legacy_access_token(self, token:str)->bool:
+        if self._legacy_access_keys is None:
+            return False
+        try:
+            self._legacy_access_keys.lookup(token.partition(".")[0].encode('ascii'))
+            return True
+        except (JWTError, UnicodeEncodeError):
+            return False
+
+    def _verify_legacy_access_token(self, token:str)->dict:
+        """
+        Access token minted by python-jose before at+jwt: {"sub", "exp"} only. Pre-at+jwt ID tokens were signed
+        with the same secret and header, their other claims (aud, iat, name, email) keep them out
+        """
+        payload = self._decode(token, self._legacy_access_keys)
+        exp = payload.get("exp")
+        if set(payload) != {"sub", "exp"} or exp > time.time() + self.AT_EXPIRE_MINUTES * 60:
+            raise JWTError("Invalid token type")
+        return payload
+
     def create_id_token(self, data:dict, expire_delta:datetime.timedelta=None):
         to_encode = data.copy()
-        
-        now = datetime.datetime.now(datetime.timezone.utc)
-        if expire_delta:
-            expire = now + expire_delta
-        else:
-            expire = now + datetime.timedelta(minutes=self.AT_EXPIRE_MINUTES)
-        
-        # Added the OIDC standard claim iat(issued at)
-        to_encode.update({"iat": int(now.timestamp())})
-        to_encode.update({"exp": int(expire.timestamp())})
-        
-        return jwt.encode(to_encode, self.ACCESS_SECRET_KEY, algorithm=self.ALGORITHM)
\ No newline at end of file
+
+        now = int(time.time())
+        lifetime = expire_delta.total_seconds() if expire_delta else self.AT_EXPIRE_MINUTES * 60
+
+        # Added the OIDC standard claims iss(issuer) and iat(issued at)
+        to_encode.update({"iss": self.ISSUER})
+        to_encode.update({"iat": now})
+        to_encode.update({"exp": int(now + lifetime)})
+
+        return self._encode(to_encode, self._id_keys)
+
+    @property
+    def id_token_algorithm(self)->str:
+        return self._id_keys.signing_key.algorithm
+
+    def _build_jwks(self)->Tuple[bytes, str]:
+        body = json.dumps({"keys" : [key.public_jwk() for key in self._ec_keys]}, separators=(",", ":")).encode('utf-8')
+        return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    def jwks(self)->Tuple[bytes, str]:
+        """
+        Returns:
+        - bytes: JWKS document of the ES256 public keys (empty key list when only HMAC is configured)
+        - str: quoted ETag of the document
+        """
+        return self._jwks_body, self._jwks_etag
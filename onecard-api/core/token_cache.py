@@ -0,0 +1,40 @@
+from dotenv import load_dotenv
+from typing import Callable
+from core.lru_cache import LruCache
+import hashlib
+import time
+import os
+
+load_dotenv()
+
+class TokenCache(LruCache):
+    """
+    Bounded LRU cache of verified access token payloads keyed by the SHA-256 of the token.
+    A payload is served until the token's exp, so a hit never accepts a token that verification would reject.
+    Thread-safe, so it can also be used from sync routes running in the threadpool.
+    Args:
+    - maxsize: maximum number of cached tokens
+    """
+    @staticmethod
+    def _key(token:str)->bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def verify(self, token:str, verifier:Callable[[str], dict])->dict:
+        """
+        Return the cached payload or verify the token with verifier (raises JWTError) and cache it
+        """
+        key = self._key(token)
+        entry = self._lookup(key, is_fresh=lambda entry: entry[0] > time.time())
+        if entry is not None:
+            return dict(entry[1])
+
+        payload = verifier(token)
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            self._store(key, (float(exp), dict(payload)))
+        return payload
+
+    def invalidate(self, token:str):
+        self._discard(self._key(token))
+
+token_cache = TokenCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
@@ -1,30 +1,72 @@
 import logging
+import logging.handlers
+import atexit
+import copy
+import gzip
 import json
+import queue
+import re
+import shutil
 import sys
 import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional, Set
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Records waiting to be written. A full queue applies LOG_QUEUE_OVERFLOW instead of blocking the caller
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# drop_new: discard the record being logged / drop_oldest: discard the oldest queued record to make room
+LOG_QUEUE_OVERFLOW = os.getenv("LOG_QUEUE_OVERFLOW", "drop_new")
+# daily: new file at midnight / size: new file after LOG_MAX_BYTES / none: a single growing file
+# external: logrotate moves the file, the handler reopens it. daily and size need a single worker process
+LOG_ROTATION = os.getenv("LOG_ROTATION", "daily")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(100 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "30")) # Rotated files kept (days when daily)
+# Gzip each closed daily segment (api_access_log.jsonl.YYYY-MM-DD.gz)
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "true").lower() == "true"
+
+# Attributes every LogRecord has. Anything else on a record came from extra=
+_RESERVED_RECORD_KEYS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
 
 class JsonFormatter(logging.Formatter):
     """
     Format logs in JSON format by extending Formatter in Python logging module 
+    Compact field set: timestamp, level, message, logger, lineno and the extra fields.
+    The timestamp prefix is reused for every record of the same second
     """ 
+    def __init__(self):
+        super().__init__()
+        self._second = None
+        self._second_prefix = ""
+
+    def _timestamp(self, created:float)->str:
+        second = int(created)
+        if second != self._second:
+            self._second = second
+            self._second_prefix = datetime.fromtimestamp(second).isoformat()
+        return f"{self._second_prefix}.{int((created - second) * 1e6):06d}"
+
     def format(self, record):
         log_record = {
-            "timestamp" : datetime.fromtimestamp(record.created).isoformat(),
+            "timestamp" : self._timestamp(record.created),
             "level" : record.levelname,
             "message" : record.getMessage(),
-            "pathname" : record.pathname,
+            "logger" : record.name,
             "lineno" : record.lineno
         }
         # Merge all additional information passed as extra in record.__dict__
-        for key, value in record.__dict__.items():
-            if key not in log_record and key not in ['args', 'asctime', 'created', 'exc_info', 'exc_text', 'filename', 'funcName', 'levelname', 'levelno', 'lineno', 'module', 'msecs', 'message', 'msg', 'name', 'pathname', 'process', 'processName', 'relativeCreated', 'stack_info', 'thread', 'threadName']:
-                log_record[key] = value
+        for key in record.__dict__.keys() - _RESERVED_RECORD_KEYS:
+            log_record[key] = record.__dict__[key]
         
         if record.exc_info:
             log_record['exception'] = self.formatException(record.exc_info)
         
-        return json.dumps(log_record)
+        return json.dumps(log_record, ensure_ascii=False, separators=(',', ':'), default=str)
 
 class EndPointAdapter(logging.LoggerAdapter):
     """
@@ -36,28 +78,240 @@ class EndPointAdapter(logging.LoggerAdapter):
         kwargs['extra'] = extra
         return msg, kwargs
     
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the logging thread (request handlers, event loop).
+    Records are only copied with their message merged; JSON formatting and the disk write
+    happen in the QueueListener thread. When the queue is full the overflow policy decides
+    which record is lost, and the loss is counted.
+    Args:
+    - log_queue: bounded queue.Queue shared with the QueueListener
+    - overflow: "drop_new" or "drop_oldest"
+    """
+    def __init__(self, log_queue:queue.Queue, overflow:str="drop_new"):
+        super().__init__(log_queue)
+        if overflow not in ("drop_new", "drop_oldest"):
+            raise ValueError(f"Unsupported LOG_QUEUE_OVERFLOW {overflow}, expected drop_new or drop_oldest")
+        self.overflow = overflow
+        self.enqueued = 0
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+
+    def prepare(self, record:logging.LogRecord)->logging.LogRecord:
+        # Merge args now, they may change after the call returns. exc_info is formatted by the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record:logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+            return
+        except queue.Full:
+            pass
+        with self._drop_lock:
+            self.dropped += 1
+            if self.overflow == "drop_oldest":
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(record)
+                    self.enqueued += 1
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stats(self)->dict:
+        return {
+            "queued" : self.queue.qsize(),
+            "maxsize" : self.queue.maxsize,
+            "enqueued" : self.enqueued,
+            "dropped" : self.dropped,
+            "overflow" : self.overflow
+        }
+
+class LogQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener whose stop sentinel waits for room, so stopping with a full queue still writes every queued record
+    """
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class GzipTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    Midnight rotating handler that gzips each closed segment (api_access_log.jsonl.YYYY-MM-DD.gz) in a background thread
+    Rotation only renames the file, so the QueueListener thread keeps writing while the previous day is compressed.
+    A segment whose compression failed stays uncompressed and is retried at the next rollover;
+    retention counts days, so both forms of a segment expire after LOG_BACKUP_COUNT days
+    Args:
+    - filename: path of the current log file
+    - backupCount: rotated days kept
+    - encoding: encoding of the log file
+    """
+    def __init__(self, filename:str, backupCount:int, encoding:Optional[str]=None):
+        super().__init__(filename, when="midnight", backupCount=backupCount, encoding=encoding)
+        self._segment_pattern = re.compile(rf"^{re.escape(os.path.basename(self.baseFilename))}\.(\d{{4}}-\d{{2}}-\d{{2}})(\.gz)?$")
+        self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-gzip")
+        self._queued:Set[str] = set()
+        self._queued_lock = threading.Lock()
+        self._compress_segments()
+
+    def _segments(self)->Dict[str, List[str]]:
+        """
+        Rotated segments by day, the uncompressed form first
+        """
+        dir_name = os.path.dirname(self.baseFilename)
+        segments = defaultdict(list)
+        for name in sorted(os.listdir(dir_name)):
+            match = self._segment_pattern.match(name)
+            if match:
+                segments[match.group(1)].append(os.path.join(dir_name, name))
+        return segments
+
+    def _compress_segments(self):
+        """
+        Queue every uncompressed segment: the one just rotated and those left by a failed compression
+        """
+        for paths in self._segments().values():
+            segment = paths[0]
+            if segment.endswith(".gz"):
+                continue
+            with self._queued_lock:
+                if segment in self._queued:
+                    continue
+                self._queued.add(segment)
+            self._compressor.submit(self._compress, segment)
+
+    def _compress(self, segment:str):
+        """
+        Compress into a hidden part file and rename it, so readers never see a partial archive.
+        The segment's mtime is kept so readers can tell which days it covers
+        """
+        archive_path = f"{segment}.gz"
+        part_path = os.path.join(os.path.dirname(segment), f".{os.path.basename(archive_path)}.part")
+        try:
+            with open(segment, 'rb') as source, gzip.open(part_path, 'wb') as archive:
+                shutil.copyfileobj(source, archive)
+            shutil.copystat(segment, part_path)
+            os.replace(part_path, archive_path)
+            os.remove(segment)
+        except OSError:
+            logging.exception(f"Log segment compression failed, kept uncompressed: {segment}")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        finally:
+            with self._queued_lock:
+                self._queued.discard(segment)
+
+    def rotate(self, source:str, dest:str):
+        if os.path.exists(source):
+            os.rename(source, dest)
+        self._compress_segments()
+
+    def getFilesToDelete(self)->List[str]:
+        segments = self._segments()
+        expired_days = sorted(segments)[:max(len(segments) - self.backupCount, 0)]
+        with self._queued_lock:
+            return [path for day in expired_days for path in segments[day] if path not in self._queued]
+
+    def close(self):
+        super().close()
+        # Let the queued compressions finish, a process exit would leave them half done
+        self._compressor.shutdown(wait=True)
+
+def worker_count()->int:
+    """
+    Number of server worker processes sharing the log file, from --workers or WEB_CONCURRENCY
+    Workers are spawned with the parent's argv, so every worker sees the same count
+    """
+    for index, arg in enumerate(sys.argv):
+        value = None
+        if arg in ("--workers", "-w") and index + 1 < len(sys.argv):
+            value = sys.argv[index + 1]
+        elif arg.startswith("--workers="):
+            value = arg.split("=", 1)[1]
+        if value is not None and value.isdigit():
+            return int(value)
+    value = os.getenv("WEB_CONCURRENCY", "1")
+    return int(value) if value.isdigit() else 1
+
+def create_file_handler(log_path:str)->logging.FileHandler:
+    """
+    File handler rotating as configured by LOG_ROTATION, keeping LOG_BACKUP_COUNT rotated files
+    Daily rotation writes one segment per day, gzip-compressed once closed when LOG_COMPRESS is set
+    The rotating handlers rename the file from the process that writes it, so with several workers
+    each one would rotate on its own and overwrite the others' segments: they refuse to start then
+    """
+    if LOG_ROTATION in ("daily", "size"):
+        workers = worker_count()
+        if workers > 1:
+            raise ValueError(f"LOG_ROTATION={LOG_ROTATION} needs a single worker process, got {workers}. "
+                             "Use LOG_ROTATION=external with logrotate for several workers")
+    if LOG_ROTATION == "daily":
+        if LOG_COMPRESS:
+            return GzipTimedRotatingFileHandler(log_path, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+        return logging.handlers.TimedRotatingFileHandler(log_path, when="midnight", backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    if LOG_ROTATION == "size":
+        return logging.handlers.RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    if LOG_ROTATION == "external":
+        return logging.handlers.WatchedFileHandler(log_path, encoding="utf-8")
+    if LOG_ROTATION == "none":
+        return logging.FileHandler(log_path, mode='a', encoding="utf-8")
+    raise ValueError(f"Unsupported LOG_ROTATION {LOG_ROTATION}, expected daily, size, external or none")
+
+_queue_handler:Optional[BoundedQueueHandler] = None
+_queue_listener:Optional[LogQueueListener] = None
+
 def setup_logging():
     """
     Set up logs to be written to a file in JSON format 
+    Loggers only enqueue records; a QueueListener thread formats and writes them
     """
+    global _queue_handler, _queue_listener
     log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'logs')
     log_file = "api_access_log.jsonl"
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
     log_path = os.path.join(log_dir, log_file)
         
+    shutdown_logging()
     logging.getLogger().handlers.clear()
         
-    file_handler = logging.FileHandler(log_path, mode='a')
+    file_handler = create_file_handler(log_path)
     file_handler.setLevel(logging.INFO)
         
     formatter = JsonFormatter()
     file_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = BoundedQueueHandler(log_queue, overflow=LOG_QUEUE_OVERFLOW)
+    _queue_handler.setLevel(logging.INFO)
+    _queue_listener = LogQueueListener(log_queue, file_handler, respect_handler_level=True)
+    _queue_listener.start()
         
     logger = logging.getLogger()
-    logger.addHandler(file_handler)
+    logger.addHandler(_queue_handler)
     logger.setLevel(logging.INFO)
         
     uvicorn_logger = logging.getLogger("uvicorn")
     uvicorn_logger.propagate = False
-    uvicorn_logger.addHandler(logging.StreamHandler(sys.stdout))
\ No newline at end of file
+    uvicorn_logger.addHandler(logging.StreamHandler(sys.stdout))
+
+def shutdown_logging():
+    """
+    Write the records still queued and stop the listener thread
+    """
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        for handler in _queue_listener.handlers:
+            handler.close()
+        _queue_listener = None
+
+def get_log_queue_stats()->dict:
+    """
+    Report the log queue: records waiting, enqueued and dropped since startup
+    """
+    return _queue_handler.stats() if _queue_handler is not None else {}
+
+atexit.register(shutdown_logging)
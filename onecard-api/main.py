@@ -1,11 +1,29 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Depends
+from fastapi.responses import JSONResponse, Response
 from starlette.middleware.sessions import SessionMiddleware
+from contextlib import asynccontextmanager
 import uvicorn
 from api.v1.oauth import oauth_router
 from api.v1.nfc_polling import nfc_router
 from api.v1.card_response import card_response_router
+from api.v1.metrics import metrics_router
+from core.key_pool import key_pool
+from core.crypto_executor import crypto_executor
+from core.pubkey_cache import pubkey_cache
+from core.pubsub import pubsub_dispatcher
+from core.client_registry import client_registry
+from core.resources import AppResources, get_token_engine
+from core.token import TokenEngine
+from services.nfc_satus import on_nfc_status_message
+from utils.session_claims import on_employee_updated
+from utils.redis_const import (
+    REDIS_PUBKEY_INVALIDATE_CHANNEL,
+    REDIS_NFC_STATUS_CHANNEL_PREFIX,
+    REDIS_CLIENT_INVALIDATE_CHANNEL,
+    REDIS_EMPLOYEE_UPDATED_CHANNEL
+)
 from logging_config import setup_logging
+from functools import partial
 import os 
 from dotenv import load_dotenv
 
@@ -13,7 +31,37 @@ load_dotenv()
 
 setup_logging()
 
-app = FastAPI()
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", "3600")) # Seconds relying services may cache the JWKS
+
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    """
+    Create shared resources on startup and release them on shutdown
+    Connections (Redis, DB, push server) and token keys live in app.state.resources, see core.resources
+    Resources already placed in app.state (tests, local stand-ins) are used as is and left to their owner
+    """
+    resources = getattr(app.state, "resources", None)
+    owns_resources = resources is None
+    if owns_resources:
+        resources = AppResources.create()
+        app.state.resources = resources
+    key_pool.start()
+    crypto_executor.start()
+    pubsub_dispatcher.on(REDIS_PUBKEY_INVALIDATE_CHANNEL, lambda _, pubkey_hex: pubkey_cache.invalidate(pubkey_hex))
+    pubsub_dispatcher.on_pattern(f"{REDIS_NFC_STATUS_CHANNEL_PREFIX}*", on_nfc_status_message)
+    pubsub_dispatcher.on(REDIS_CLIENT_INVALIDATE_CHANNEL, client_registry.on_invalidate_message)
+    pubsub_dispatcher.on_connect(client_registry.clear)
+    pubsub_dispatcher.on(REDIS_EMPLOYEE_UPDATED_CHANNEL, partial(on_employee_updated, resources.redis))
+    await pubsub_dispatcher.start(resources.redis)
+    yield
+    await pubsub_dispatcher.stop()
+    crypto_executor.stop()
+    key_pool.stop()
+    if owns_resources:
+        await resources.close()
+        del app.state.resources
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     SessionMiddleware,
@@ -23,25 +71,44 @@ app.add_middleware(
 )
 
 @app.get("/.well-known/openid-configuration", tags=["OIDC discovery"])
-def get_openid_configuration(request:Request):
+def get_openid_configuration(request:Request,
+                             token_engine:TokenEngine=Depends(get_token_engine)):
     """
     OIDC discovery endpoint
     Provides standard configuration information to automatically discover authentication server's endpoint information
     """
     baseurl = str(request.base_url).rstrip('/')
     return JSONResponse({
-        "issuer" : baseurl,
+        "issuer" : token_engine.ISSUER,
         "authorization_endpoint" : f"{baseurl}/api/v1/authorize",
         "token_endpoint" : f"{baseurl}/api/v1/token",
         "userinfo_endpoint" : f"{baseurl}/api/v1/userinfo",
+        "jwks_uri" : f"{baseurl}/.well-known/jwks.json",
         "response_types_supported": ["code"],
         "subject_types_supported": ["public"],
-        "id_token_signing_alg_values_supported": ["HS256"]
+        "id_token_signing_alg_values_supported": [token_engine.id_token_algorithm]
     })
+
+@app.get("/.well-known/jwks.json", tags=["OIDC discovery"])
+def get_jwks(request:Request,
+             token_engine:TokenEngine=Depends(get_token_engine)):
+    """
+    Public keys of the ES256 signed tokens, so relying services can verify them without calling /userinfo
+    The document only changes on a key rotation (restart), so it is cacheable and answered with 304 on a matching ETag
+    """
+    body, etag = token_engine.jwks()
+    headers = {
+        "ETag" : etag,
+        "Cache-Control" : f"public, max-age={JWKS_MAX_AGE}"
+    }
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
     
 app.include_router(card_response_router)
 app.include_router(nfc_router)
 app.include_router(oauth_router)
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     uvicorn.run(app, 
@@ -1,35 +1,37 @@
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-import json
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
 import time
-from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
 from logging import LoggerAdapter
 from models.pubkey import Pubkey
+from models.employee import Employee
 from schemas.card import CardDataRequest
-from core.redis import redis_config
-from core.token import Token 
+from core.resources import AppResources
+from core.crypto_executor import crypto_executor
+from utils.card_crypto import decrypt_card_challenge
 from utils.redis_const import (
     REDIS_AUTH_ATTEMPT_PREFIX,
     REDIS_PUB_SESSION_MAP_PREFIX,
-    REDIS_SESSION_PUB_MAP_PREFIX
+    REDIS_SESSION_PUB_MAP_PREFIX,
+    REDIS_NFC_STATUS_CHANNEL_PREFIX,
+    REDIS_SESSION_CLAIMS_PREFIX,
+    REDIS_EMPLOYEE_SESSIONS_PREFIX,
+    REDIS_CARD_SESSIONS_PREFIX
 )
+from utils.attempt_store import read_attempt_fields
 
-rd = redis_config()
-token = Token()
-        
-def get_card_response(data:CardDataRequest,
-                      db:Session,
-                      logger:LoggerAdapter):
+async def get_card_response(data:CardDataRequest,
+                            db:AsyncSession,
+                            resources:AppResources,
+                            logger:LoggerAdapter):
     """
     Verify the data received from the card and decrypt the response value.
     After verification, the service server creates a session value to be used and changes the attempt status value.
     Args:
     - data: Data received after verification in the app(card_data, attempt_id, client_id)
-    - db: ORM Session
+    - db: Async ORM Session
+    - resources: shared Redis client, Lua scripts and token engine
     Returns:
     - dict: message of success
     """
@@ -40,15 +42,13 @@ def get_card_response(data:CardDataRequest,
 
     # STEP 1: Check login attempt information in Redis
     redis_attempt_key = f"{REDIS_AUTH_ATTEMPT_PREFIX}{attempt_id}"
-    raw_attempt_state = rd.get(redis_attempt_key)
+    attempt_state = await read_attempt_fields(resources.redis, redis_attempt_key,
+                                              ("status", "client_id", "emp_no", "server_private_key", "challenge"))
     
-    if not raw_attempt_state:
+    if not attempt_state:
         logger.warning("Invalid or Expired attempt_id", extra=log_extra)
         raise HTTPException(status_code=401,
                             detail="Invalid or Expired authentication attempt")
-    
-    attempt_state = json.loads(raw_attempt_state.decode('utf-8'))
-    current_ttl = rd.ttl(redis_attempt_key)
 
     # STEP 2: Check request validation 
     if attempt_state.get("status") != "pending":
@@ -63,9 +63,13 @@ def get_card_response(data:CardDataRequest,
         raise HTTPException(status_code=401,
                             detail="client_id mismatch for this attempt")
 
-    # STEP 3: Lookup employee's public key in DB
+    # STEP 3: Lookup employee's public key and the claims cached with the session in DB
     emp_no = attempt_state.get("emp_no")
-    pubkey_record = db.query(Pubkey).filter(Pubkey.emp_no == emp_no).first()
+    pubkey_record = (await db.execute(
+        select(Pubkey.pubkey, Employee.name, Employee.email)
+        .join(Employee, Employee.emp_no == Pubkey.emp_no)
+        .where(Pubkey.emp_no == emp_no)
+    )).first()
     if not pubkey_record:
         logger.warning(f"Public key not found for emp_no: {emp_no}", extra=log_extra)
         raise HTTPException(status_code=404,
@@ -73,28 +77,15 @@ def get_card_response(data:CardDataRequest,
     
     card_pubkey_hex = pubkey_record.pubkey
 
-    # STEP 4: Deriving a shared secret key and decrypting ciphertext
+    # STEP 4: Deriving a shared secret key and decrypting ciphertext in the crypto executor
+    # card_data is the challenge value encrypted and sent by the NFC card
     try:
-        server_private_key_value = int(attempt_state.get("server_private_key"), 16)
         original_challenge_bytes = bytes.fromhex(attempt_state.get("challenge"))
-        
-        server_private_key = ec.derive_private_key(server_private_key_value, ec.SECP256R1(), default_backend())
-        card_public_key_bytes = bytes.fromhex(card_pubkey_hex)
-        card_public_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), card_public_key_bytes)
-        
-        shared_secret = server_private_key.exchange(ec.ECDH(), card_public_key)
-        encryption_key = shared_secret[:16]
-
-        # card_data is the challenge value encrypted and sent by the NFC card
-        ciphertext = bytes.fromhex(data.card_data)
-        
-        cipher = Cipher(algorithms.AES(encryption_key), modes.ECB(), backend=default_backend())
-        decryptor = cipher.decryptor()
-        decrypted_padded_data = decryptor.update(ciphertext) + decryptor.finalize()
-        
-        unpadder = padding.PKCS7(128).unpadder()
-        decrypted_challenge_bytes = unpadder.update(decrypted_padded_data) + unpadder.finalize()
-
+        decrypted_challenge_bytes = await crypto_executor.run("card_decrypt",
+                                                              decrypt_card_challenge,
+                                                              attempt_state.get("server_private_key"),
+                                                              card_pubkey_hex,
+                                                              data.card_data)
     except Exception as e:
         logger.error(f"Decryption failed: {e}", extra=log_extra, exc_info=True)
         raise HTTPException(status_code=500,
@@ -106,28 +97,41 @@ def get_card_response(data:CardDataRequest,
         raise HTTPException(status_code=401, 
                             detail="Challenge mismatch. Authentication failed.")
     
-    logger.info(f"NFC authentication successful for emp_no {emp_no}", extra=log_extra)
-            
-    # STEP 6: Generate internal session ID and store mapping information in Redis
+    # STEP 6: Generate internal session ID, store mapping information and mark the attempt 'success'
+    # The script re-checks status and client_id so that only one concurrent tap can succeed
+    # and publishes the new status to browsers waiting on the status stream
     s_id = str(uuid.uuid4())
-    session_ttl = token.RT_EXPIRE_MINUTES * 60
+    session_ttl = resources.token_engine.RT_EXPIRE_MINUTES * 60
     
-    rd.setex(f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id}", session_ttl, card_pubkey_hex)
-    rd.setex(f"{REDIS_PUB_SESSION_MAP_PREFIX}{card_pubkey_hex}", session_ttl, s_id)
-    logger.debug(f"Generated Session ID {s_id}", extra=log_extra)
-             
-    # STEP 7: Update the attempt status stored in Redis to 'success'
-    attempt_state["status"] = "success"
-    attempt_state["s_id"] = s_id
+    result, current_value = await resources.scripts.complete_attempt(
+        keys=[redis_attempt_key,
+              f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id}",
+              f"{REDIS_PUB_SESSION_MAP_PREFIX}{card_pubkey_hex}",
+              f"{REDIS_SESSION_CLAIMS_PREFIX}{s_id}",
+              f"{REDIS_EMPLOYEE_SESSIONS_PREFIX}{emp_no}",
+              f"{REDIS_CARD_SESSIONS_PREFIX}{card_pubkey_hex}"],
+        args=[data.client_id, s_id, card_pubkey_hex, session_ttl, 60,
+              f"{REDIS_NFC_STATUS_CHANNEL_PREFIX}{attempt_id}",
+              emp_no, pubkey_record.name, pubkey_record.email]
+    )
+    result = result.decode('utf-8')
     
-    # Check if the Redis key has not expired and then update it.
-    if current_ttl > -2:
-        rd.setex(redis_attempt_key, max(current_ttl, 60) if current_ttl > 0 else 60,
-                 json.dumps(attempt_state))
-    else:
+    if result == "expired":
         logger.error("Attempt Key unexpectedly expired before status update", extra=log_extra)
-        raise HTTPException(status_code=500,
-                            detail="Internal state error: attempt expired prematurely.")
+        raise HTTPException(status_code=401,
+                            detail="Invalid or Expired authentication attempt")
+    if result == "not_pending":
+        log_extra["current_status"] = current_value.decode('utf-8')
+        logger.warning("Attempt ID not pending", extra=log_extra)
+        raise HTTPException(status_code=400,
+                            detail="Authentication attempt is not pending")
+    if result == "client_mismatch":
+        log_extra.update({"expected": current_value.decode('utf-8'), "received": data.client_id})
+        logger.warning("Client_id mismatch", extra=log_extra)
+        raise HTTPException(status_code=401,
+                            detail="client_id mismatch for this attempt")
+    logger.info(f"NFC authentication successful for emp_no {emp_no}", extra=log_extra)
+    logger.debug(f"Generated Session ID {s_id}", extra=log_extra)
     
     response_time_ms = (time.perf_counter() - start_time) * 1000
     log_extra["response_time_ms"] = response_time_ms
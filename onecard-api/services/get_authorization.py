@@ -1,25 +1,25 @@
 from fastapi import HTTPException
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from urllib.parse import urlencode
-from models.service import Services, RedirectUris
-from core.redis import redis_config
+from core.client_registry import client_registry
 from utils.redirect_error import redirect_with_oauth2_error
 from utils.redis_const import REDIS_AUTH_ATTEMPT_PREFIX, REDIS_AUTH_CODE_PREFIX
+from utils.attempt_store import read_attempt_fields
 from logging import LoggerAdapter
+import redis.asyncio as aioredis
 import uuid
 import json
 
-rd = redis_config()
-
-def issue_authorization_code(response_type:str,
-                             client_id:str,
-                             redirect_uri:str,
-                             state:Optional[str],
-                             attempt_id:Optional[str],
-                             db:Session,
-                             logger:LoggerAdapter):
+async def issue_authorization_code(response_type:str,
+                                   client_id:str,
+                                   redirect_uri:str,
+                                   state:Optional[str],
+                                   attempt_id:Optional[str],
+                                   db:AsyncSession,
+                                   rd:aioredis.Redis,
+                                   logger:LoggerAdapter):
     """
     The service server passes the authorization code to be called.
     Args:
@@ -28,7 +28,8 @@ def issue_authorization_code(response_type:str,
     - redirect_uri: redirect uri of the registered service server to receive the authorization code 
     - state: random values to prevent CSRF
     - attempt_id: authentication attempt identification ID
-    - db: ORM Session
+    - db: Async ORM Session
+    - rd: shared Redis client
     Returns:
     - RedirectResponse: Redirect to the redirect uri with authorization code passed as a parameter
     """
@@ -37,13 +38,8 @@ def issue_authorization_code(response_type:str,
     redis_attempt_key = None
     
     # STEP 1. client_id and redirect_uri checking validation
-    service = db.query(Services).join(
-        RedirectUris, Services.client_id==RedirectUris.client_id
-        ).filter(
-            Services.client_id==client_id,
-            RedirectUris.uris == redirect_uri
-        ).first()
-    if not service:
+    service = await client_registry.get(client_id, db)
+    if not service or redirect_uri not in service.redirect_uris:
         logger.warning(f"Authorization failed: Invalid client_id or redirect_uri")
         raise HTTPException(status_code=401,
                             detail="Invalid client_id or redirect_uri")
@@ -58,23 +54,23 @@ def issue_authorization_code(response_type:str,
     # STEP 3. User Identification - attempt_id priority processing
     if attempt_id:
         redis_attempt_key = f"{REDIS_AUTH_ATTEMPT_PREFIX}{attempt_id}"
-        attempt_state = rd.get(redis_attempt_key)
-        
-        if not attempt_state:
-            logger.warning(f"Invalid or Expire attempt_id")
-            return redirect_with_oauth2_error(redirect_uri=redirect_uri,
-                                              status_code=401,
-                                              detail="Authentication attempt expired or invalid",
-                                              state=state)
         try:
-            attempt_state = json.loads(attempt_state.decode('utf-8'))
-            logger.debug(f"Retrived attempt_state:{attempt_state}")
+            attempt_state = await read_attempt_fields(rd, redis_attempt_key,
+                                                      ("status", "client_id", "redirect_uri", "state", "s_id"))
         except json.JSONDecodeError:
             logger.warning(f"JSON decode error for {attempt_id}")
             return redirect_with_oauth2_error(redirect_uri=redirect_uri,
                                               status_code=500,
                                               detail="Internal auth state error",
                                               state=state)
+        
+        if not attempt_state:
+            logger.warning(f"Invalid or Expire attempt_id")
+            return redirect_with_oauth2_error(redirect_uri=redirect_uri,
+                                              status_code=401,
+                                              detail="Authentication attempt expired or invalid",
+                                              state=state)
+        logger.debug(f"Retrived attempt_state:{attempt_state}")
             
         if attempt_state.get("status") != "success":
             logger.warning(f"Attempt ID{attempt_id} is not success({attempt_state.get("status")})")
@@ -102,7 +98,7 @@ def issue_authorization_code(response_type:str,
                                               state=state)
         logger.debug(f"attempt_id authentication successful:{attempt_id} and s_id:{s_id}")
         
-        rd.delete(redis_attempt_key)
+        await rd.delete(redis_attempt_key)
         logger.debug(f"Deleted used attempt from Redis:{redis_attempt_key}")
     
     # STEP 4. Generating Authorization Code
@@ -118,7 +114,7 @@ def issue_authorization_code(response_type:str,
     }
     auth_code_ttl = 600 # Seconds
     redis_auth_code_key = f"{REDIS_AUTH_CODE_PREFIX}{authorization_code}"
-    rd.setex(redis_auth_code_key, auth_code_ttl, json.dumps(auth_data))
+    await rd.setex(redis_auth_code_key, auth_code_ttl, json.dumps(auth_data))
     
     # STEP 6. Redirect the user's browser to the redirect_uri of the service server
     # Includ the issued Authorization Code in the query parameter
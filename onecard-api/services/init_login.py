@@ -1,25 +1,39 @@
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, exists, Select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from core.redis import redis_config
 from core.conn_noti_server import notification_server_communication
-from models.service import Services, RedirectUris
+from core.key_pool import key_pool
+from core.client_registry import client_registry
 from models.employee import Employee
+from models.permission import permission_table
 from utils.redis_const import REDIS_AUTH_ATTEMPT_PREFIX
-from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization
+from utils.attempt_store import save_attempt
+from utils.perm_blocklist import cached_block_status, remember_employee
 from logging import LoggerAdapter
 import time
+import redis.asyncio as aioredis
+import httpx
 import uuid
-import json
 import os
-rd = redis_config()
+
+def access_check_query(service_id:int, emp_no:str)->Select:
+    """
+    Row (emp_no, blocked) if the employee exists, no row otherwise.
+    blocked is true when permission(service_id, emp_no) exists
+    """
+    blocked = exists().where(
+        permission_table.c.service_id == service_id,
+        permission_table.c.emp_no == Employee.emp_no
+    )
+    return select(Employee.emp_no, blocked.label("blocked")).where(Employee.emp_no == emp_no)
 
 async def init_login(emp_no:str,
                      client_id:str,
                      redirect_uri:str,
-                     db:Session,
+                     db:AsyncSession,
+                     rd:aioredis.Redis,
+                     http_client:httpx.AsyncClient,
                      logger:LoggerAdapter,
                      state:Optional[str]=None):
     """
@@ -29,7 +43,9 @@ async def init_login(emp_no:str,
     - client_id: client_id of registered service
     - emp_no: Personal employee number of user logging into service (used as an ID)
     - redirect_uri: redirect URI of service registered on authentication server
-    - db: ORM Session
+    - db: Async ORM Session
+    - rd: shared Redis client
+    - http_client: push notification server client
     - state: CSRF 
     - logger: LoggerAdapter-Perform logging with additional context information such as endpoints
     Returns:
@@ -37,14 +53,9 @@ async def init_login(emp_no:str,
     """
     start_time = time.perf_counter()
     
-    emp = db.query(Employee).filter(Employee.emp_no == emp_no).first()
+    service = await client_registry.get(client_id, db)
     
-    service = db.query(Services).join(RedirectUris).filter(
-        Services.client_id == RedirectUris.client_id,
-        RedirectUris.uris == redirect_uri
-    ).first()
-    
-    if not service:
+    if not service or redirect_uri not in service.redirect_uris:
         log_extra = {"client_id": client_id, "emp_no": emp_no, "status": "failed", "error_message": "Not found client_id or redirect_uri"}
         logger.warning("Not found client_id or redirect_uri", extra=log_extra)
         raise HTTPException(status_code=404,
@@ -52,15 +63,23 @@ async def init_login(emp_no:str,
     log_extra = {
         "service_name" : service.name,
         "client_id" : client_id,
-        "emp_no" : emp.emp_no,
+        "emp_no" : emp_no,
         "status" : "success"
     } 
-    if not emp:
-        log_extra.update({"status" : "failed", "error_message" : "Invalid emp_no"})
-        logger.warning("Invalid emp_no provided", extra=log_extra)
-        raise HTTPException(status_code=400,
-                            detail="Invalid emp_no")
-    if emp in service.employees:
+    # Block status from the Redis blocklist set maintained by onecard-web
+    blocked = await cached_block_status(rd, client_id, emp_no)
+    if blocked is None:
+        # Employee existence and block status in one query. The EXISTS probes the permission primary key,
+        # so its cost does not depend on the size of the service's blocklist
+        access = (await db.execute(access_check_query(service.id, emp_no))).first()
+        if not access:
+            log_extra.update({"status" : "failed", "error_message" : "Invalid emp_no"})
+            logger.warning("Invalid emp_no provided", extra=log_extra)
+            raise HTTPException(status_code=400,
+                                detail="Invalid emp_no")
+        await remember_employee(rd, emp_no)
+        blocked = access.blocked
+    if blocked:
         log_extra.update({"status" : "failed", "error_message" : "Access denied for this service"})
         logger.warning("Attempted login by a blocked employee", extra=log_extra)
         raise HTTPException(status_code=403,
@@ -69,15 +88,9 @@ async def init_login(emp_no:str,
     logger.debug(f"Generated attemp_id:{attempt_id}")
     
     # --- ECC Challenge Generating ---
-    # STEP 1. ECC key pair generate (SECP256R1)
-    private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
-    public_key = private_key.public_key()
-    
-    # STEP 2. Format the public key as 65 bytes (0x04 + x + y)
-    server_public_key = public_key.public_bytes(
-        encoding=serialization.Encoding.X962,
-        format=serialization.PublicFormat.UncompressedPoint
-    )
+    # STEP 1. Take a one-time ECC key pair (SECP256R1) from the pre-generated pool
+    # STEP 2. The public key is already formatted as 65 bytes (0x04 + x + y)
+    private_key, server_public_key = key_pool.acquire()
     
     # STEP 3. Generate a 16 byte random challenge
     challenge = os.urandom(16)
@@ -100,9 +113,10 @@ async def init_login(emp_no:str,
     logger.debug(f"Attempt State: {attempt_state}")
     attempt_ttl = 300 # Seconds
     attempt_redis_key = f"{REDIS_AUTH_ATTEMPT_PREFIX}{attempt_id}"
-    rd.setex(attempt_redis_key, attempt_ttl, json.dumps(attempt_state))
+    await save_attempt(rd, attempt_redis_key, attempt_state, attempt_ttl)
     try:
-        await notification_server_communication(attempt_id=attempt_id,
+        await notification_server_communication(client=http_client,
+                                                attempt_id=attempt_id,
                                                 emp_no=emp_no, 
                                                 client_id=client_id,
                                                 service_name=service.name,
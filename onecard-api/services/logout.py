@@ -1,17 +1,24 @@
 from logging import LoggerAdapter
-from core.redis import redis_config
-from utils.redis_const import REDIS_REFRESH_TOKEN_PREFIX, REDIS_SESSION_PUB_MAP_PREFIX, REDIS_PUB_SESSION_MAP_PREFIX
+import redis.asyncio as aioredis
+from utils.redis_const import (
+    REDIS_REFRESH_TOKEN_PREFIX,
+    REDIS_SESSION_PUB_MAP_PREFIX,
+    REDIS_PUB_SESSION_MAP_PREFIX,
+    REDIS_SESSION_CLAIMS_PREFIX,
+    REDIS_EMPLOYEE_SESSIONS_PREFIX,
+    REDIS_CARD_SESSIONS_PREFIX
+)
 
-rd = redis_config()
-
-def logout_user(s_id:str,
-                access_token:str,
-                logger:LoggerAdapter):
+async def logout_user(s_id:str,
+                      access_token:str,
+                      rd:aioredis.Redis,
+                      logger:LoggerAdapter):
     """
     Blacklist style logout
     Args:
     - s_id: User's session ID
     - access_token: Access token issued to the user
+    - rd: shared Redis client
     Returns:
     - dict: message of success
     """
@@ -21,14 +28,25 @@ def logout_user(s_id:str,
     # STEP 2. Delete refresh token and session in Redis
     refresh_token_key =  f"{REDIS_REFRESH_TOKEN_PREFIX}{s_id}"
     session_pub_key = f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id}"
+    session_claims_key = f"{REDIS_SESSION_CLAIMS_PREFIX}{s_id}"
+
+    async with rd.pipeline(transaction=False) as pipe:
+        pipe.get(session_pub_key)
+        pipe.hget(session_claims_key, "sub")
+        user_pubkey, emp_no = await pipe.execute()
+
+    async with rd.pipeline(transaction=True) as pipe:
+        pipe.delete(refresh_token_key, session_claims_key, session_pub_key)
+        if emp_no:
+            # Drop the s_id from the index used for bulk revocation
+            pipe.srem(f"{REDIS_EMPLOYEE_SESSIONS_PREFIX}{emp_no.decode('utf-8')}", s_id)
+        if user_pubkey:
+            user_pubkey = user_pubkey.decode('utf-8')
+            pipe.delete(f"{REDIS_PUB_SESSION_MAP_PREFIX}{user_pubkey}")
+            pipe.srem(f"{REDIS_CARD_SESSIONS_PREFIX}{user_pubkey}", s_id)
+        await pipe.execute()
 
-    rd.delete(refresh_token_key)
-    
-    user_pubkey = rd.get(session_pub_key)
     if user_pubkey:
-        pubkey_session_key = f"{REDIS_PUB_SESSION_MAP_PREFIX}{user_pubkey.decode('utf-8')}"
-        rd.delete(pubkey_session_key)
-        rd.delete(session_pub_key)
         logger.info("Session and RefreshToken successfully invalidated", extra={"s_id":s_id})
     else:
         logger.warning("Session key not found for s_id. Already logged out?", extra={"s_id":s_id})
@@ -37,7 +55,7 @@ def logout_user(s_id:str,
         "s_id" : s_id,
         "action" : "logout",
         "status" : "success",
-        "message" : "User logged out successfully"
+        "detail" : "User logged out successfully"
     }
     logger.info("Logout process complete", extra=log_extra)
 
@@ -1,14 +1,18 @@
 from fastapi import HTTPException
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Set
+import asyncio
 import json
 import logging
-from core.redis import redis_config
-from utils.redis_const import REDIS_AUTH_ATTEMPT_PREFIX
+import time
+import redis.asyncio as aioredis
+from utils.redis_const import REDIS_AUTH_ATTEMPT_PREFIX, REDIS_NFC_STATUS_CHANNEL_PREFIX
+from utils.attempt_store import read_attempt_fields
 from schemas.nfc import NfcStatusResponse
 
-rd = redis_config()
-
-def get_nfc_authentication_status(attempt_id:str,
-                                  client_id:str):
+async def get_nfc_authentication_status(attempt_id:str,
+                                        client_id:str,
+                                        rd:aioredis.Redis):
     """
     Polls and retireve the current status of NFC authentication attempt
     Check Redis for a given attempt_id to determine 
@@ -16,12 +20,13 @@ def get_nfc_authentication_status(attempt_id:str,
     Args:
     - attempt_id: unique identifier for login attempt
     - client_id: client_id of registered service
+    - rd: shared Redis client
     Returns:
     - NfcStatusResponse: pydantic model containig status, error, error_description
     """
     try:
         redis_attempt_key = f"{REDIS_AUTH_ATTEMPT_PREFIX}{attempt_id}"
-        attempt_state = rd.get(redis_attempt_key)
+        attempt_state = await read_attempt_fields(rd, redis_attempt_key, ("status", "client_id", "s_id", "error"))
         
         # STEP 1. attempt_id validation
         if not attempt_state:
@@ -31,8 +36,6 @@ def get_nfc_authentication_status(attempt_id:str,
                 error="attempt_expired",
                 error_description="Authentication attempt expired or not exist"
             )
-        attempt_state = json.loads(attempt_state.decode('utf-8'))
-        
         # STEP 2. Check if client_id matches
         stored_cliet_id = attempt_state.get("client_id")
         if stored_cliet_id != client_id:
@@ -54,4 +57,77 @@ def get_nfc_authentication_status(attempt_id:str,
     except Exception as e:
         logging.error(f"[/nfc-status] Unexpected Error for attempt:{str(e)}")
         raise HTTPException(status_code=500,
-                            detail="Error Occured while retrieved NFC authentication status")
\ No newline at end of file
+                            detail="Error Occured while retrieved NFC authentication status")
+
+# attempt_id -> queues of browsers currently streaming that attempt's status (per worker)
+_status_waiters:Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+TERMINAL_STATUSES = ("success", "failed", "expired")
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 300 # Same as the attempt TTL
+
+def on_nfc_status_message(channel:str, data:str):
+    """
+    Pub/sub handler for nfc_status:{attempt_id}. Wakes up every stream waiting on the attempt
+    """
+    attempt_id = channel[len(REDIS_NFC_STATUS_CHANNEL_PREFIX):]
+    for waiter in _status_waiters.get(attempt_id, ()):
+        waiter.put_nowait(data)
+
+def _status_event(status_response:NfcStatusResponse)->str:
+    return f"event: status\ndata: {status_response.model_dump_json()}\n\n"
+
+async def open_nfc_status_stream(attempt_id:str,
+                                 client_id:str,
+                                 rd:aioredis.Redis)->AsyncIterator[str]:
+    """
+    Server-Sent Events alternative to polling /nfc-status.
+    The stream is registered before the current status is read, so a status change published in between is not lost.
+    Validation errors (client_id mismatch) are raised before the response starts.
+    Args:
+    - attempt_id: unique identifier for login attempt
+    - client_id: client_id of registered service
+    - rd: shared Redis client
+    Returns:
+    - AsyncIterator: SSE formatted 'status' events, ending once a terminal status is sent
+    """
+    waiter = asyncio.Queue()
+    _status_waiters[attempt_id].add(waiter)
+    try:
+        status_response = await get_nfc_authentication_status(attempt_id=attempt_id,
+                                                              client_id=client_id,
+                                                              rd=rd)
+    except Exception:
+        _unregister_waiter(attempt_id, waiter)
+        raise
+
+    async def events():
+        try:
+            current = status_response
+            yield _status_event(current)
+            deadline = time.monotonic() + STREAM_MAX_SECONDS
+            while current.status not in TERMINAL_STATUSES and time.monotonic() < deadline:
+                try:
+                    message = await asyncio.wait_for(waiter.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                    current = NfcStatusResponse(**json.loads(message))
+                    yield _status_event(current)
+                except asyncio.TimeoutError:
+                    # Re-read the status in case a published change was missed while reconnecting
+                    latest = await get_nfc_authentication_status(attempt_id=attempt_id,
+                                                                 client_id=client_id,
+                                                                 rd=rd)
+                    if latest.status != current.status:
+                        current = latest
+                        yield _status_event(current)
+                    else:
+                        yield ": keepalive\n\n"
+        finally:
+            _unregister_waiter(attempt_id, waiter)
+
+    return events()
+
+def _unregister_waiter(attempt_id:str, waiter:asyncio.Queue):
+    waiters = _status_waiters.get(attempt_id)
+    if waiters is not None:
+        waiters.discard(waiter)
+        if not waiters:
+            del _status_waiters[attempt_id]
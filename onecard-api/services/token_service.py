@@ -1,31 +1,37 @@
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError
 from typing import Dict, Any, Optional
-from core.redis import redis_config
-from core.token import Token
-from models.service import Services
-from models.pubkey import Pubkey
-from models.employee import Employee
-from utils.redis_const import REDIS_AUTH_CODE_PREFIX, REDIS_REFRESH_TOKEN_PREFIX, REDIS_SESSION_PUB_MAP_PREFIX, REDIS_PUB_SESSION_MAP_PREFIX
-from utils.get_current_session import get_employee_from_session_id
+from core.resources import AppResources
+from core.client_registry import client_registry
+from utils.redis_const import (
+    REDIS_AUTH_CODE_PREFIX,
+    REDIS_REFRESH_TOKEN_PREFIX,
+    REDIS_SESSION_PUB_MAP_PREFIX,
+    REDIS_PUB_SESSION_MAP_PREFIX,
+    REDIS_SESSION_CLAIMS_PREFIX,
+    REDIS_EMPLOYEE_SESSIONS_PREFIX,
+    REDIS_CARD_SESSIONS_PREFIX
+)
+from utils.get_current_session import get_session_claims
 import json
 from logging import LoggerAdapter
 
-token = Token()
-rd = redis_config()
-
-def handle_token_request(grant_type:str,
-                         client_id:Optional[str],
-                         client_secret:Optional[str],
-                         redirect_uri:Optional[str],
-                         code:Optional[str],
-                         refresh_token:Optional[str],
-                         db:Session,
-                         logger:LoggerAdapter):
+async def handle_token_request(grant_type:str,
+                               client_id:Optional[str],
+                               client_secret:Optional[str],
+                               redirect_uri:Optional[str],
+                               code:Optional[str],
+                               refresh_token:Optional[str],
+                               db:AsyncSession,
+                               resources:AppResources,
+                               logger:LoggerAdapter):
     """
     Issue or renew a token.
     Branching based on grant_type.(authorization_code, refresh_token)
+    Each grant costs at most two Redis round trips: authorization_code reads the code, then runs one script
+    that consumes it, stores the refresh token, extends the session and returns the cached claims.
+    refresh_token runs one script that checks the stored token and extends the session.
     Args:
     - grant_type: 'authorization_code' : issue access token or 'refresh_token' : Toekn renewal
     - client_id: client_id of the registered service
@@ -33,7 +39,8 @@ def handle_token_request(grant_type:str,
     - redirect_uri: URI to which the authorization code is redirected
     - code: Authorization code obtained by requesting authorization code
     - refresh_token: refresh_token recevied in response to token issuance is used to refresh the access token
-    - db: ORM Session
+    - db: Async ORM Session
+    - resources: shared Redis client, Lua scripts and token engine
     - logger: 
     Returns:
     - For 'authorization_code': 
@@ -41,6 +48,8 @@ def handle_token_request(grant_type:str,
     - For 'refresh_token': 
     - token_type, access_token, expires_in, refresh_token, refresh_token_expires_in
     """
+    rd = resources.redis
+    token_engine = resources.token_engine
     try:
         # STEP 1. Branching logic based on grant_type and validation : access token
         if grant_type == "authorization_code":
@@ -52,7 +61,7 @@ def handle_token_request(grant_type:str,
                 
             # 1-2. Retrieve authorization code information from Redis
             auth_code_key = f"{REDIS_AUTH_CODE_PREFIX}{code}"
-            raw_auth_data = rd.get(auth_code_key)
+            raw_auth_data = await rd.get(auth_code_key)
             if not raw_auth_data:
                 logger.warning("Invalid or Expired authorization code")
                 raise HTTPException(status_code=400,
@@ -60,8 +69,8 @@ def handle_token_request(grant_type:str,
             
             auth_info:Dict[str, Any] = json.loads(raw_auth_data.decode('utf-8'))
             
-            # 1-3. Retrieve service information from DB and verify client_secret
-            services = db.query(Services).filter(Services.client_id == client_id).first()
+            # 1-3. Retrieve registered service information and verify client_secret
+            services = await client_registry.get(client_id, db)
             if not services or services.client_secret != client_secret:
                 logger.warning(f"Invalid client_secret for {client_id}")
                 raise HTTPException(status_code=401,
@@ -71,62 +80,57 @@ def handle_token_request(grant_type:str,
                 logger.warning("Mismatch redirect_uri")
                 raise HTTPException(status_code=400,
                                     detail="Invalid redirect_uri")
-            # 1-5. Authorization code has been used. Delete
-            rd.delete(auth_code_key)
-            
-            # 1-6. Use s_id(Sessio ID) stored in authoriation code in accesstoken/refreshtoken claim
+            # 1-5. Use s_id(Sessio ID) stored in authoriation code in accesstoken/refreshtoken claim
             s_id_for_token = auth_info.get("session")
             if not s_id_for_token:
                 logger.error(f"Session ID not include authorization code")
                 raise HTTPException(status_code=404,
                                     detail="Session ID not include authorization cde")
             
-            # 1-7 Retrieve actual user infornation(emp_no, email, name..) vis s_id
-            pubkey_hex = rd.get(f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id_for_token}")
-            if not pubkey_hex:
-                raise HTTPException(status_code=500,
-                                    detail="Failed to find user info from session id(s_id)")
-            pubkey = db.query(Pubkey).filter(Pubkey.pubkey == pubkey_hex.decode('utf-8')).first()
-            if not pubkey or not pubkey.emp_no:
-                raise HTTPException(status_code=500, 
-                                    detail="Failed to find user info from pubkey")
-                
-            employee = get_employee_from_session_id(s_id=s_id_for_token, db=db)
-            
-            # 1-8. Issue Token
+            # 1-6. Issue Token
             # sub uses internal session ID(s_id)
-            access_token = token.create_access_token(data={"sub":s_id_for_token})
-            refresh_token = token.create_refresh_token(data={"sub":s_id_for_token})
+            access_token = token_engine.create_access_token(data={"sub":s_id_for_token}, client_id=client_id)
+            refresh_token = token_engine.create_refresh_token(data={"sub":s_id_for_token}, client_id=client_id)
+            refresh_token_ttl = token_engine.RT_EXPIRE_MINUTES * 60
             
-            # 1-8. Store refresh token in Redis
-            # -- mapping: key(s_id):value(refresh_token)
-            refresh_token_redis_key = f"{REDIS_REFRESH_TOKEN_PREFIX}{s_id_for_token}"
-            refresh_token_ttl = token.RT_EXPIRE_MINUTES * 60
-            rd.setex(refresh_token_redis_key, refresh_token_ttl, refresh_token)
+            # 1-7. In one script: delete the used authorization code, store refresh token (mapping: key(s_id):value(refresh_token)),
+            # update Session TTL and retrieve actual user infornation(emp_no, email, name..) cached with the session
+            result = await resources.scripts.redeem_auth_code(
+                keys=[auth_code_key,
+                      f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id_for_token}",
+                      f"{REDIS_SESSION_CLAIMS_PREFIX}{s_id_for_token}",
+                      f"{REDIS_REFRESH_TOKEN_PREFIX}{s_id_for_token}"],
+                args=[refresh_token, refresh_token_ttl, REDIS_PUB_SESSION_MAP_PREFIX,
+                      REDIS_EMPLOYEE_SESSIONS_PREFIX, REDIS_CARD_SESSIONS_PREFIX]
+            )
+            status = result[0].decode('utf-8')
+            if status == "code_used":
+                logger.warning("Authorization code already used")
+                raise HTTPException(status_code=400,
+                                    detail="Invalid or Expired authorizatio code")
+            if status == "no_session":
+                logger.warning("Session of authorization code not found")
+                raise HTTPException(status_code=404,
+                                    detail="User session not found")
+            claims = {result[i].decode('utf-8'): result[i + 1].decode('utf-8') for i in range(1, len(result), 2)}
+            if not claims:
+                # Session opened before claims were cached
+                claims = await get_session_claims(s_id=s_id_for_token, db=db, rd=rd)
             
-            # 1-9. ID Token: OIDC standart identity information. The subject uses a persistent user identifier(emp_no)
+            # 1-8. ID Token: OIDC standart identity information. The subject uses a persistent user identifier(emp_no)
             id_token_claims = {
-                "sub" : employee.emp_no,
+                "sub" : claims["sub"],
                 "aud" : client_id,
-                "name" : employee.name,
-                "email" : employee.email
+                "name" : claims["name"],
+                "email" : claims["email"]
             }
             
-            id_token = token.create_id_token(data=id_token_claims)
+            id_token = token_engine.create_id_token(data=id_token_claims)
             
-            # 1-10. Session TTL updated
-            session_key = f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id_for_token}"
-            if rd.exists(session_key):
-                rd.expire(session_key, refresh_token_ttl)
-                raw_pubkey = rd.get(session_key)
-                if raw_pubkey:
-                    pubkey_s_id_key = f"{REDIS_PUB_SESSION_MAP_PREFIX}{raw_pubkey.decode('utf-8')}"
-                    if rd.exists(pubkey_s_id_key):
-                        rd.expire(pubkey_s_id_key, refresh_token_ttl)
             return {
                 "token_type" : "bearer",
                 "access_token" : access_token,
-                "expires_in" : token.AT_EXPIRE_MINUTES * 60,
+                "expires_in" : token_engine.AT_EXPIRE_MINUTES * 60,
                 "refresh_token" : refresh_token,
                 "refresh_token_expires_in" : refresh_token_ttl,
                 "id_token" : id_token
@@ -140,55 +144,45 @@ def handle_token_request(grant_type:str,
                 raise HTTPException(status_code=400,
                                     detail="Missing required parameters")
             
-            # 2-2. Verify client_id and client_secret in DB
-            services = db.query(Services).filter(
-                Services.client_id == client_id,
-                Services.client_secret == client_secret
-            ).first()
-            if not services:
+            # 2-2. Verify client_id and client_secret of the registered service
+            services = await client_registry.get(client_id, db)
+            if not services or services.client_secret != client_secret:
                 logger.warning("Invalid client_id or client_secret")
                 raise HTTPException(status_code=401, detail="Invalid client_id or client_secret")
 
             # 2-3. Refresh Token validation and extract s_id
             try:
-                payload = token.verify_token(token=refresh_token, is_refresh=True)
+                # A refresh token only renews the session for the client it was issued to
+                payload = token_engine.verify_token(token=refresh_token, is_refresh=True, audience=client_id)
                 s_id_for_token = payload.get("sub")
                 if not s_id_for_token:
                     logger.warning("RefreshToken payload missing sub")
                     raise HTTPException(status_code=401,
                                         detail="Invalid refresh token payload")
-                # 2-4. Verify that it matches token stored in Redis
-                stored_refresh_token_key = f"{REDIS_REFRESH_TOKEN_PREFIX}{s_id_for_token}"
-                stored_refresh_token = rd.get(stored_refresh_token_key)
-                if not stored_refresh_token or stored_refresh_token.decode('utf-8') != refresh_token:
-                    logger.warning(f"Mismatch or expired refresh token for s_id: {s_id_for_token}")
-                    rd.delete(stored_refresh_token_key) # Delete if token is invalid
-                    raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
             except JWTError as je:
                 logger.warning(f"RefreshToken payload missing sub: {je}")
                 raise HTTPException(status_code=401,
                                     detail="Invalid refresh token format")
             
+            # 2-4. Verify that it matches token stored in Redis and update Session TTL to the remaining refresh token TTL
+            result, refresh_token_ttl = await resources.scripts.rotate_refresh_session(
+                keys=[f"{REDIS_REFRESH_TOKEN_PREFIX}{s_id_for_token}",
+                      f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id_for_token}",
+                      f"{REDIS_SESSION_CLAIMS_PREFIX}{s_id_for_token}"],
+                args=[refresh_token, REDIS_PUB_SESSION_MAP_PREFIX,
+                      REDIS_EMPLOYEE_SESSIONS_PREFIX, REDIS_CARD_SESSIONS_PREFIX]
+            )
+            if result.decode('utf-8') != "ok":
+                logger.warning(f"Mismatch or expired refresh token for s_id: {s_id_for_token}")
+                raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+            
             # 2-5. Issue new access token
-            new_access_token = token.create_access_token(data={"sub":s_id_for_token})
-            refresh_token_ttl = rd.ttl(stored_refresh_token_key)
+            new_access_token = token_engine.create_access_token(data={"sub":s_id_for_token}, client_id=client_id)
             
-            # 2-6. Update Token TTL
-            if refresh_token_ttl > 0:
-                rd.expire(stored_refresh_token_key, refresh_token_ttl)
-            # 2-7. Update Session TTL
-            session_key = f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id_for_token}"
-            if rd.exists(session_key):
-                rd.expire(session_key, refresh_token_ttl)
-                raw_pubkey = rd.get(session_key)
-                if raw_pubkey:
-                    pubkey_s_id_key = f"{REDIS_PUB_SESSION_MAP_PREFIX}{raw_pubkey.decode('utf-8')}"
-                    if rd.exists(pubkey_s_id_key):
-                        rd.expire(pubkey_s_id_key, refresh_token_ttl)
             return {
                 "token_type" : "bearer",
                 "access_token" : new_access_token,
-                "expires_in" : token.AT_EXPIRE_MINUTES * 60,
+                "expires_in" : token_engine.AT_EXPIRE_MINUTES * 60,
                 "refresh_token" : refresh_token,
                 "refresh_token_expires_in" : refresh_token_ttl
             }
@@ -0,0 +1,45 @@
+"""
+access_check_query: employee existence and block status of init_login in one EXISTS query
+Runs on in-memory SQLite through aiosqlite with the employee and permission tables
+"""
+import datetime
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from core.database import Base
+from models.employee import Employee
+from models.permission import permission_table
+from models.pubkey import Pubkey # noqa: F401, mappers referenced by Employee relationships
+from models.service import Services # noqa: F401
+from services.init_login import access_check_query
+
+pytestmark = pytest.mark.anyio
+
+SERVICE_ID = 1
+
+@pytest.fixture
+async def db():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Employee.__table__, permission_table])
+        await conn.execute(insert(Employee), [{
+            "emp_no" : emp_no, "name" : "test", "phone_num" : "010", "position" : "staff",
+            "department" : "test", "birth" : datetime.date(2000, 1, 1), "email" : "test@example.com"
+        } for emp_no in ("E001", "E002")])
+        await conn.execute(insert(permission_table), [{"service_id" : SERVICE_ID, "emp_no" : "E002"},
+                                                      {"service_id" : SERVICE_ID + 1, "emp_no" : "E001"}])
+    async with async_sessionmaker(bind=engine)() as session:
+        yield session
+    await engine.dispose()
+
+async def test_allowed_employee(db):
+    access = (await db.execute(access_check_query(SERVICE_ID, "E001"))).first()
+    assert access.emp_no == "E001"
+    assert not access.blocked
+
+async def test_blocked_employee(db):
+    access = (await db.execute(access_check_query(SERVICE_ID, "E002"))).first()
+    assert access.blocked
+
+async def test_unknown_employee_has_no_row(db):
+    assert (await db.execute(access_check_query(SERVICE_ID, "E999"))).first() is None
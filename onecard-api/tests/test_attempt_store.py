@@ -0,0 +1,47 @@
+"""
+NFC attempt state stored as a Redis hash, with attempts written as JSON by older releases still readable
+"""
+import json
+import pytest
+from utils.attempt_store import save_attempt, read_attempt_fields
+from tests.test_card_response_script import ATTEMPT_KEY, complete_keys, complete_args
+
+pytestmark = pytest.mark.anyio
+
+async def test_save_and_read_selected_fields(rd):
+    await save_attempt(rd, ATTEMPT_KEY, {"status" : "pending", "client_id" : "client-1", "state" : None,
+                                         "server_private_key" : "ff"}, 300)
+
+    attempt = await read_attempt_fields(rd, ATTEMPT_KEY, ("status", "state"))
+
+    assert attempt == {"status" : "pending", "state" : None}
+    assert await rd.type(ATTEMPT_KEY) == b"hash"
+    assert 0 < await rd.ttl(ATTEMPT_KEY) <= 300
+
+async def test_save_replaces_previous_fields(rd):
+    await save_attempt(rd, ATTEMPT_KEY, {"status" : "pending", "s_id" : "old"}, 300)
+    await save_attempt(rd, ATTEMPT_KEY, {"status" : "pending"}, 300)
+    assert await read_attempt_fields(rd, ATTEMPT_KEY, ("s_id",)) is None
+
+async def test_missing_attempt_reads_as_none(rd):
+    assert await read_attempt_fields(rd, ATTEMPT_KEY, ("status",)) is None
+
+async def test_legacy_json_attempt_is_readable(rd):
+    await rd.set(ATTEMPT_KEY, json.dumps({"status" : "pending", "client_id" : "client-1"}), ex=300)
+    attempt = await read_attempt_fields(rd, ATTEMPT_KEY, ("status", "client_id", "s_id"))
+    assert attempt == {"status" : "pending", "client_id" : "client-1", "s_id" : None}
+
+async def test_legacy_json_attempt_is_completed_in_place(rd, scripts):
+    await rd.set(ATTEMPT_KEY, json.dumps({"status" : "pending", "client_id" : "client-1"}), ex=300)
+
+    assert await scripts.complete_attempt(keys=complete_keys(), args=complete_args()) == [b"ok", b""]
+
+    assert await rd.type(ATTEMPT_KEY) == b"string"
+    assert json.loads(await rd.get(ATTEMPT_KEY)) == {"status" : "success", "client_id" : "client-1", "s_id" : "s1"}
+    assert 0 < await rd.ttl(ATTEMPT_KEY) <= 300
+
+async def test_legacy_json_attempt_client_mismatch(rd, scripts):
+    await rd.set(ATTEMPT_KEY, json.dumps({"status" : "pending", "client_id" : "client-1"}), ex=300)
+    result = await scripts.complete_attempt(keys=complete_keys(), args=complete_args(client_id="other"))
+    assert result == [b"client_mismatch", b"client-1"]
+    assert json.loads(await rd.get(ATTEMPT_KEY))["status"] == "pending"
@@ -0,0 +1,62 @@
+"""
+LruCache and the caches built on it (parsed card public keys, verified access tokens)
+"""
+import time
+import pytest
+from core.key_pool import EphemeralKeyPool
+from core.lru_cache import LruCache
+from core.pubkey_cache import PubkeyCache
+from core.token_cache import TokenCache
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LruCache(maxsize=2)
+    cache._store("a", 1)
+    cache._store("b", 2)
+    assert cache._lookup("a") == 1
+    cache._store("c", 3)
+    assert cache._lookup("b") is None
+    assert cache.stats() == {"size" : 2, "maxsize" : 2, "hits" : 1, "misses" : 1, "hit_rate" : 0.5}
+
+def test_lru_drops_a_stale_value():
+    cache = LruCache(maxsize=2)
+    cache._store("a", 1)
+    assert cache._lookup("a", is_fresh=lambda value: False) is None
+    assert cache.stats()["size"] == 0
+
+def test_pubkey_cache_parses_each_key_once():
+    pubkey_hex = EphemeralKeyPool.generate()[1].hex()
+    cache = PubkeyCache(maxsize=10)
+    assert cache.get(pubkey_hex) is cache.get(pubkey_hex)
+    cache.invalidate(pubkey_hex)
+    cache.get(pubkey_hex)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_pubkey_cache_rejects_a_point_off_the_curve():
+    with pytest.raises(ValueError):
+        PubkeyCache(maxsize=10).get("04" + "00" * 64)
+
+def test_token_cache_serves_the_payload_until_exp():
+    calls = []
+    def verifier(token:str)->dict:
+        calls.append(token)
+        return {"sub" : "E001", "exp" : time.time() + 60}
+
+    cache = TokenCache(maxsize=10)
+    first = cache.verify("token", verifier)
+    first["sub"] = "changed"
+    assert cache.verify("token", verifier)["sub"] == "E001"
+    assert calls == ["token"]
+    cache.invalidate("token")
+    cache.verify("token", verifier)
+    assert calls == ["token", "token"]
+
+def test_token_cache_reverifies_an_expired_token():
+    calls = []
+    def verifier(token:str)->dict:
+        calls.append(token)
+        return {"sub" : "E001", "exp" : time.time() - 1}
+
+    cache = TokenCache(maxsize=10)
+    cache.verify("token", verifier)
+    cache.verify("token", verifier)
+    assert len(calls) == 2
@@ -0,0 +1,70 @@
+"""
+CARD_RESPONSE_SUCCESS_SCRIPT: completes a pending NFC attempt and opens the session in one atomic call
+"""
+import json
+import pytest
+from utils.attempt_store import save_attempt
+
+pytestmark = pytest.mark.anyio
+
+ATTEMPT_KEY = "nfc_attempt:a1"
+SESSION_TTL = 3600
+
+def complete_keys(s_id:str="s1", pubkey:str="04ab", emp_no:str="E001"):
+    return [ATTEMPT_KEY, f"sess_pub:{s_id}", f"pub_sess:{pubkey}", f"sess_claims:{s_id}",
+            f"emp_sess:{emp_no}", f"card_sess:{pubkey}"]
+
+def complete_args(client_id:str="client-1", s_id:str="s1", pubkey:str="04ab", emp_no:str="E001"):
+    return [client_id, s_id, pubkey, SESSION_TTL, 60, "nfc_status:a1", emp_no, "Kim", "kim@example.com"]
+
+async def save_pending(rd, client_id:str="client-1", ttl:int=300):
+    await save_attempt(rd, ATTEMPT_KEY, {"status" : "pending", "emp_no" : "E001", "client_id" : client_id,
+                                         "s_id" : None, "challenge" : "00"}, ttl)
+
+async def test_success_marks_attempt_and_opens_session(rd, scripts):
+    await save_pending(rd)
+    pubsub = rd.pubsub()
+    await pubsub.subscribe("nfc_status:a1")
+    await pubsub.get_message(timeout=1)
+
+    assert await scripts.complete_attempt(keys=complete_keys(), args=complete_args()) == [b"ok", b""]
+
+    assert await rd.hmget(ATTEMPT_KEY, ["status", "s_id"]) == [b"success", b"s1"]
+    assert await rd.get("sess_pub:s1") == b"04ab"
+    assert await rd.get("pub_sess:04ab") == b"s1"
+    assert await rd.hgetall("sess_claims:s1") == {b"sub" : b"E001", b"name" : b"Kim", b"email" : b"kim@example.com"}
+    assert await rd.smembers("emp_sess:E001") == {b"s1"}
+    assert await rd.smembers("card_sess:04ab") == {b"s1"}
+    for key in ("sess_pub:s1", "pub_sess:04ab", "sess_claims:s1", "emp_sess:E001", "card_sess:04ab"):
+        assert 0 < await rd.ttl(key) <= SESSION_TTL
+    message = await pubsub.get_message(timeout=1)
+    assert json.loads(message["data"]) == {"status" : "success", "s_id" : "s1"}
+    await pubsub.aclose()
+
+async def test_success_keeps_attempt_readable_for_the_minimum_ttl(rd, scripts):
+    await save_pending(rd, ttl=5)
+    await scripts.complete_attempt(keys=complete_keys(), args=complete_args())
+    assert await rd.ttl(ATTEMPT_KEY) == 60
+
+async def test_second_tap_is_not_pending(rd, scripts):
+    await save_pending(rd)
+    await scripts.complete_attempt(keys=complete_keys(), args=complete_args())
+
+    result = await scripts.complete_attempt(keys=complete_keys(s_id="s2"), args=complete_args(s_id="s2"))
+
+    assert result == [b"not_pending", b"success"]
+    assert await rd.exists("sess_pub:s2") == 0
+    assert await rd.smembers("emp_sess:E001") == {b"s1"}
+
+async def test_client_mismatch_changes_nothing(rd, scripts):
+    await save_pending(rd)
+
+    result = await scripts.complete_attempt(keys=complete_keys(), args=complete_args(client_id="other"))
+
+    assert result == [b"client_mismatch", b"client-1"]
+    assert await rd.hget(ATTEMPT_KEY, "status") == b"pending"
+    assert await rd.exists("sess_pub:s1", "pub_sess:04ab", "sess_claims:s1", "emp_sess:E001") == 0
+
+async def test_missing_attempt_is_expired(rd, scripts):
+    assert await scripts.complete_attempt(keys=complete_keys(), args=complete_args()) == [b"expired", b""]
+    assert await rd.exists("sess_pub:s1") == 0
@@ -0,0 +1,116 @@
+"""
+ClientRegistry: TTL cache, negative caching, invalidation over pub/sub and the size bound
+"""
+import asyncio
+import datetime
+import uuid
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import core.client_registry as client_registry_module
+from core.database import Base
+from core.client_registry import ClientRegistry
+from core.pubsub import PubSubDispatcher
+from models.employee import Employee # noqa: F401, mappers referenced by Services relationships
+from models.pubkey import Pubkey # noqa: F401
+from models.service import Users, Services, RedirectUris
+from utils.redis_const import REDIS_CLIENT_INVALIDATE_CHANNEL
+
+pytestmark = pytest.mark.anyio
+
+TTL = 300
+
+@pytest.fixture
+async def db():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Users.__table__, Services.__table__, RedirectUris.__table__])
+        await conn.execute(insert(Services), [{
+            "client_id" : client_id, "client_secret" : f"{client_id}-secret", "owner_id" : uuid.uuid4(),
+            "name" : client_id, "created_at" : datetime.datetime.now()
+        } for client_id in ("c1", "c2", "c3")])
+        await conn.execute(insert(RedirectUris), [{"client_id" : "c1", "uris" : "https://c1.example.com/callback"}])
+    async with async_sessionmaker(bind=engine)() as session:
+        yield session
+    await engine.dispose()
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Frozen monotonic clock of the registry, advanced by the tests
+    """
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(client_registry_module, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+async def test_client_is_served_from_the_cache_until_the_ttl(db, clock):
+    registry = ClientRegistry(ttl=TTL, maxsize=10)
+    client = await registry.get("c1", db)
+    assert (client.client_id, client.client_secret) == ("c1", "c1-secret")
+    assert client.redirect_uris == {"https://c1.example.com/callback"}
+
+    await db.execute(update(Services).where(Services.client_id == "c1").values(name="renamed"))
+    clock.now += TTL - 1
+    assert (await registry.get("c1", db)).name == "c1"
+    clock.now += 1
+    assert (await registry.get("c1", db)).name == "renamed"
+    assert (registry.hits, registry.misses) == (1, 2)
+
+async def test_unknown_client_is_cached_too(db, clock):
+    registry = ClientRegistry(ttl=TTL, maxsize=10)
+    assert await registry.get("unknown", db) is None
+    assert await registry.get("unknown", db) is None
+    assert registry.stats() == {"size" : 1, "ttl" : TTL, "hits" : 1, "misses" : 1, "hit_rate" : 0.5}
+
+async def test_invalidate_message_drops_the_entry(db, rd, clock):
+    registry = ClientRegistry(ttl=TTL, maxsize=10)
+    await registry.get("c1", db)
+    await registry.get("c2", db)
+    await db.execute(update(Services).where(Services.client_id == "c1").values(client_secret="rotated"))
+
+    dispatcher = PubSubDispatcher()
+    dispatcher.on(REDIS_CLIENT_INVALIDATE_CHANNEL, registry.on_invalidate_message)
+    await dispatcher.start(rd)
+    try:
+        for _ in range(100):
+            if await rd.publish(REDIS_CLIENT_INVALIDATE_CHANNEL, "c1"):
+                break
+            await asyncio.sleep(0.01)
+        for _ in range(100):
+            if registry.stats()["size"] == 1:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await dispatcher.stop()
+
+    assert (await registry.get("c1", db)).client_secret == "rotated"
+    # Other clients stay cached
+    await registry.get("c2", db)
+    assert (registry.hits, registry.misses) == (1, 3)
+
+async def test_clear_drops_every_entry(db, clock):
+    registry = ClientRegistry(ttl=TTL, maxsize=10)
+    await registry.get("c1", db)
+    await registry.get("unknown", db)
+    registry.clear()
+    assert registry.stats()["size"] == 0
+
+async def test_a_full_cache_drops_expired_entries_first(db, clock):
+    registry = ClientRegistry(ttl=TTL, maxsize=2)
+    await registry.get("c1", db)
+    clock.now += 10
+    await registry.get("c2", db)
+    clock.now += TTL - 5
+
+    # c1 has expired and makes room, c2 is kept
+    await registry.get("c3", db)
+    assert set(registry._entries) == {"c2", "c3"}
+
+async def test_a_full_cache_of_live_entries_is_cleared(db, clock):
+    registry = ClientRegistry(ttl=TTL, maxsize=2)
+    await registry.get("c1", db)
+    await registry.get("unknown", db)
+    await registry.get("c3", db)
+    assert set(registry._entries) == {"c3"}
+    assert registry.stats()["size"] <= registry.maxsize
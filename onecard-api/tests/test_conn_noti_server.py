@@ -0,0 +1,134 @@
+"""
+Push server client: request and connection counters, the httpcore trace hook and error mapping
+Requests go to a local HTTP/1.1 keep-alive server, so the trace events are the ones httpcore really emits.
+"""
+import asyncio
+import json
+import socket
+import pytest
+from fastapi import HTTPException
+import core.conn_noti_server as conn_noti_server_module
+from core.conn_noti_server import (
+    create_notification_client,
+    get_notification_pool_stats,
+    notification_server_communication,
+    _queue_wait_tracer
+)
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture(autouse=True)
+def pool_stats(monkeypatch):
+    stats = {key : 0 for key in conn_noti_server_module._pool_stats}
+    monkeypatch.setattr(conn_noti_server_module, "_pool_stats", stats)
+    return stats
+
+class PushServer:
+    """
+    Minimal keep-alive HTTP/1.1 server answering every POST with status and a JSON body
+    Responses wait for release when hold is set.
+    """
+    def __init__(self):
+        self.status = 200
+        self.hold = False
+        self.release = asyncio.Event()
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = next(int(line.split(b":")[1]) for line in head.split(b"\r\n")
+                              if line.lower().startswith(b"content-length:"))
+                await reader.readexactly(length)
+                if self.hold:
+                    await self.release.wait()
+                body = json.dumps({"result" : "sent"}).encode()
+                writer.write(b"HTTP/1.1 %d Status\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+                             % (self.status, len(body)) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+@pytest.fixture
+async def push_server(monkeypatch):
+    server = PushServer()
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    monkeypatch.setenv("PUSH_SERVER_URL", f"http://127.0.0.1:{port}/push")
+    yield server
+    listener.close()
+
+@pytest.fixture
+async def client(monkeypatch):
+    monkeypatch.setenv("PUSH_HTTP2", "false")
+    monkeypatch.setenv("PUSH_MAX_CONNECTIONS", "1")
+    http_client = create_notification_client()
+    yield http_client
+    await http_client.aclose()
+
+async def send(client):
+    return await notification_server_communication(client, "a1", "E001", "client-1", "Test", "00ff")
+
+async def test_sequential_requests_reuse_the_connection(push_server, client):
+    assert await send(client) == {"result" : "sent"}
+    await send(client)
+
+    stats = get_notification_pool_stats()
+    assert (stats["requests"], stats["requests_in_flight"], stats["requests_in_flight_max"]) == (2, 0, 1)
+    assert (stats["connections_opened"], stats["connections_reused"]) == (1, 1)
+    assert push_server.connections == 1
+
+async def test_requests_in_flight_are_not_connections(push_server, client):
+    push_server.hold = True
+    requests = [asyncio.create_task(send(client)) for _ in range(3)]
+    for _ in range(100):
+        if get_notification_pool_stats()["requests_in_flight"] == 3:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    push_server.release.set()
+    await asyncio.gather(*requests)
+
+    stats = get_notification_pool_stats()
+    # Three requests waited at once on the single pooled connection
+    assert (stats["requests_in_flight"], stats["requests_in_flight_max"]) == (0, 3)
+    assert (stats["connections_opened"], stats["connections_reused"]) == (1, 2)
+    assert stats["queue_wait_ms_max"] >= 40
+
+async def test_error_status_is_forwarded(push_server, client):
+    push_server.status = 500
+    with pytest.raises(HTTPException) as error:
+        await send(client)
+    assert error.value.status_code == 500
+    assert get_notification_pool_stats()["requests_in_flight"] == 0
+
+async def test_unreachable_server_is_503(client, monkeypatch):
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    monkeypatch.setenv("PUSH_SERVER_URL", f"http://127.0.0.1:{port}/push")
+    with pytest.raises(HTTPException) as error:
+        await send(client)
+    assert error.value.status_code == 503
+
+    stats = get_notification_pool_stats()
+    assert (stats["requests"], stats["requests_in_flight"]) == (1, 0)
+    assert (stats["connections_opened"], stats["connections_reused"]) == (0, 0)
+
+@pytest.mark.parametrize("events, expected", [
+    (["connection.connect_tcp.started", "connection.connect_tcp.complete",
+      "http11.send_request_headers.started", "http11.send_request_headers.complete"], (1, 0)),
+    (["http11.send_request_headers.started", "http11.send_request_headers.complete"], (0, 1)),
+    (["http2.send_request_headers.started", "http2.send_request_body.started"], (0, 1)),
+    (["connection.connect_tcp.started", "connection.connect_tcp.failed"], (0, 0)),
+])
+async def test_trace_hook_counts_each_request_once(events, expected):
+    trace = _queue_wait_tracer(0.0)
+    for event_name in events:
+        await trace(event_name, {})
+    stats = get_notification_pool_stats()
+    assert (stats["connections_opened"], stats["connections_reused"]) == expected
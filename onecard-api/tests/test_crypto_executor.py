@@ -0,0 +1,75 @@
+"""
+CryptoExecutor: thread and process pools, in-flight and queue depth, timing stats and worker exceptions
+"""
+import asyncio
+import os
+import threading
+import time
+import pytest
+from core.crypto_executor import CryptoExecutor
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def thread_executor():
+    executor = CryptoExecutor(kind="thread", max_workers=1)
+    yield executor
+    executor.stop()
+
+@pytest.fixture
+def process_executor():
+    executor = CryptoExecutor(kind="process", max_workers=1)
+    yield executor
+    executor.stop()
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        CryptoExecutor(kind="fiber", max_workers=1)
+
+async def test_thread_mode_runs_in_a_crypto_thread(thread_executor):
+    name = await thread_executor.run("name", lambda: threading.current_thread().name)
+    assert name.startswith("crypto")
+    assert thread_executor.stats()["kind"] == "thread"
+
+async def test_process_mode_runs_in_a_worker_process(process_executor):
+    # Builtins only: the function and its arguments are pickled to the spawned worker
+    assert await process_executor.run("pid", os.getpid) != os.getpid()
+    assert await process_executor.run("pow", pow, 2, 10) == 1024
+    assert process_executor.stats()["operations"]["pow"]["count"] == 1
+
+async def test_worker_exception_propagates(thread_executor, process_executor):
+    for executor in (thread_executor, process_executor):
+        with pytest.raises(ValueError):
+            await executor.run("parse", int, "not a number")
+        stats = executor.stats()
+        assert stats["in_flight"] == 0
+        # Failed calls are not timed
+        assert "parse" not in stats["operations"]
+
+async def test_queue_depth_counts_calls_waiting_for_a_worker(thread_executor):
+    release = threading.Event()
+    calls = [asyncio.create_task(thread_executor.run("wait", release.wait, 5)) for _ in range(3)]
+    for _ in range(100):
+        if thread_executor.stats()["in_flight"] == 3:
+            break
+        await asyncio.sleep(0.01)
+    stats = thread_executor.stats()
+    assert (stats["in_flight"], stats["queue_depth"]) == (3, 2)
+
+    release.set()
+    assert await asyncio.gather(*calls) == [True, True, True]
+    stats = thread_executor.stats()
+    assert (stats["in_flight"], stats["queue_depth"]) == (0, 0)
+
+async def test_timing_stats(thread_executor):
+    # One worker: the second sleep waits for the first one
+    await asyncio.gather(thread_executor.run("sleep", time.sleep, 0.05), thread_executor.run("sleep", time.sleep, 0.05))
+    await thread_executor.run("add", int.__add__, 1, 2)
+
+    operations = thread_executor.stats()["operations"]
+    assert operations["sleep"]["count"] == 2
+    assert 50 <= operations["sleep"]["run_ms_avg"] <= operations["sleep"]["run_ms_max"]
+    # Average of ~0 and ~50 ms
+    assert operations["sleep"]["queue_wait_ms_avg"] >= 20
+    assert operations["add"]["count"] == 1
+    assert operations["add"]["run_ms_max"] < 50
@@ -0,0 +1,39 @@
+"""
+EphemeralKeyPool and its vendored copy in onecard-app
+"""
+import ast
+import pathlib
+from core.key_pool import EphemeralKeyPool
+
+API_KEY_POOL = pathlib.Path(__file__).resolve().parents[1] / "core" / "key_pool.py"
+APP_KEY_POOL = pathlib.Path(__file__).resolve().parents[2] / "onecard-app" / "core" / "key_pool.py"
+
+def module_body(path:pathlib.Path)->str:
+    """
+    AST of the module without its docstring, so only the header note may differ between the copies
+    """
+    module = ast.parse(path.read_text())
+    if ast.get_docstring(module) is not None:
+        module.body = module.body[1:]
+    return ast.dump(module)
+
+def test_onecard_app_copy_is_in_sync():
+    assert module_body(APP_KEY_POOL) == module_body(API_KEY_POOL)
+
+def test_acquire_hands_out_each_key_pair_once():
+    pool = EphemeralKeyPool(size=4, low_watermark=1)
+    pool.start()
+    try:
+        public_keys = [pool.acquire()[1] for _ in range(10)]
+    finally:
+        pool.stop()
+    assert len(set(public_keys)) == 10
+    assert all(len(public_key) == 65 and public_key[0] == 4 for public_key in public_keys)
+    assert pool.stats()["acquired"] == 10
+
+def test_dry_pool_generates_inline():
+    pool = EphemeralKeyPool(size=2, low_watermark=1)
+    private_key, public_key = pool.acquire()
+    assert len(public_key) == 65
+    assert pool.stats()["dry"] == 1
+    assert pool.stats()["dry_rate"] == 1.0
@@ -0,0 +1,130 @@
+"""
+Log file handler: rotation modes, the single writer requirement of the rotating handlers and segment compression
+"""
+import gzip
+import logging.handlers
+import os
+import threading
+import pytest
+import logging_config
+from logging_config import GzipTimedRotatingFileHandler, create_file_handler, worker_count
+
+@pytest.fixture
+def single_process(monkeypatch):
+    monkeypatch.setattr(logging_config.sys, "argv", ["uvicorn", "main:app"])
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+
+@pytest.mark.parametrize("argv, env, expected", [
+    (["uvicorn", "main:app"], None, 1),
+    (["uvicorn", "main:app", "--workers", "4"], None, 4),
+    (["uvicorn", "main:app", "--workers=2"], None, 2),
+    (["gunicorn", "-w", "3", "main:app"], None, 3),
+    (["uvicorn", "main:app"], "5", 5),
+    (["uvicorn", "main:app"], "auto", 1),
+])
+def test_worker_count(monkeypatch, argv, env, expected):
+    monkeypatch.setattr(logging_config.sys, "argv", argv)
+    if env is None:
+        monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    else:
+        monkeypatch.setenv("WEB_CONCURRENCY", env)
+    assert worker_count() == expected
+
+@pytest.mark.parametrize("rotation, handler_class", [
+    ("daily", GzipTimedRotatingFileHandler),
+    ("size", logging.handlers.RotatingFileHandler),
+    ("external", logging.handlers.WatchedFileHandler),
+    ("none", logging.FileHandler),
+])
+def test_rotation_modes(monkeypatch, tmp_path, single_process, rotation, handler_class):
+    monkeypatch.setattr(logging_config, "LOG_ROTATION", rotation)
+    handler = create_file_handler(str(tmp_path / "api_access_log.jsonl"))
+    try:
+        assert type(handler) is handler_class
+    finally:
+        handler.close()
+
+@pytest.mark.parametrize("rotation", ["daily", "size"])
+def test_rotating_handlers_refuse_several_workers(monkeypatch, tmp_path, rotation):
+    monkeypatch.setattr(logging_config, "LOG_ROTATION", rotation)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(ValueError, match="external"):
+        create_file_handler(str(tmp_path / "api_access_log.jsonl"))
+
+def test_external_rotation_reopens_the_moved_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(logging_config, "LOG_ROTATION", "external")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    log_path = tmp_path / "api_access_log.jsonl"
+    handler = create_file_handler(str(log_path))
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    try:
+        handler.emit(logging.makeLogRecord({"msg" : "before"}))
+        os.rename(log_path, tmp_path / "api_access_log.jsonl.2025-01-31")
+        handler.emit(logging.makeLogRecord({"msg" : "after"}))
+    finally:
+        handler.close()
+    assert (tmp_path / "api_access_log.jsonl.2025-01-31").read_text() == "before\n"
+    assert log_path.read_text() == "after\n"
+
+@pytest.fixture
+def gzip_handler(tmp_path):
+    handler = GzipTimedRotatingFileHandler(str(tmp_path / "api_access_log.jsonl"), backupCount=2, encoding="utf-8")
+    yield handler
+    handler.close()
+
+def wait_for_compression(handler:GzipTimedRotatingFileHandler):
+    # One compressor thread, so a no-op job completes after every queued compression
+    handler._compressor.submit(lambda: None).result(timeout=5)
+
+def rotate_day(handler:GzipTimedRotatingFileHandler, day:str, content:bytes):
+    with open(handler.baseFilename, 'wb') as file:
+        file.write(content)
+    os.utime(handler.baseFilename, (1700000000, 1700000000))
+    handler.rotate(handler.baseFilename, f"{handler.baseFilename}.{day}")
+
+def test_rotation_compresses_in_the_background(monkeypatch, tmp_path, gzip_handler):
+    started, release = threading.Event(), threading.Event()
+    real_copyfileobj = logging_config.shutil.copyfileobj
+    def slow_copyfileobj(source, archive):
+        started.set()
+        release.wait(timeout=5)
+        real_copyfileobj(source, archive)
+    monkeypatch.setattr(logging_config.shutil, "copyfileobj", slow_copyfileobj)
+
+    rotate_day(gzip_handler, "2025-01-31", b'{"message":"a"}\n')
+    # rotate returned while the compression is still running: the writer is not held up
+    assert started.wait(timeout=5)
+    assert (tmp_path / "api_access_log.jsonl.2025-01-31").exists()
+    assert not (tmp_path / "api_access_log.jsonl.2025-01-31.gz").exists()
+    release.set()
+    wait_for_compression(gzip_handler)
+
+    assert sorted(os.listdir(tmp_path)) == ["api_access_log.jsonl.2025-01-31.gz"]
+    archive_path = tmp_path / "api_access_log.jsonl.2025-01-31.gz"
+    with gzip.open(archive_path, 'rb') as archive:
+        assert archive.read() == b'{"message":"a"}\n'
+    assert os.path.getmtime(archive_path) == 1700000000
+
+def test_failed_compression_is_retried_at_the_next_rollover(monkeypatch, tmp_path, gzip_handler):
+    real_gzip_open = logging_config.gzip.open
+    def failing_gzip_open(*args, **kwargs):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(logging_config.gzip, "open", failing_gzip_open)
+    rotate_day(gzip_handler, "2025-01-30", b"day 30\n")
+    wait_for_compression(gzip_handler)
+    assert sorted(os.listdir(tmp_path)) == ["api_access_log.jsonl.2025-01-30"]
+
+    monkeypatch.setattr(logging_config.gzip, "open", real_gzip_open)
+    rotate_day(gzip_handler, "2025-01-31", b"day 31\n")
+    wait_for_compression(gzip_handler)
+    assert sorted(os.listdir(tmp_path)) == ["api_access_log.jsonl.2025-01-30.gz", "api_access_log.jsonl.2025-01-31.gz"]
+
+def test_retention_counts_days_and_deletes_uncompressed_leftovers(tmp_path, gzip_handler):
+    for name in ["api_access_log.jsonl.2025-01-28", "api_access_log.jsonl.2025-01-28.gz", "api_access_log.jsonl.2025-01-29",
+                 "api_access_log.jsonl.2025-01-30.gz", "api_access_log.jsonl.2025-01-31", "api_access_log.jsonl.2025-01-31.gz"]:
+        (tmp_path / name).write_bytes(b"")
+    # Segments queued for compression are left to the compressor
+    gzip_handler._queued.add(str(tmp_path / "api_access_log.jsonl.2025-01-29"))
+
+    assert sorted(os.path.basename(path) for path in gzip_handler.getFilesToDelete()) == [
+        "api_access_log.jsonl.2025-01-28", "api_access_log.jsonl.2025-01-28.gz"]
@@ -0,0 +1,98 @@
+"""
+NFC status SSE stream: initial event, forwarded pub/sub changes, terminal close and waiter cleanup
+"""
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+import services.nfc_satus as nfc_status_module
+from services.nfc_satus import open_nfc_status_stream, on_nfc_status_message, _status_waiters
+from tests.test_card_response_script import ATTEMPT_KEY, save_pending
+
+pytestmark = pytest.mark.anyio
+
+ATTEMPT_ID = "a1"
+
+def event_data(event:str)->dict:
+    assert event.startswith("event: status\ndata: ")
+    return json.loads(event[len("event: status\ndata: "):])
+
+def publish(status:dict):
+    on_nfc_status_message(f"nfc_status:{ATTEMPT_ID}", json.dumps(status))
+
+async def test_initial_status_then_forwarded_change_ends_the_stream(rd):
+    await save_pending(rd)
+    events = await open_nfc_status_stream(ATTEMPT_ID, "client-1", rd)
+    assert event_data(await anext(events))["status"] == "pending"
+    assert len(_status_waiters[ATTEMPT_ID]) == 1
+
+    publish({"status" : "success", "s_id" : "s1"})
+    assert event_data(await anext(events))["s_id"] == "s1"
+    # success is terminal: the stream ends and unregisters its waiter
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
+    assert ATTEMPT_ID not in _status_waiters
+
+@pytest.mark.parametrize("status", ["success", "failed"])
+async def test_attempt_already_terminal_sends_one_event(rd, status):
+    await save_pending(rd)
+    await rd.hset(ATTEMPT_KEY, "status", status)
+    events = await open_nfc_status_stream(ATTEMPT_ID, "client-1", rd)
+    assert [event_data(event)["status"] async for event in events] == [status]
+    assert ATTEMPT_ID not in _status_waiters
+
+async def test_missing_attempt_sends_expired(rd):
+    events = await open_nfc_status_stream(ATTEMPT_ID, "client-1", rd)
+    assert [event_data(event)["status"] async for event in events] == ["expired"]
+    assert ATTEMPT_ID not in _status_waiters
+
+async def test_client_mismatch_is_raised_before_streaming(rd):
+    await save_pending(rd)
+    with pytest.raises(HTTPException) as error:
+        await open_nfc_status_stream(ATTEMPT_ID, "client-2", rd)
+    assert error.value.status_code == 401
+    assert ATTEMPT_ID not in _status_waiters
+
+async def test_client_disconnect_removes_the_waiter(rd):
+    await save_pending(rd)
+    events = await open_nfc_status_stream(ATTEMPT_ID, "client-1", rd)
+    await anext(events)
+    # Starlette cancels the task iterating the body when the browser goes away
+    waiting = asyncio.create_task(anext(events))
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    await events.aclose()
+    assert ATTEMPT_ID not in _status_waiters
+
+    other = await open_nfc_status_stream(ATTEMPT_ID, "client-1", rd)
+    await anext(other)
+    await other.aclose()
+    assert ATTEMPT_ID not in _status_waiters
+
+async def test_keepalive_rereads_the_status_and_the_stream_times_out(rd, monkeypatch):
+    monkeypatch.setattr(nfc_status_module, "STREAM_KEEPALIVE_SECONDS", 0.01)
+    monkeypatch.setattr(nfc_status_module, "STREAM_MAX_SECONDS", 0.2)
+    await save_pending(rd)
+    events = await open_nfc_status_stream(ATTEMPT_ID, "client-1", rd)
+    assert event_data(await anext(events))["status"] == "pending"
+    assert await anext(events) == ": keepalive\n\n"
+
+    remaining = [event async for event in events]
+    assert remaining and set(remaining) == {": keepalive\n\n"}
+    assert ATTEMPT_ID not in _status_waiters
+
+async def test_keepalive_sends_a_change_whose_message_was_missed(rd, monkeypatch):
+    monkeypatch.setattr(nfc_status_module, "STREAM_KEEPALIVE_SECONDS", 0.01)
+    await save_pending(rd)
+    events = await open_nfc_status_stream(ATTEMPT_ID, "client-1", rd)
+    await anext(events)
+
+    # Changed in Redis while the pub/sub connection was down: no message reaches the waiter
+    await rd.hset(ATTEMPT_KEY, mapping={"status" : "failed", "error" : "invalid_signature"})
+    assert event_data(await anext(events)) == {"status" : "failed", "s_id" : None, "error" : "invalid_signature",
+                                               "error_description" : None}
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
+    assert ATTEMPT_ID not in _status_waiters
@@ -0,0 +1,126 @@
+"""
+PubSubDispatcher: a bad message or handler is skipped, any Redis error resubscribes with backoff
+"""
+import asyncio
+import pytest
+import redis.asyncio as aioredis
+import core.pubsub as pubsub_module
+from core.pubsub import PubSubDispatcher, RESUBSCRIBE_DELAY_MAX
+
+pytestmark = pytest.mark.anyio
+
+# The sleeps fixture patches asyncio.sleep itself, the tests yield to the listener with the real one
+real_sleep = asyncio.sleep
+
+def message(channel, data):
+    return {"type" : "message", "pattern" : None, "channel" : channel, "data" : data}
+
+class FakePubSub:
+    """
+    Plays one scripted session: subscribe may fail, then the messages are yielded and the last item may be an error
+    """
+    def __init__(self, session):
+        self.subscribe_error, self.items = session
+        self.closed = False
+
+    async def subscribe(self, *channels):
+        if self.subscribe_error is not None:
+            raise self.subscribe_error
+
+    async def psubscribe(self, *patterns):
+        pass
+
+    async def listen(self):
+        for item in self.items:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await asyncio.Event().wait()
+
+    async def aclose(self):
+        self.closed = True
+        raise aioredis.ConnectionError("already closed")
+
+class FakeRedis:
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+        self.opened = []
+        self.all_opened = asyncio.Event()
+
+    def pubsub(self, ignore_subscribe_messages:bool):
+        pubsub = FakePubSub(self.sessions.pop(0) if self.sessions else (None, []))
+        self.opened.append(pubsub)
+        if not self.sessions:
+            self.all_opened.set()
+        return pubsub
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    async def fake_sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+    monkeypatch.setattr(pubsub_module.asyncio, "sleep", fake_sleep)
+    return delays
+
+async def run(dispatcher, rd):
+    await dispatcher.start(rd)
+    await asyncio.wait_for(rd.all_opened.wait(), timeout=1)
+    for _ in range(10):
+        await real_sleep(0)
+    await dispatcher.stop()
+
+async def test_bad_message_and_failing_handler_are_skipped(sleeps):
+    received = []
+    def handler(channel, data):
+        if data == "boom":
+            raise ValueError(data)
+        received.append(data)
+
+    dispatcher = PubSubDispatcher()
+    dispatcher.on("ch", handler)
+    rd = FakeRedis([(None, [message(b"ch", b"a"), message(None, b"not decodable"), message(b"ch", b"boom"), message(b"ch", b"b")])])
+    await run(dispatcher, rd)
+
+    assert received == ["a", "b"]
+    assert len(rd.opened) == 1
+    assert sleeps == []
+
+async def test_any_redis_error_resubscribes_with_backoff(sleeps):
+    received = []
+    connects = []
+    dispatcher = PubSubDispatcher()
+    dispatcher.on("ch", lambda channel, data: received.append(data))
+    dispatcher.on_connect(lambda: connects.append(True))
+    rd = FakeRedis([
+        (aioredis.ConnectionError("refused"), []),
+        (aioredis.TimeoutError("timeout"), []),
+        (None, [message(b"ch", b"a"), aioredis.ResponseError("unexpected reply")]),
+        (None, [message(b"ch", b"b")]),
+    ])
+    await run(dispatcher, rd)
+
+    assert received == ["a", "b"]
+    assert len(connects) == 2
+    assert all(pubsub.closed for pubsub in rd.opened)
+    # Doubles while subscribing fails, back to the minimum after a successful subscription
+    assert sleeps == [1, 2, 1]
+
+async def test_backoff_is_capped(sleeps):
+    dispatcher = PubSubDispatcher()
+    dispatcher.on("ch", lambda channel, data: None)
+    rd = FakeRedis([(aioredis.ConnectionError("refused"), [])] * 8)
+    await run(dispatcher, rd)
+
+    assert sleeps == [1, 2, 4, 8, 16, RESUBSCRIBE_DELAY_MAX, RESUBSCRIBE_DELAY_MAX, RESUBSCRIBE_DELAY_MAX]
+
+async def test_on_connect_failure_does_not_stop_the_listener(sleeps):
+    received = []
+    dispatcher = PubSubDispatcher()
+    dispatcher.on("ch", lambda channel, data: received.append(data))
+    dispatcher.on_connect(lambda: 1 / 0)
+    rd = FakeRedis([(None, [message(b"ch", b"a")])])
+    await run(dispatcher, rd)
+
+    assert received == ["a"]
+    assert sleeps == []
@@ -0,0 +1,108 @@
+"""
+RateLimiter and RATE_LIMIT_SCRIPT: all-or-nothing charging, Retry-After, disabled scopes, env parsing and failing open
+"""
+import logging
+from types import SimpleNamespace
+import pytest
+import redis.asyncio as aioredis
+from fastapi import HTTPException
+import core.rate_limit as rate_limit_module
+from core.rate_limit import BucketLimit, RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+ENDPOINT = "POST /api/v1/test"
+
+def make_request(scripts)->SimpleNamespace:
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(resources=SimpleNamespace(scripts=scripts))))
+
+def make_limiter(limits:dict, identifiers:dict)->RateLimiter:
+    async def identify(request):
+        return dict(identifiers)
+    return RateLimiter(ENDPOINT, limits, identify)
+
+async def tokens(rd, scope:str, identifier:str)->float:
+    return float(await rd.hget(f"rate_limit:POST:/api/v1/test:{scope}:{identifier}", "tokens"))
+
+async def test_request_is_charged_only_when_every_bucket_has_a_token(rd, scripts):
+    identifiers = {"ip" : "10.0.0.1", "client" : "c1"}
+    limiter = make_limiter({"ip" : BucketLimit(1, 60), "client" : BucketLimit(5, 60)}, identifiers)
+    request = make_request(scripts)
+    await limiter(request)
+    assert await tokens(rd, "client", "c1") == pytest.approx(4, abs=0.01)
+
+    with pytest.raises(HTTPException) as rejected:
+        await limiter(request)
+    assert rejected.value.status_code == 429
+    # The exhausted ip bucket rejected the request, the client bucket was not charged
+    assert await tokens(rd, "client", "c1") == pytest.approx(4, abs=0.01)
+
+    identifiers["ip"] = "10.0.0.2"
+    await limiter(request)
+    assert await tokens(rd, "client", "c1") == pytest.approx(3, abs=0.01)
+
+async def test_rejection_carries_retry_after_of_the_exhausted_bucket(rd, scripts, caplog):
+    limiter = make_limiter({"ip" : BucketLimit(2, 60), "client" : BucketLimit(1, 10)}, {"ip" : "10.0.0.1", "client" : "c1"})
+    request = make_request(scripts)
+    await limiter(request)
+    with pytest.raises(HTTPException) as rejected:
+        await limiter(request)
+    # Only the client bucket is empty, it refills one token in 10s
+    assert rejected.value.headers == {"Retry-After" : "10"}
+    assert [record.scope for record in caplog.records if record.getMessage() == "Rate limit exceeded"] == ["client"]
+
+    limiter = make_limiter({"ip" : BucketLimit(1, 60)}, {"ip" : "10.0.0.9"})
+    await limiter(request)
+    with pytest.raises(HTTPException) as rejected:
+        await limiter(request)
+    assert rejected.value.headers == {"Retry-After" : "60"}
+
+async def test_disabled_or_unidentified_scope_is_skipped(rd, scripts):
+    limiter = make_limiter({"ip" : None, "client" : BucketLimit(1, 60), "employee" : BucketLimit(1, 60)},
+                           {"ip" : "10.0.0.1", "client" : "c1", "employee" : None})
+    assert list(limiter.limits) == ["client", "employee"]
+    await limiter(make_request(scripts))
+    assert await rd.keys("rate_limit:*") == [b"rate_limit:POST:/api/v1/test:client:c1"]
+
+async def test_nothing_to_limit_skips_redis(rd):
+    limiter = make_limiter({"ip" : BucketLimit(1, 60)}, {})
+    await limiter(make_request(None))
+    await make_limiter({"ip" : None}, {"ip" : "10.0.0.1"})(make_request(None))
+
+async def test_rate_limit_disabled(monkeypatch):
+    monkeypatch.setattr(rate_limit_module, "RATE_LIMIT_ENABLED", False)
+    await make_limiter({"ip" : BucketLimit(1, 60)}, {"ip" : "10.0.0.1"})(make_request(None))
+
+async def test_redis_error_lets_the_request_through_with_a_warning(caplog):
+    async def unavailable(keys, args):
+        raise aioredis.ConnectionError("Connection refused")
+    limiter = make_limiter({"ip" : BucketLimit(1, 60)}, {"ip" : "10.0.0.1"})
+    with caplog.at_level(logging.WARNING, logger="core.rate_limit"):
+        await limiter(make_request(SimpleNamespace(take_tokens=unavailable)))
+    assert [(record.levelname, record.getMessage()) for record in caplog.records] == [
+        ("WARNING", "Rate limiter unavailable, request allowed: Connection refused")]
+
+@pytest.mark.parametrize("value, expected", [
+    ("5/60", (5, 60.0)),
+    (" 30/1.5 ", (30, 1.5)),
+    ("5", (5, 60.0)),
+    ("0", None),
+    ("", None),
+    ("disabled", None),
+    ("Disabled", None),
+])
+def test_from_env(monkeypatch, value, expected):
+    monkeypatch.setenv("RATE_LIMIT_TEST", value)
+    limit = BucketLimit.from_env("RATE_LIMIT_TEST", "1/1")
+    assert (None if limit is None else (limit.capacity, limit.period)) == expected
+
+def test_from_env_default(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_TEST", raising=False)
+    limit = BucketLimit.from_env("RATE_LIMIT_TEST", "3/30")
+    assert (limit.capacity, limit.period) == (3, 30.0)
+
+@pytest.mark.parametrize("value", ["five/60", "5/x", "5/0", "5/-60", "-5/60", "5.5/60", "5/60/1", "off", "5/nan", "5/inf"])
+def test_malformed_env_value_is_an_error(monkeypatch, value):
+    monkeypatch.setenv("RATE_LIMIT_TEST", value)
+    with pytest.raises(ValueError, match="RATE_LIMIT_TEST"):
+        BucketLimit.from_env("RATE_LIMIT_TEST", "1/1")
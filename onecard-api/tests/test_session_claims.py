@@ -0,0 +1,75 @@
+"""
+Session claims: the Redis cache, its DB fallback, the employee session index TTL and the employee_updated handler
+"""
+import datetime
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from core.database import Base
+from models.employee import Employee
+from models.pubkey import Pubkey
+from models.service import Services # noqa: F401, mappers referenced by Employee relationships
+from utils.redis_const import REDIS_EMPLOYEE_UPDATED_CHANNEL
+from utils.session_claims import load_session_claims, store_session_claims, on_employee_updated
+
+pytestmark = pytest.mark.anyio
+
+CLAIMS = {"sub" : "E001", "name" : "Kim", "email" : "kim@example.com"}
+
+@pytest.fixture
+async def db():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Employee.__table__, Pubkey.__table__])
+        await conn.execute(insert(Employee), [{
+            "emp_no" : "E001", "name" : "Kim", "phone_num" : "010", "position" : "staff",
+            "department" : "test", "birth" : datetime.date(2000, 1, 1), "email" : "kim@example.com"
+        }])
+        await conn.execute(insert(Pubkey), [{"pubkey" : "04aa", "emp_no" : "E001", "created_at" : datetime.datetime.now()}])
+    async with async_sessionmaker(bind=engine)() as session:
+        yield session
+    await engine.dispose()
+
+async def test_cached_claims_skip_the_db(rd):
+    await rd.hset("sess_claims:s1", mapping=CLAIMS)
+    # No DB session: a cache hit must not query it
+    assert await load_session_claims("s1", None, rd) == CLAIMS
+
+async def test_missing_claims_are_rebuilt_from_the_db_and_cached(rd, db):
+    await rd.set("sess_pub:s1", "04aa", ex=600)
+    assert await load_session_claims("s1", db, rd) == CLAIMS
+
+    assert {field.decode(): value.decode() for field, value in (await rd.hgetall("sess_claims:s1")).items()} == CLAIMS
+    assert 0 < await rd.ttl("sess_claims:s1") <= 600
+    assert await rd.smembers("emp_sess:E001") == {b"s1"}
+
+async def test_unknown_session_or_card_has_no_claims(rd, db):
+    assert await load_session_claims("s1", db, rd) is None
+    await rd.set("sess_pub:s2", "04ff", ex=600)
+    assert await load_session_claims("s2", db, rd) is None
+    assert not await rd.exists("sess_claims:s2")
+
+async def test_fallback_store_never_shortens_the_employee_index(rd):
+    await rd.sadd("emp_sess:E001", "s_long")
+    await rd.expire("emp_sess:E001", 100000)
+    await store_session_claims(rd, "s_short", CLAIMS, 10)
+    assert await rd.ttl("emp_sess:E001") > 99990
+    assert await rd.smembers("emp_sess:E001") == {b"s_long", b"s_short"}
+
+    await store_session_claims(rd, "s_longer", CLAIMS, 200000)
+    assert await rd.ttl("emp_sess:E001") > 199990
+
+async def test_fallback_store_sets_the_ttl_of_a_new_index(rd):
+    await store_session_claims(rd, "s1", CLAIMS, 600)
+    assert 0 < await rd.ttl("emp_sess:E001") <= 600
+
+async def test_employee_update_drops_the_cached_claims_of_every_session(rd):
+    await store_session_claims(rd, "s1", CLAIMS, 600)
+    await store_session_claims(rd, "s2", CLAIMS, 600)
+    await store_session_claims(rd, "s3", {**CLAIMS, "sub" : "E002"}, 600)
+
+    await on_employee_updated(rd, REDIS_EMPLOYEE_UPDATED_CHANNEL, "E001")
+    assert not await rd.exists("sess_claims:s1", "sess_claims:s2")
+    assert await rd.exists("sess_claims:s3")
+    # An employee without sessions is a no-op
+    await on_employee_updated(rd, REDIS_EMPLOYEE_UPDATED_CHANNEL, "E404")
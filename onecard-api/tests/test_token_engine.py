@@ -0,0 +1,212 @@
+"""
+TokenEngine: HMAC key rotation, legacy tokens without kid, malformed tokens and token type separation
+"""
+import datetime
+import json
+import os
+import time
+import pytest
+from jose import jwt
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+from jose import JWTError
+from jose.exceptions import ExpiredSignatureError
+from core.token import TokenEngine, _b64encode, _b64decode
+
+CLIENT_ID = "client-1"
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setenv("ACCESS_SECRET_KEYS", "2025b:new_access_secret,2025a:old_access_secret")
+    monkeypatch.setenv("REFRESH_SECRET_KEYS", "2025b:new_refresh_secret")
+    return TokenEngine()
+
+@pytest.fixture
+def es256_engine(monkeypatch, tmp_path):
+    pem_path = tmp_path / "es256-2025c.pem"
+    pem_path.write_bytes(ec.generate_private_key(ec.SECP256R1()).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    monkeypatch.setenv("ES256_SIGNING_KEYS", f"2025c:{pem_path}")
+    monkeypatch.setenv("ACCESS_TOKEN_ALGORITHM", "ES256")
+    return TokenEngine()
+
+def header_of(token:str)->dict:
+    return json.loads(_b64decode(token.split(".")[0].encode('ascii')))
+
+def payload_of(token:str)->dict:
+    return json.loads(_b64decode(token.split(".")[1].encode('ascii')))
+
+def forge_header(token:str, header:dict)->str:
+    """
+    Replace the header segment, keeping the payload and signature
+    """
+    _, payload_segment, signature_segment = token.split(".")
+    header_segment = _b64encode(json.dumps(header).encode('utf-8')).decode('ascii')
+    return f"{header_segment}.{payload_segment}.{signature_segment}"
+
+def test_access_token_round_trip(engine):
+    token = engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    payload = engine.verify_token(token)
+    assert payload["sub"] == "s1"
+    assert payload["exp"] > time.time()
+
+def test_access_token_is_an_rfc9068_token(engine):
+    token = engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    assert header_of(token) == {"alg" : "HS256", "typ" : "at+jwt", "kid" : "2025b"}
+    payload = payload_of(token)
+    assert (payload["iss"], payload["aud"], payload["client_id"]) == ("onecard-api", CLIENT_ID, CLIENT_ID)
+    assert payload["iat"] <= time.time() < payload["exp"]
+
+def test_rotated_out_key_still_verifies(engine, monkeypatch):
+    monkeypatch.setenv("ACCESS_SECRET_KEYS", "2025a:old_access_secret")
+    old_token = TokenEngine().create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    assert engine.verify_token(old_token)["sub"] == "s1"
+
+def test_refresh_token_without_kid_uses_the_legacy_secret(monkeypatch):
+    monkeypatch.delenv("REFRESH_SECRET_KEYS", raising=False)
+    engine = TokenEngine()
+    legacy_token = forge_header(engine.create_refresh_token(data={"sub" : "s1"}, client_id=CLIENT_ID), {"alg" : "HS256", "typ" : "JWT"})
+    # The signature covers the header, so re-sign with the legacy key
+    signing_input = legacy_token.rsplit(".", 1)[0].encode('ascii')
+    signature = engine._refresh_keys.legacy.sign(signing_input)
+    assert engine.verify_token(f"{signing_input.decode()}.{_b64encode(signature).decode()}", is_refresh=True)["sub"] == "s1"
+
+@pytest.mark.parametrize("kid", [[1], {"a" : 1}, 1, None])
+def test_non_string_kid_is_a_jwt_error(engine, kid):
+    access_token = engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    refresh_token = engine.create_refresh_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    with pytest.raises(JWTError):
+        engine.verify_token(forge_header(access_token, {"alg" : "HS256", "typ" : "at+jwt", "kid" : kid}))
+    with pytest.raises(JWTError):
+        engine.verify_token(forge_header(refresh_token, {"alg" : "HS256", "typ" : "JWT", "kid" : kid}), is_refresh=True)
+
+@pytest.mark.parametrize("header", [
+    {"alg" : "HS256", "typ" : "at+jwt", "kid" : "unknown"},
+    {"alg" : "none", "typ" : "at+jwt", "kid" : "2025b"},
+    {"alg" : "HS512", "typ" : "at+jwt", "kid" : "2025b"},
+    {"alg" : "HS256", "typ" : "JWT", "kid" : "2025b"},
+    {"alg" : "HS256", "kid" : "2025b"},
+])
+def test_unknown_kid_alg_or_typ_is_rejected(engine, header):
+    token = forge_header(engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID), header)
+    with pytest.raises(JWTError):
+        engine.verify_token(token)
+
+@pytest.mark.parametrize("token", ["", "a.b", "a.b.c.d", "!!!.e30.AA", "é.e30.AA"])
+def test_malformed_token_is_a_jwt_error(engine, token):
+    with pytest.raises(JWTError):
+        engine.verify_token(token)
+
+def test_tampered_payload_is_rejected(engine):
+    header_segment, _, signature_segment = engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID).split(".")
+    payload_segment = _b64encode(json.dumps({"sub" : "s2", "exp" : int(time.time()) + 60}).encode()).decode()
+    with pytest.raises(JWTError):
+        engine.verify_token(f"{header_segment}.{payload_segment}.{signature_segment}")
+
+def test_expired_token(engine):
+    token = engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID, expire_delta=datetime.timedelta(seconds=-1))
+    with pytest.raises(ExpiredSignatureError):
+        engine.verify_token(token)
+
+def test_token_of_another_issuer_is_rejected(engine, monkeypatch):
+    monkeypatch.setenv("TOKEN_ISSUER", "https://other.example.com")
+    token = TokenEngine().create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    with pytest.raises(JWTError):
+        engine.verify_token(token)
+
+def test_access_and_refresh_tokens_are_not_interchangeable(engine):
+    access_token = engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    refresh_token = engine.create_refresh_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    with pytest.raises(JWTError):
+        engine.verify_token(access_token, is_refresh=True)
+    with pytest.raises(JWTError):
+        engine.verify_token(refresh_token)
+
+def test_id_token_is_not_an_access_token(engine):
+    id_token = engine.create_id_token(data={"sub" : "E001", "aud" : CLIENT_ID, "name" : "Kim", "email" : "kim@example.com"})
+    assert header_of(id_token)["typ"] == "JWT"
+    assert payload_of(id_token)["iss"] == "onecard-api"
+    with pytest.raises(JWTError):
+        engine.verify_token(id_token)
+
+def test_es256_id_token_is_not_an_access_token(es256_engine):
+    """
+    With ACCESS_TOKEN_ALGORITHM=ES256 both token types are signed by the same key, only typ tells them apart
+    """
+    id_token = es256_engine.create_id_token(data={"sub" : "E001", "aud" : CLIENT_ID, "name" : "Kim", "email" : "kim@example.com"})
+    access_token = es256_engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    assert header_of(id_token)["kid"] == header_of(access_token)["kid"] == "2025c"
+
+    assert es256_engine.verify_token(access_token)["sub"] == "s1"
+    with pytest.raises(JWTError):
+        es256_engine.verify_token(id_token)
+
+def test_es256_access_token_verifies_against_the_jwks(es256_engine):
+    """
+    What a relying service does: pick the JWKS key by kid, check the signature, typ, iss and aud
+    """
+    token = es256_engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    jwks = json.loads(es256_engine.jwks()[0])
+    header = header_of(token)
+    jwk = next(key for key in jwks["keys"] if key["kid"] == header["kid"])
+    public_key = ec.EllipticCurvePublicNumbers(int.from_bytes(_b64decode(jwk["x"].encode()), "big"),
+                                               int.from_bytes(_b64decode(jwk["y"].encode()), "big"),
+                                               ec.SECP256R1()).public_key()
+    signing_input, signature_segment = token.rsplit(".", 1)
+    signature = _b64decode(signature_segment.encode())
+    public_key.verify(encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big")),
+                      signing_input.encode(), ec.ECDSA(hashes.SHA256()))
+
+    payload = payload_of(token)
+    assert (header["alg"], header["typ"]) == ("ES256", "at+jwt")
+    assert (payload["iss"], payload["aud"]) == (es256_engine.ISSUER, CLIENT_ID)
+
+def test_hmac_access_tokens_stay_valid_after_switching_to_es256(engine, es256_engine):
+    token = engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    assert es256_engine.verify_token(token)["sub"] == "s1"
+
+def legacy_token(claims:dict, secret_env:str="ACCESS_SECRET_KEY")->str:
+    """
+    Token as minted by python-jose before this engine: typ JWT, no kid
+    """
+    return jwt.encode(claims, os.environ[secret_env], algorithm="HS256")
+
+def test_access_token_minted_by_python_jose_stays_valid_until_it_expires(engine, es256_engine):
+    token = legacy_token({"sub" : "s1", "exp" : int(time.time()) + 300})
+    assert header_of(token) == {"alg" : "HS256", "typ" : "JWT"}
+    assert engine.verify_token(token) == {"sub" : "s1", "exp" : payload_of(token)["exp"]}
+    assert es256_engine.verify_token(token)["sub"] == "s1"
+
+    with pytest.raises(ExpiredSignatureError):
+        engine.verify_token(legacy_token({"sub" : "s1", "exp" : int(time.time()) - 1}))
+
+@pytest.mark.parametrize("claims", [
+    # ID token of the python-jose engine: same secret and header, identity claims
+    {"sub" : "E001", "aud" : CLIENT_ID, "name" : "Kim", "email" : "kim@example.com", "iat" : 0, "exp" : int(time.time()) + 300},
+    # Longer than an access token ever lived
+    {"sub" : "s1", "exp" : int(time.time()) + 3600},
+    {"sub" : "s1"},
+])
+def test_other_python_jose_tokens_are_not_access_tokens(engine, claims):
+    with pytest.raises(JWTError):
+        engine.verify_token(legacy_token(claims))
+
+def test_python_jose_refresh_token_is_not_an_access_token(engine):
+    with pytest.raises(JWTError):
+        engine.verify_token(legacy_token({"sub" : "s1", "exp" : int(time.time()) + 300}, "REFRESH_SECRET_KEY"))
+
+def test_audience_is_checked_when_the_client_is_known(engine):
+    access_token = engine.create_access_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    refresh_token = engine.create_refresh_token(data={"sub" : "s1"}, client_id=CLIENT_ID)
+    assert payload_of(refresh_token)["aud"] == CLIENT_ID
+    assert engine.verify_token(access_token, audience=CLIENT_ID)["sub"] == "s1"
+    assert engine.verify_token(refresh_token, is_refresh=True, audience=CLIENT_ID)["sub"] == "s1"
+    with pytest.raises(JWTError):
+        engine.verify_token(access_token, audience="client-2")
+    with pytest.raises(JWTError):
+        engine.verify_token(refresh_token, is_refresh=True, audience="client-2")
+
+def test_refresh_token_without_aud_is_accepted_for_any_client(engine):
+    refresh_token = legacy_token({"sub" : "s1", "exp" : int(time.time()) + 300}, "REFRESH_SECRET_KEY")
+    assert engine.verify_token(refresh_token, is_refresh=True, audience="client-2")["sub"] == "s1"
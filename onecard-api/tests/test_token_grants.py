@@ -0,0 +1,168 @@
+"""
+Redis cost and behavior of the token grants and of the card-response completion
+Commands are counted on the client, so every EVALSHA, GET, ... is one round trip (no pipelines are used here).
+Scripts are loaded beforehand, as on a warm worker, so the counts do not include the first SCRIPT LOAD.
+"""
+import json
+import logging
+import fakeredis
+import pytest
+from types import SimpleNamespace
+from fastapi import HTTPException
+from core.client_registry import client_registry, RegisteredClient
+from core.resources import RedisScripts
+from core.token import TokenEngine
+from services.token_service import handle_token_request
+from utils.redis_scripts import CARD_RESPONSE_SUCCESS_SCRIPT, TOKEN_AUTH_CODE_SCRIPT, TOKEN_REFRESH_SCRIPT
+from tests.test_card_response_script import save_pending, complete_keys, complete_args
+from tests.test_token_engine import forge_header
+
+pytestmark = pytest.mark.anyio
+
+CLIENT = RegisteredClient(id=1, client_id="client-1", name="Test", client_secret="secret",
+                          redirect_uris=frozenset({"https://client.example.com/callback"}))
+OTHER_CLIENT = RegisteredClient(id=2, client_id="client-2", name="Other", client_secret="other-secret",
+                                redirect_uris=frozenset({"https://other.example.com/callback"}))
+SESSION_TTL = 3600
+
+class CountingRedis(fakeredis.FakeAsyncRedis):
+    """
+    fakeredis client recording the name of every command sent
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commands = []
+
+    async def execute_command(self, *args, **options):
+        self.commands.append(str(args[0]).upper())
+        return await super().execute_command(*args, **options)
+
+@pytest.fixture
+async def counting_rd():
+    client = CountingRedis()
+    for script in (CARD_RESPONSE_SUCCESS_SCRIPT, TOKEN_AUTH_CODE_SCRIPT, TOKEN_REFRESH_SCRIPT):
+        await client.script_load(script)
+    client.commands.clear()
+    yield client
+    await client.aclose()
+
+@pytest.fixture
+def resources(counting_rd, monkeypatch):
+    async def registered_client(client_id, db):
+        return {client.client_id: client for client in (CLIENT, OTHER_CLIENT)}.get(client_id)
+    monkeypatch.setattr(client_registry, "get", registered_client)
+    return SimpleNamespace(redis=counting_rd, scripts=RedisScripts(counting_rd), token_engine=TokenEngine())
+
+async def open_session(rd, s_id:str="s1", code:str="code-1"):
+    await rd.set(f"sess_pub:{s_id}", "04ab", ex=SESSION_TTL)
+    await rd.set("pub_sess:04ab", s_id, ex=SESSION_TTL)
+    await rd.hset(f"sess_claims:{s_id}", mapping={"sub" : "E001", "name" : "Kim", "email" : "kim@example.com"})
+    await rd.expire(f"sess_claims:{s_id}", SESSION_TTL)
+    await rd.sadd("emp_sess:E001", s_id)
+    await rd.sadd("card_sess:04ab", s_id)
+    await rd.set(f"auth_code:{code}", json.dumps({"session" : s_id,
+                                                 "redirect_uri" : "https://client.example.com/callback"}), ex=60)
+    rd.commands.clear()
+
+async def token_request(resources, grant_type:str, **params):
+    request = {"client_id" : CLIENT.client_id, "client_secret" : CLIENT.client_secret,
+               "redirect_uri" : "https://client.example.com/callback", "code" : None, "refresh_token" : None}
+    request.update(params)
+    return await handle_token_request(grant_type=grant_type, db=None, resources=resources,
+                                      logger=logging.LoggerAdapter(logging.getLogger("test"), {}), **request)
+
+async def test_complete_attempt_is_one_evalsha(counting_rd):
+    await save_pending(counting_rd)
+    counting_rd.commands.clear()
+
+    await RedisScripts(counting_rd).complete_attempt(keys=complete_keys(), args=complete_args())
+
+    assert counting_rd.commands == ["EVALSHA"]
+
+async def test_authorization_code_grant_is_two_round_trips(resources, counting_rd):
+    await open_session(counting_rd)
+
+    response = await token_request(resources, "authorization_code", code="code-1")
+
+    assert counting_rd.commands == ["GET", "EVALSHA"]
+    assert resources.token_engine.verify_token(response["access_token"])["sub"] == "s1"
+    assert await counting_rd.get("refresh_token:s1") == response["refresh_token"].encode()
+    assert await counting_rd.exists("auth_code:code-1") == 0
+    assert await counting_rd.ttl("sess_pub:s1") == response["refresh_token_expires_in"]
+
+async def test_authorization_code_cannot_be_redeemed_twice(resources, counting_rd):
+    await open_session(counting_rd)
+    await token_request(resources, "authorization_code", code="code-1")
+
+    # A concurrent request that read the code before the first one consumed it
+    result = await resources.scripts.redeem_auth_code(
+        keys=["auth_code:code-1", "sess_pub:s1", "sess_claims:s1", "refresh_token:s1"],
+        args=["rt", SESSION_TTL, "pub_sess:", "emp_sess:", "card_sess:"])
+
+    assert result == [b"code_used"]
+
+async def test_authorization_code_of_an_ended_session(resources, counting_rd):
+    await open_session(counting_rd)
+    await counting_rd.delete("sess_pub:s1")
+
+    with pytest.raises(HTTPException) as error:
+        await token_request(resources, "authorization_code", code="code-1")
+
+    assert error.value.status_code == 404
+    assert await counting_rd.exists("refresh_token:s1") == 0
+
+async def test_refresh_grant_is_one_round_trip(resources, counting_rd):
+    await open_session(counting_rd)
+    issued = await token_request(resources, "authorization_code", code="code-1")
+    await counting_rd.expire("sess_pub:s1", 10)
+    counting_rd.commands.clear()
+
+    response = await token_request(resources, "refresh_token", refresh_token=issued["refresh_token"])
+
+    assert counting_rd.commands == ["EVALSHA"]
+    assert response["refresh_token"] == issued["refresh_token"]
+    assert await counting_rd.ttl("sess_pub:s1") == response["refresh_token_expires_in"]
+
+async def test_refresh_with_a_replaced_token_revokes_the_stored_one(resources, counting_rd):
+    await open_session(counting_rd)
+    await token_request(resources, "authorization_code", code="code-1")
+    other = resources.token_engine.create_refresh_token(data={"sub" : "s1", "jti" : "other"}, client_id=CLIENT.client_id)
+
+    with pytest.raises(HTTPException) as error:
+        await token_request(resources, "refresh_token", refresh_token=other)
+
+    assert error.value.status_code == 401
+    assert await counting_rd.exists("refresh_token:s1") == 0
+
+async def test_wrong_client_secret_costs_no_script(resources, counting_rd):
+    await open_session(counting_rd)
+
+    with pytest.raises(HTTPException) as error:
+        await token_request(resources, "authorization_code", code="code-1", client_secret="wrong")
+
+    assert error.value.status_code == 401
+    assert counting_rd.commands == ["GET"]
+    assert await counting_rd.exists("auth_code:code-1") == 1
+
+async def test_refresh_token_with_a_non_string_kid_is_unauthorized(resources, counting_rd):
+    refresh_token = resources.token_engine.create_refresh_token(data={"sub" : "s1"}, client_id=CLIENT.client_id)
+
+    with pytest.raises(HTTPException) as error:
+        await token_request(resources, "refresh_token",
+                            refresh_token=forge_header(refresh_token, {"alg" : "HS256", "typ" : "JWT", "kid" : [1]}))
+
+    assert error.value.status_code == 401
+    assert counting_rd.commands == []
+
+async def test_refresh_token_of_another_client_is_unauthorized(resources, counting_rd):
+    await open_session(counting_rd)
+    issued = await token_request(resources, "authorization_code", code="code-1")
+    counting_rd.commands.clear()
+
+    with pytest.raises(HTTPException) as error:
+        await token_request(resources, "refresh_token", refresh_token=issued["refresh_token"],
+                            client_id=OTHER_CLIENT.client_id, client_secret=OTHER_CLIENT.client_secret)
+
+    assert error.value.status_code == 401
+    assert counting_rd.commands == []
+    assert await counting_rd.exists("refresh_token:s1") == 1
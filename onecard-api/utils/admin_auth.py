@@ -0,0 +1,24 @@
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from typing import Optional
+from dotenv import load_dotenv
+import hmac
+import os
+
+load_dotenv()
+
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN") # Bearer token of the operational endpoints (/api/v1/metrics)
+
+admin_scheme = HTTPBearer(auto_error=False)
+
+def require_admin_token(credentials:Optional[HTTPAuthorizationCredentials]=Depends(admin_scheme)):
+    """
+    Restrict operational endpoints to callers presenting ADMIN_API_TOKEN as a Bearer token
+    The endpoints are disabled (404) while ADMIN_API_TOKEN is not set
+    """
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=401,
+                            detail="Could not validate credentials",
+                            headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,53 @@
+"""
+NFC attempt state stored as a Redis hash under nfc_attempt:{attempt_id}
+Fields: status, emp_no, client_id, redirect_uri, state, s_id, error, server_private_key, challenge
+Readers ask only for the fields they need, so a status poll never transfers the server private key.
+Attempts written by older releases as a JSON string are still readable until they expire (300 seconds).
+"""
+from typing import Dict, Iterable, Optional
+import redis.asyncio as aioredis
+import redis
+import json
+
+def _is_wrong_type(error:redis.ResponseError)->bool:
+    return str(error).startswith("WRONGTYPE")
+
+async def save_attempt(rd:aioredis.Redis, key:str, attempt_state:Dict[str, Optional[str]], ttl:int):
+    """
+    Store a new attempt. None values are not stored and read back as None
+    """
+    mapping = {field: value for field, value in attempt_state.items() if value is not None}
+    async with rd.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+async def read_attempt_fields(rd:aioredis.Redis, key:str, fields:Iterable[str])->Optional[Dict[str, Optional[str]]]:
+    """
+    Read selected fields of an attempt with a single HMGET
+    Returns:
+    - dict: field -> value (None when absent), or None if the attempt does not exist or has expired
+    """
+    fields = list(fields)
+    try:
+        values = await rd.hmget(key, fields)
+    except redis.ResponseError as e:
+        if not _is_wrong_type(e):
+            raise
+        return await _read_legacy_attempt(rd, key, fields)
+
+    attempt = {field: value.decode('utf-8') if value is not None else None for field, value in zip(fields, values)}
+    if all(value is None for value in attempt.values()):
+        return None
+    return attempt
+
+async def _read_legacy_attempt(rd:aioredis.Redis, key:str, fields:Iterable[str])->Optional[Dict[str, Optional[str]]]:
+    """
+    Compatibility reader for attempts stored as a JSON string
+    """
+    raw_attempt_state = await rd.get(key)
+    if not raw_attempt_state:
+        return None
+    attempt_state = json.loads(raw_attempt_state.decode('utf-8'))
+    return {field: attempt_state.get(field) for field in fields}
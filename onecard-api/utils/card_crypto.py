@@ -0,0 +1,34 @@
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.backends import default_backend
+from core.pubkey_cache import pubkey_cache
+
+def decrypt_card_challenge(server_private_key_hex:str,
+                           card_pubkey_hex:str,
+                           card_data_hex:str)->bytes:
+    """
+    Derive the ECDH shared secret between the server's one-time key and the card's public key,
+    then decrypt the challenge the card encrypted with it (AES-128-ECB, PKCS7).
+    Runs in the crypto executor, so it only takes and returns picklable values.
+    Args:
+    - server_private_key_hex: private value of the server's one-time key stored with the attempt
+    - card_pubkey_hex: employee's public key registered in DB (65 bytes uncompressed point)
+    - card_data_hex: challenge encrypted by the NFC card
+    Returns:
+    - bytes: decrypted challenge
+    """
+    server_private_key = ec.derive_private_key(int(server_private_key_hex, 16), ec.SECP256R1(), default_backend())
+    card_public_key = pubkey_cache.get(card_pubkey_hex)
+
+    shared_secret = server_private_key.exchange(ec.ECDH(), card_public_key)
+    encryption_key = shared_secret[:16]
+
+    ciphertext = bytes.fromhex(card_data_hex)
+
+    cipher = Cipher(algorithms.AES(encryption_key), modes.ECB(), backend=default_backend())
+    decryptor = cipher.decryptor()
+    decrypted_padded_data = decryptor.update(ciphertext) + decryptor.finalize()
+
+    unpadder = padding.PKCS7(128).unpadder()
+    return unpadder.update(decrypted_padded_data) + unpadder.finalize()
@@ -1,31 +1,27 @@
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from models.employee import Employee
-from models.pubkey import Pubkey
-from core.token import Token
-from core.redis import redis_config
-from utils.redis_const import REDIS_SESSION_PUB_MAP_PREFIX
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict
+import redis.asyncio as aioredis
+from core.token import TokenEngine
+from core.resources import get_token_engine
+from core.token_cache import token_cache
+from utils.session_claims import load_session_claims
 
-token_handler = Token()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/token")
-rd = redis_config()
 
-def get_employee_from_session_id(s_id:str, db:Session)->Employee:
+async def get_session_claims(s_id:str, db:AsyncSession, rd:aioredis.Redis)->Dict[str, str]:
     """
-    Query Redis and database using session id(s_id)
-    Return the corresponding Employee ORM object
+    Return the session user's claims (sub, name, email) using session id(s_id)
+    Served from Redis; the database is only queried when the cached claims are missing
     """
-    pubkey_hex = rd.get(f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id}")
-    if not pubkey_hex:
-        raise HTTPException(status_code=404, 
-                            detail="User session not found in Redis")
-    pubkey = db.query(Pubkey).filter(Pubkey.pubkey == pubkey_hex.decode('utf-8')).first()
-    if not pubkey or not pubkey.employee:
-        raise HTTPException(status_code=404, detail="User not found in DB for the given session")
-    return pubkey.employee
+    claims = await load_session_claims(s_id, db, rd)
+    if not claims:
+        raise HTTPException(status_code=404, detail="User session not found")
+    return claims
 
-async def get_current_session(token: str = Depends(oauth2_scheme)):
+async def get_current_session(token: str = Depends(oauth2_scheme),
+                              token_engine: TokenEngine = Depends(get_token_engine)):
     """
     [수정됨] Authorization 헤더에서 Bearer 토큰을 추출하고 검증하여
     내부 세션 ID(s_id)를 반환합니다.
@@ -37,7 +33,7 @@ async def get_current_session(token: str = Depends(oauth2_scheme)):
     )
     try:
         # verify_token 함수는 JWTError를 발생시킬 수 있습니다.
-        payload = token_handler.verify_token(token=token, is_refresh=False)
+        payload = token_cache.verify(token, token_engine.verify_token)
         s_id = payload.get("sub")
         if s_id is None:
             raise credentials_exception
@@ -0,0 +1,36 @@
+"""
+Login access check against the blocklist sets that onecard-web materializes in Redis
+- perm_block:{client_id} : blocked emp_no plus PERM_BLOCK_READY_MEMBER once the set is complete
+- emp_known:{emp_no} : the employee exists in Postgres (set after a DB check, expires after KNOWN_EMPLOYEE_TTL)
+A missing READY member or employee marker means the caller must ask the permission table.
+A deleted employee can still pass for up to KNOWN_EMPLOYEE_TTL, but has no card key left, so the card response is refused.
+"""
+from dotenv import load_dotenv
+from typing import Optional
+from utils.redis_const import REDIS_PERM_BLOCK_PREFIX, PERM_BLOCK_READY_MEMBER, REDIS_KNOWN_EMPLOYEE_PREFIX
+import redis.asyncio as aioredis
+import os
+
+load_dotenv()
+
+KNOWN_EMPLOYEE_TTL = int(os.getenv("KNOWN_EMPLOYEE_TTL", "3600"))
+
+async def cached_block_status(rd:aioredis.Redis, client_id:str, emp_no:str)->Optional[bool]:
+    """
+    Block status from Redis in one round trip
+    Returns:
+    - bool: whether emp_no is blocked from the service
+    - None: the blocklist is not materialized or the employee is not known yet
+    """
+    async with rd.pipeline(transaction=False) as pipe:
+        pipe.smismember(f"{REDIS_PERM_BLOCK_PREFIX}{client_id}", [PERM_BLOCK_READY_MEMBER, emp_no])
+        pipe.exists(f"{REDIS_KNOWN_EMPLOYEE_PREFIX}{emp_no}")
+        (ready, blocked), known = await pipe.execute()
+    if not ready:
+        return None
+    if blocked:
+        return True
+    return False if known else None
+
+async def remember_employee(rd:aioredis.Redis, emp_no:str):
+    await rd.setex(f"{REDIS_KNOWN_EMPLOYEE_PREFIX}{emp_no}", KNOWN_EMPLOYEE_TTL, 1)
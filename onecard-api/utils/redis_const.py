@@ -6,3 +6,18 @@ REDIS_AUTH_CODE_PREFIX = "auth_code:"             # Stores authorization codes
 REDIS_REFRESH_TOKEN_PREFIX = "refresh_token:"     # Stores refresh tokens
 REDIS_SESSION_PUB_MAP_PREFIX = "sess_pub:"      # Maps OSPASS session ID -> User Publickey (s_id -> pubkey)
 REDIS_PUB_SESSION_MAP_PREFIX = "pub_sess:"      # Reverse mapping: User Publickey -> OSPASS session ID (pubkey -> s_id) - Optional tracking
+REDIS_SESSION_CLAIMS_PREFIX = "sess_claims:"   # Hash of the session user's claims (sub, name, email), same TTL as sess_pub
+REDIS_EMPLOYEE_SESSIONS_PREFIX = "emp_sess:"    # Set of s_id opened by an employee (emp_sess:{emp_no}), used to refresh claims and revoke sessions
+REDIS_CARD_SESSIONS_PREFIX = "card_sess:"      # Set of s_id opened with a card (card_sess:{pubkey}), used to revoke sessions of a lost card
+REDIS_PERM_BLOCK_PREFIX = "perm_block:"           # Set of emp_no blocked from a service (perm_block:{client_id}), maintained by onecard-web
+PERM_BLOCK_READY_MEMBER = "__ready__"             # Member present only in a completely built blocklist set
+REDIS_KNOWN_EMPLOYEE_PREFIX = "emp_known:"        # Marks an emp_no already found in the employee table
+REDIS_RATE_LIMIT_PREFIX = "rate_limit:"           # Token bucket hash (tokens, ts) per endpoint, scope and identifier
+
+"""
+Redis Pub/Sub Channels
+"""
+REDIS_PUBKEY_INVALIDATE_CHANNEL = "pubkey_invalidate"   # onecard-web publishes a replaced card public key (hex)
+REDIS_NFC_STATUS_CHANNEL_PREFIX = "nfc_status:"         # Status change of an NFC attempt (nfc_status:{attempt_id})
+REDIS_CLIENT_INVALIDATE_CHANNEL = "client_invalidate"   # onecard-web publishes the client_id of a created/edited/removed service
+REDIS_EMPLOYEE_UPDATED_CHANNEL = "employee_updated"     # emp_no of a changed employee record. Cached session claims are dropped
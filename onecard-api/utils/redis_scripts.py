@@ -0,0 +1,151 @@
+"""
+Redis Lua Scripts
+Each script runs atomically on the Redis server in a single round trip
+"""
+
+# Complete a pending NFC attempt after the card response has been verified
+# KEYS[1]: nfc_attempt:{attempt_id}, KEYS[2]: sess_pub:{s_id}, KEYS[3]: pub_sess:{pubkey}
+# KEYS[4]: sess_claims:{s_id}, KEYS[5]: emp_sess:{emp_no}, KEYS[6]: card_sess:{pubkey}
+# ARGV[1]: client_id, ARGV[2]: s_id, ARGV[3]: pubkey hex, ARGV[4]: session TTL, ARGV[5]: minimum attempt TTL
+# ARGV[6]: channel on which the status change is published for waiting browsers
+# ARGV[7..9]: session claims sub(emp_no), name, email
+# Returns {"ok"} or {error_code, current_value}
+CARD_RESPONSE_SUCCESS_SCRIPT = """
+local key_type = redis.call('TYPE', KEYS[1])['ok']
+local status, client_id, attempt
+if key_type == 'hash' then
+    local fields = redis.call('HMGET', KEYS[1], 'status', 'client_id')
+    status, client_id = fields[1], fields[2]
+elseif key_type == 'string' then
+    -- Attempt written as JSON by an older release
+    attempt = cjson.decode(redis.call('GET', KEYS[1]))
+    status, client_id = attempt['status'], attempt['client_id']
+else
+    return {'expired', ''}
+end
+if status ~= 'pending' then
+    return {'not_pending', tostring(status)}
+end
+if client_id ~= ARGV[1] then
+    return {'client_mismatch', tostring(client_id)}
+end
+if key_type == 'hash' then
+    redis.call('HSET', KEYS[1], 'status', 'success', 's_id', ARGV[2])
+else
+    attempt['status'] = 'success'
+    attempt['s_id'] = ARGV[2]
+    redis.call('SET', KEYS[1], cjson.encode(attempt), 'KEEPTTL')
+end
+if redis.call('TTL', KEYS[1]) < tonumber(ARGV[5]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+end
+redis.call('SETEX', KEYS[2], ARGV[4], ARGV[3])
+redis.call('SETEX', KEYS[3], ARGV[4], ARGV[2])
+redis.call('HSET', KEYS[4], 'sub', ARGV[7], 'name', ARGV[8], 'email', ARGV[9])
+redis.call('EXPIRE', KEYS[4], ARGV[4])
+for i = 5, 6 do
+    redis.call('SADD', KEYS[i], ARGV[2])
+    if redis.call('TTL', KEYS[i]) < tonumber(ARGV[4]) then
+        redis.call('EXPIRE', KEYS[i], ARGV[4])
+    end
+end
+redis.call('PUBLISH', ARGV[6], cjson.encode({status = 'success', s_id = ARGV[2]}))
+return {'ok', ''}
+"""
+
+# Shared by the token grants: extend the session keys to ttl
+# KEYS[2]: sess_pub:{s_id}, KEYS[3]: sess_claims:{s_id}. Returns false when the session does not exist
+# The emp_sess / card_sess indexes are only ever extended, they hold other sessions too
+_EXTEND_SESSION_FUNCTION = """
+local function extend_index(key, ttl)
+    if redis.call('TTL', key) < ttl then
+        redis.call('EXPIRE', key, ttl)
+    end
+end
+local function extend_session(ttl, pub_session_prefix, employee_sessions_prefix, card_sessions_prefix)
+    local pubkey = redis.call('GET', KEYS[2])
+    if not pubkey then
+        return false
+    end
+    redis.call('EXPIRE', KEYS[2], ttl)
+    redis.call('EXPIRE', pub_session_prefix .. pubkey, ttl)
+    redis.call('EXPIRE', KEYS[3], ttl)
+    extend_index(card_sessions_prefix .. pubkey, ttl)
+    local sub = redis.call('HGET', KEYS[3], 'sub')
+    if sub then
+        extend_index(employee_sessions_prefix .. sub, ttl)
+    end
+    return true
+end
+"""
+
+# authorization_code grant: consume the code, store the refresh token, extend the session and read its claims
+# KEYS[1]: auth_code:{code}, KEYS[2]: sess_pub:{s_id}, KEYS[3]: sess_claims:{s_id}, KEYS[4]: refresh_token:{s_id}
+# ARGV[1]: refresh token, ARGV[2]: refresh token TTL, ARGV[3]: pub_sess prefix, ARGV[4]: emp_sess prefix, ARGV[5]: card_sess prefix
+# Returns {"ok", claim field, value, ...}, {"code_used"} or {"no_session"}
+TOKEN_AUTH_CODE_SCRIPT = _EXTEND_SESSION_FUNCTION + """
+if redis.call('DEL', KEYS[1]) == 0 then
+    return {'code_used'}
+end
+if not extend_session(tonumber(ARGV[2]), ARGV[3], ARGV[4], ARGV[5]) then
+    return {'no_session'}
+end
+redis.call('SETEX', KEYS[4], ARGV[2], ARGV[1])
+local result = redis.call('HGETALL', KEYS[3])
+table.insert(result, 1, 'ok')
+return result
+"""
+
+# refresh_token grant: compare with the stored refresh token and align the session TTL with it
+# KEYS[1]: refresh_token:{s_id}, KEYS[2]: sess_pub:{s_id}, KEYS[3]: sess_claims:{s_id}
+# ARGV[1]: presented refresh token, ARGV[2]: pub_sess prefix, ARGV[3]: emp_sess prefix, ARGV[4]: card_sess prefix
+# Returns {"ok", remaining TTL} or {"invalid", 0}. A mismatching stored token is deleted
+TOKEN_REFRESH_SCRIPT = _EXTEND_SESSION_FUNCTION + """
+local stored = redis.call('GET', KEYS[1])
+if not stored or stored ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return {'invalid', 0}
+end
+local ttl = redis.call('TTL', KEYS[1])
+if ttl > 0 then
+    extend_session(ttl, ARGV[2], ARGV[3], ARGV[4])
+end
+return {'ok', ttl}
+"""
+
+# Token bucket rate limit over several buckets (ip, client, employee) of one request
+# A token is taken from every bucket only when all of them have one, so a rejected request costs nothing
+# KEYS[i]: rate_limit:{endpoint}:{scope}:{identifier}
+# ARGV[2i-1]: bucket capacity, ARGV[2i]: refill rate in tokens per millisecond
+# Returns {0, 0} when allowed or {milliseconds until a token is available, index of the exhausted bucket}
+RATE_LIMIT_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local levels = {}
+local wait, exhausted = 0, 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        local bucket_wait = math.ceil((1 - tokens) / rate)
+        if bucket_wait > wait then
+            wait, exhausted = bucket_wait, i
+        end
+    end
+end
+if wait > 0 then
+    return {wait, exhausted}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+end
+return {0, 0}
+"""
@@ -0,0 +1,73 @@
+"""
+User claims of an OAuth session cached in Redis
+- sess_claims:{s_id} : hash of sub(emp_no), name, email written with the session in get_card_response
+- emp_sess:{emp_no} : s_id of the employee's sessions, so claims can be dropped when the employee record changes
+  (also read by onecard-web to revoke every session of an employee)
+Dropped claims are reloaded from the DB on the next read.
+Whatever changes an employee's name or email must publish the emp_no on the employee_updated channel
+(REDIS_EMPLOYEE_UPDATED_CHANNEL), otherwise the cached claims stay until the session expires.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Optional
+import redis.asyncio as aioredis
+from models.employee import Employee
+from models.pubkey import Pubkey
+from utils.redis_const import (
+    REDIS_SESSION_CLAIMS_PREFIX,
+    REDIS_EMPLOYEE_SESSIONS_PREFIX,
+    REDIS_SESSION_PUB_MAP_PREFIX
+)
+
+async def load_session_claims(s_id:str, db:AsyncSession, rd:aioredis.Redis)->Optional[Dict[str, str]]:
+    """
+    Claims of the session, from Redis or rebuilt from the DB when missing
+    (session created before claims were cached, or claims dropped after an employee update)
+    Returns:
+    - dict: sub, name, email or None if the session or the employee does not exist
+    """
+    claims = await rd.hgetall(f"{REDIS_SESSION_CLAIMS_PREFIX}{s_id}")
+    if claims:
+        return {field.decode('utf-8'): value.decode('utf-8') for field, value in claims.items()}
+
+    session_pub_key = f"{REDIS_SESSION_PUB_MAP_PREFIX}{s_id}"
+    async with rd.pipeline(transaction=False) as pipe:
+        pipe.get(session_pub_key)
+        pipe.ttl(session_pub_key)
+        pubkey_hex, session_ttl = await pipe.execute()
+    if not pubkey_hex:
+        return None
+    employee = (await db.execute(
+        select(Employee.emp_no, Employee.name, Employee.email)
+        .join(Pubkey, Pubkey.emp_no == Employee.emp_no)
+        .where(Pubkey.pubkey == pubkey_hex.decode('utf-8'))
+    )).first()
+    if not employee:
+        return None
+    claims = {"sub" : employee.emp_no, "name" : employee.name, "email" : employee.email}
+    if session_ttl > 0:
+        await store_session_claims(rd, s_id, claims, session_ttl)
+    return claims
+
+async def store_session_claims(rd:aioredis.Redis, s_id:str, claims:Dict[str, str], ttl:int):
+    claims_key = f"{REDIS_SESSION_CLAIMS_PREFIX}{s_id}"
+    employee_sessions_key = f"{REDIS_EMPLOYEE_SESSIONS_PREFIX}{claims['sub']}"
+    async with rd.pipeline(transaction=True) as pipe:
+        pipe.hset(claims_key, mapping=claims)
+        pipe.expire(claims_key, ttl)
+        pipe.sadd(employee_sessions_key, s_id)
+        # The index holds the employee's other sessions too, so its TTL is only ever extended
+        # (NX: new index without a TTL, GT: shorter TTL than this session)
+        pipe.expire(employee_sessions_key, ttl, nx=True)
+        pipe.expire(employee_sessions_key, ttl, gt=True)
+        await pipe.execute()
+
+async def on_employee_updated(rd:aioredis.Redis, channel:str, emp_no:str):
+    """
+    Pub/sub handler for employee updates: drop the cached claims of every session of the employee
+    Registered in the lifespan with the shared Redis client bound to rd
+    """
+    employee_sessions_key = f"{REDIS_EMPLOYEE_SESSIONS_PREFIX}{emp_no}"
+    s_ids = await rd.smembers(employee_sessions_key)
+    if s_ids:
+        await rd.delete(*[f"{REDIS_SESSION_CLAIMS_PREFIX}{s_id.decode('utf-8')}" for s_id in s_ids])
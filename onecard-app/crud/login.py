@@ -1,12 +1,13 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.primitives import padding, serialization
+from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 from jose import JWTError
 from core.redis import redis_config
 from core.token import Token
+from core.key_pool import key_pool
 from models.employee import Employee
 from models.pubkey import Pubkey
 import datetime
@@ -31,14 +32,8 @@ def login(emp_no:str, db:Session):
         raise HTTPException(status_code=400,
                             detail="Invalid Employee Number")
     
-    # STEP 2. Generate a one-time ECC key pair on the server
-    temporary_private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
-    temporary_public_key = temporary_private_key.public_key()
-    
-    server_public_key_bytes = temporary_public_key.public_bytes(
-        encoding=serialization.Encoding.X962,
-        format=serialization.PublicFormat.UncompressedPoint
-    )
+    # STEP 2. Take a one-time ECC key pair from the pre-generated pool
+    temporary_private_key, server_public_key_bytes = key_pool.acquire()
     
     # STEP 3. Generate 16 bytes challenge
     challenge = os.urandom(16)
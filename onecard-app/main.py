@@ -1,8 +1,16 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 import uvicorn
 from api.login import app_login_router
+from core.key_pool import key_pool
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    key_pool.start()
+    yield
+    key_pool.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(app_login_router)
 
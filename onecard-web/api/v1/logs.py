@@ -6,17 +6,19 @@ from schemas.logs import LogAnalysisResponse
 router = APIRouter(prefix="/api/v1/logs", tags=["logs"])
 
 # 로그 분석기 인스턴스
+# 수집과 SQLite 조회는 블로킹 작업이므로 라우트는 def로 선언해 스레드풀에서 실행합니다.
 log_analyzer = LogAnalyzer()
 
 
 @router.get("/analysis", response_model=LogAnalysisResponse)
-async def get_log_analysis(days: int = Query(default=7, ge=1, le=30, description="분석할 일수")):
+def get_log_analysis(days: int = Query(default=7, ge=1, le=30, description="분석할 일수")):
     """
     로그 분석 결과를 반환합니다.
     
     - **days**: 분석할 기간 (일 단위, 1-30일)
     """
     try:
+        log_analyzer.ingest_on_request()
         analysis_result = log_analyzer.analyze_logs(days=days)
         return analysis_result
     except Exception as e:
@@ -24,13 +26,14 @@ async def get_log_analysis(days: int = Query(default=7, ge=1, le=30, description
 
 
 @router.get("/error-trends")
-async def get_error_trends(days: int = Query(default=7, ge=1, le=30, description="분석할 일수")) -> Dict[str, Any]:
+def get_error_trends(days: int = Query(default=7, ge=1, le=30, description="분석할 일수")) -> Dict[str, Any]:
     """
     에러 트렌드 분석 결과를 반환합니다.
     
     - **days**: 분석할 기간 (일 단위, 1-30일)
     """
     try:
+        log_analyzer.ingest_on_request()
         error_trends = log_analyzer.get_error_trends(days=days)
         return error_trends
     except Exception as e:
@@ -38,13 +41,15 @@ async def get_error_trends(days: int = Query(default=7, ge=1, le=30, description
 
 
 @router.get("/dashboard-data")
-async def get_dashboard_data(days: int = Query(default=7, ge=1, le=30, description="분석할 일수")) -> Dict[str, Any]:
+def get_dashboard_data(days: int = Query(default=7, ge=1, le=30, description="분석할 일수")) -> Dict[str, Any]:
     """
     대시보드용 종합 데이터를 반환합니다.
     
     - **days**: 분석할 기간 (일 단위, 1-30일)
     """
     try:
+        # 두 조회가 같은 롤업을 보도록 한 번만 수집
+        log_analyzer.ingest_on_request()
         analysis_result = log_analyzer.analyze_logs(days=days)
         error_trends = log_analyzer.get_error_trends(days=days)
         
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from core.database import get_db
+from models.employee import Employee
+from utils.current_user import current_user_info
+from utils.session_revoke import revoke_employee_sessions, revoke_card_sessions
+from schemas.session import RevokeEmployeeSessions, RevokeCardSessions
+import logging
+import redis
+
+session_router = APIRouter(prefix="/api", tags=["Session Revocation"])
+
+@session_router.post("/revoke/employee")
+def revoke_employee(request:RevokeEmployeeSessions,
+                    db:Session=Depends(get_db),
+                    current_user=Depends(current_user_info)):
+    """
+    Revoke all sessions and refresh tokens of an employee
+    """
+    employee = db.query(Employee).filter(Employee.emp_no == request.emp_no).first()
+    if not employee:
+        raise HTTPException(status_code=404,
+                            detail=f"Employee with emp_no {request.emp_no} not found.")
+    try:
+        revoked = revoke_employee_sessions(emp_no=request.emp_no, db=db)
+    except redis.RedisError as e:
+        logging.error(f"Failed to revoke sessions of emp_no:{request.emp_no}:{e}")
+        raise HTTPException(status_code=503,
+                            detail="Session store unavailable, try again later")
+    return {"message" : "Sessions revoked successfully", "revoked" : revoked}
+
+@session_router.post("/revoke/card")
+def revoke_card(request:RevokeCardSessions,
+                current_user=Depends(current_user_info)):
+    """
+    Revoke all sessions and refresh tokens opened with a card
+    """
+    try:
+        revoked = revoke_card_sessions(pubkey=request.pubkey)
+    except redis.RedisError as e:
+        logging.error(f"Failed to revoke sessions of card {request.pubkey[:16]}:{e}")
+        raise HTTPException(status_code=503,
+                            detail="Session store unavailable, try again later")
+    return {"message" : "Sessions revoked successfully", "revoked" : revoked}
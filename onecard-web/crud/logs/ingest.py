@@ -0,0 +1,28 @@
+"""
+로그 롤업 수집 작업
+onecard-web 디렉토리에서 실행: python -m crud.logs.ingest [--interval 60]
+--interval을 주면 그 간격(초)마다 반복하고, 없으면 한 번 수집하고 종료합니다. (cron 등에서 실행)
+"""
+import argparse
+import time
+from crud.logs.log_analyzer import LogAnalyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest new access log lines into the hourly rollup store")
+    parser.add_argument("--interval", type=float, default=0, help="seconds between runs, 0 runs once")
+    args = parser.parse_args()
+
+    log_analyzer = LogAnalyzer()
+    while True:
+        start_time = time.perf_counter()
+        ingested = log_analyzer.ingest()
+        print(f"Ingested {ingested} log lines into {log_analyzer.rollup_db_path} "
+              f"in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+        if not args.interval:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import math
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from schemas.logs import LogEntry
+
+# 응답 시간 스케치의 버킷 간격. 버킷 경계가 5%씩 커지므로 백분위수의 상대 오차는 약 2.5% 이내입니다.
+SKETCH_GAMMA = 1.05
+
+
+def classify_error(message: str) -> str:
+    """에러 메시지를 에러 타입으로 분류"""
+    message = message.lower()
+    if "connection failed" in message:
+        return "Connection Error"
+    if "status code" in message:
+        return "HTTP Error"
+    if "validation error" in message:
+        return "Validation Error"
+    if "unexpected error" in message:
+        return "Unexpected Error"
+    return "Other"
+
+
+class LatencySketch:
+    """
+    응답 시간(ms) 분포를 로그 스케일 버킷 개수로 저장하는 스케치
+    합치기(merge)가 가능하므로 시간별로 저장한 뒤 임의의 기간에 대한 백분위수를 계산할 수 있습니다.
+    """
+    def __init__(self, buckets: Optional[Dict[int, int]] = None):
+        self.buckets: Counter = Counter(buckets or {})
+
+    @staticmethod
+    def bucket_of(value: float) -> int:
+        if value <= 0:
+            return 0
+        return max(1, math.ceil(math.log(value, SKETCH_GAMMA)))
+
+    def add(self, value: float):
+        self.buckets[self.bucket_of(value)] += 1
+
+    def merge(self, other: "LatencySketch"):
+        self.buckets.update(other.buckets)
+
+    def percentile(self, percentile: int) -> float:
+        """버킷 대표값(버킷 범위의 중간값)으로 근사한 백분위수"""
+        total = sum(self.buckets.values())
+        if not total:
+            return 0
+        rank = min(int(total * percentile / 100), total - 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen > rank:
+                if bucket == 0:
+                    return 0
+                return round(2 * SKETCH_GAMMA ** bucket / (SKETCH_GAMMA + 1), 2)
+        return 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {str(bucket): count for bucket, count in self.buckets.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, int]) -> "LatencySketch":
+        return cls({int(bucket): count for bucket, count in data.items()})
+
+
+class RollupCell:
+    """
+    롤업 한 행((시간, 엔드포인트, 서비스, 상태, 레벨))의 집계
+    요청 수와 성공 수, 응답 시간 통계와 스케치, 에러 메시지/에러 타입별 개수를 가지며 모두 더하기로 합쳐집니다.
+    """
+    def __init__(self):
+        self.total = 0
+        self.response_count = 0
+        self.response_sum = 0.0
+        self.response_max: Optional[float] = None
+        self.response_min: Optional[float] = None
+        self.latency = LatencySketch()
+        self.error_messages: Counter = Counter()
+        self.error_types: Counter = Counter()
+
+    def add(self, log: LogEntry):
+        self.total += 1
+        if log.level == "ERROR":
+            self.error_types[classify_error(log.message)] += 1
+        if log.error_message:
+            self.error_messages[log.error_message] += 1
+        if log.response_time_ms is not None:
+            value = log.response_time_ms
+            self.response_count += 1
+            self.response_sum += value
+            self.response_max = value if self.response_max is None else max(self.response_max, value)
+            self.response_min = value if self.response_min is None else min(self.response_min, value)
+            self.latency.add(value)
+
+
+def rollup_key(log: LogEntry) -> Tuple[str, str, str, str, str]:
+    """(시간, 엔드포인트, 서비스, 상태, 레벨). 값이 없는 항목은 빈 문자열"""
+    return (log.timestamp.strftime("%Y-%m-%d %H:00"),
+            log.endpoint or "",
+            log.service_name or "",
+            log.status or "",
+            log.level.value)
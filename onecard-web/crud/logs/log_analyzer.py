@@ -1,11 +1,29 @@
 import json
 import os
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional
+from collections import defaultdict
 from schemas.logs import LogEntry, LogStatistics, LogAnalysisResponse
+from crud.logs.log_aggregate import LatencySketch, RollupCell, rollup_key
+from crud.logs.log_rollup import LogRollupStore
+from dotenv import load_dotenv
+import hashlib
+import threading
+import time
+import gzip
 import re
 
+load_dotenv()
+
+# Date suffix of a daily segment written by onecard-api (api_access_log.jsonl.2025-01-31 / .2025-01-31.gz)
+SEGMENT_DATE_PATTERN = re.compile(r"\.(\d{4}-\d{2}-\d{2})(?:\.gz)?$")
+
+# 롤업 보관 기간. 대시보드 조회 기간의 상한(30일)을 모두 담도록 하루 여유를 둡니다.
+AGGREGATE_RETENTION_DAYS = 31
+# 파일 앞부분의 해시로 회전/덮어쓰기 여부와 회전된 세그먼트를 식별합니다.
+HEAD_BYTES = 256
+# 대시보드 요청마다 새 로그를 롤업에 반영할지 여부. 수집 작업(python -m crud.logs.ingest)을 따로 실행하면 false로 둘 수 있습니다.
+LOG_ROLLUP_INGEST_ON_REQUEST = os.getenv("LOG_ROLLUP_INGEST_ON_REQUEST", "true").lower() == "true"
 
 class LogAnalyzer:
     def __init__(self, log_file_name: str = "api_access_log.jsonl"):
@@ -22,6 +40,7 @@ class LogAnalyzer:
                 if os.path.isdir("/logs"):
                     self.log_file_path = os.path.join("/logs", log_file_name)
                     print(f"Project root anchor not found, falling back to Docker log path: {self.log_file_path}")
+                    self._init_rollup_store()
                     return
                 raise FileNotFoundError("Project root could not be determined. Could not find 'pyproject.toml'.")
             project_root = parent_path
@@ -33,97 +52,231 @@ class LogAnalyzer:
              self.log_file_path = os.path.join("/logs", log_file_name)
 
         print(f"Log file path dynamically set to: {self.log_file_path}")
+        self._init_rollup_store()
+
+    def _init_rollup_store(self):
+        """
+        롤업 저장소(LOG_ROLLUP_DB, 기본값은 로그 디렉토리의 log_rollup.sqlite3)를 엽니다.
+        처음 사용하는 저장소는 첫 수집 때 보관 기간 내의 로그를 모두 읽어 채웁니다.
+        """
+        self.rollup_db_path = os.getenv("LOG_ROLLUP_DB") or os.path.join(
+            os.path.dirname(self.log_file_path), "log_rollup.sqlite3")
+        self.store = LogRollupStore(self.rollup_db_path)
+        self._ingest_lock = threading.Lock()
     
-    def parse_log_file(self) -> List[LogEntry]:
-        """JSONL 로그 파일을 파싱하여 LogEntry 객체 리스트로 반환"""
-        log_entries = []
-        
-        try:
-            if not os.path.exists(self.log_file_path):
-                print(f"Warning: Log file not found at {self.log_file_path}")
-                return log_entries
-                
-            with open(self.log_file_path, 'r', encoding='utf-8') as file:
-                for line in file:
-                    try:
-                        log_data = json.loads(line.strip())
-                        # timestamp 파싱
-                        log_data['timestamp'] = datetime.fromisoformat(log_data['timestamp'])
-                        log_entry = LogEntry(**log_data)
-                        log_entries.append(log_entry)
-                    except (json.JSONDecodeError, ValueError, TypeError) as e:
-                        # 파싱 실패한 라인은 건너뛰기
+    def log_file_paths(self, since: Optional[datetime] = None) -> List[str]:
+        """
+        현재 로그 파일과 회전된 세그먼트 경로를 오래된 순서로 반환
+        since가 주어지면 그 이후의 로그를 담을 수 있는 세그먼트만 반환합니다.
+        일별 세그먼트(api_access_log.jsonl.YYYY-MM-DD[.gz])는 파일 이름의 날짜로, 그 외에는 마지막 수정 시각으로 판단합니다.
+        """
+        log_dir = os.path.dirname(self.log_file_path)
+        base_name = os.path.basename(self.log_file_path)
+        if not os.path.isdir(log_dir):
+            return []
+        paths = []
+        for name in os.listdir(log_dir):
+            if name != base_name and not name.startswith(f"{base_name}."):
+                continue
+            path = os.path.join(log_dir, name)
+            if since is not None and name != base_name:
+                segment_day = SEGMENT_DATE_PATTERN.search(name)
+                if segment_day:
+                    if datetime.strptime(segment_day.group(1), "%Y-%m-%d").date() < since.date():
                         continue
-        except Exception as e:
-            print(f"로그 파일 읽기 실패: {e}")
-            
-        return log_entries
+                elif datetime.fromtimestamp(os.path.getmtime(path)) < since:
+                    continue
+            paths.append(path)
+        return sorted(paths, key=os.path.getmtime)
+
+    def _parse_line(self, line: bytes) -> Optional[LogEntry]:
+        """JSONL 한 줄을 LogEntry로 변환. 파싱 실패한 라인은 None"""
+        try:
+            log_data = json.loads(line)
+            # timestamp 파싱
+            log_data['timestamp'] = datetime.fromisoformat(log_data['timestamp'])
+            return LogEntry(**log_data)
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError):
+            return None
+
+    def _file_head(self, path: str, length: int = HEAD_BYTES) -> bytes:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, 'rb') as file:
+            return file.read(length)
+
+    def _make_checkpoint(self, stat: os.stat_result, offset: int) -> Dict[str, Any]:
+        head = self._file_head(self.log_file_path, min(offset, HEAD_BYTES))
+        return {
+            "inode": stat.st_ino,
+            "offset": offset,
+            "head_size": len(head),
+            "head": hashlib.sha1(head).hexdigest(),
+            "mtime": stat.st_mtime,
+        }
+
+    def _has_head(self, path: str, checkpoint: Dict[str, Any]) -> bool:
+        """파일이 체크포인트를 만든 파일과 같은 내용으로 시작하는지 확인"""
+        if not checkpoint["head_size"]:
+            return True
+        head = self._file_head(path, checkpoint["head_size"])
+        return hashlib.sha1(head).hexdigest() == checkpoint["head"]
+
+    def _ingest_file(self, path: str, offset: int, complete_lines_only: bool = False) -> int:
+        """
+        path의 offset 바이트부터 읽어 수집 중인 롤업에 반영하고, 다음에 읽을 위치를 반환
+        complete_lines_only이면 아직 쓰는 중인 마지막 줄(개행 없음)은 다음 수집으로 미룹니다.
+        """
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if complete_lines_only and not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                log_entry = self._parse_line(line)
+                if log_entry is not None:
+                    self._add_entry(log_entry)
+        return offset
+
+    def _add_entry(self, log: LogEntry):
+        key = rollup_key(log)
+        if key[0] < self._retention_cutoff_hour:
+            return
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = RollupCell()
+        cell.add(log)
+        if log.level == "ERROR":
+            self._errors.append(log)
+        self._ingested += 1
+
+    def _rotated_segments(self, since: Optional[datetime] = None) -> List[str]:
+        paths = [path for path in self.log_file_paths(since) if path != self.log_file_path]
+        # 압축 중인 세그먼트는 원본이 남아 있으므로 원본만 읽음
+        return [path for path in paths if not (path.endswith(".gz") and path[:-3] in paths)]
+
+    def _ingest_rotated_segments(self, checkpoint: Optional[Dict[str, Any]]):
+        """
+        마지막 체크포인트 이후 회전된 세그먼트를 읽음
+        체크포인트 당시의 파일(앞부분 해시가 같은 세그먼트, gzip 포함)은 offset부터, 그 뒤에 회전된 세그먼트는 처음부터 읽습니다.
+        체크포인트가 없으면(최초 실행) 보관 기간 내의 세그먼트를 모두 읽습니다.
+        """
+        since = None if checkpoint is not None else datetime.now() - timedelta(days=AGGREGATE_RETENTION_DAYS)
+        for path in self._rotated_segments(since):
+            try:
+                if checkpoint is None:
+                    self._ingest_file(path, 0)
+                elif os.path.getmtime(path) >= checkpoint["mtime"]:
+                    offset = checkpoint["offset"] if self._has_head(path, checkpoint) else 0
+                    self._ingest_file(path, offset)
+            except (OSError, EOFError) as e:
+                # 압축 중인 세그먼트 등 읽을 수 없는 파일은 건너뛰기
+                print(f"로그 세그먼트 읽기 실패: {path}: {e}")
+
+    def ingest(self) -> int:
+        """
+        롤업 수집 작업. 마지막 체크포인트 이후 추가된 로그만 읽어 롤업 저장소에 더하고, 읽은 로그 수를 반환
+        - 같은 파일(inode와 앞부분 해시가 같음)이면 offset부터 이어서 읽음
+        - 파일이 회전되었으면 회전된 세그먼트의 남은 부분을 읽고 새 파일을 처음부터 읽음
+        - 파일 크기가 offset보다 작아졌으면(truncate) 처음부터 다시 읽음
+        체크포인트 읽기부터 롤업 갱신까지 한 트랜잭션이므로 여러 프로세스가 동시에 수집해도 중복 집계되지 않습니다.
+        수집 중인 집계는 인스턴스에 두므로 같은 프로세스의 스레드(스레드풀에서 실행되는 라우트)끼리는 잠금으로 순서를 지킵니다.
+        """
+        with self._ingest_lock:
+            return self._ingest()
+
+    def _ingest(self) -> int:
+        self._retention_cutoff_hour = (datetime.now() - timedelta(days=AGGREGATE_RETENTION_DAYS)).strftime("%Y-%m-%d %H:00")
+        self._cells: Dict[tuple, RollupCell] = {}
+        self._errors: List[LogEntry] = []
+        self._ingested = 0
+        with self.store.transaction() as conn:
+            checkpoint = self.store.load_checkpoint(conn, self.log_file_path)
+            try:
+                stat = os.stat(self.log_file_path)
+            except FileNotFoundError:
+                stat = None
+
+            # 압축 후 삭제된 세그먼트의 inode를 새 파일이 재사용할 수 있으므로 앞부분 해시도 비교
+            rotated = (checkpoint is None or stat is None or stat.st_ino != checkpoint["inode"]
+                       or not self._has_head(self.log_file_path, checkpoint))
+            if rotated:
+                self._ingest_rotated_segments(checkpoint)
+                offset = 0
+            elif stat.st_size < checkpoint["offset"]:
+                offset = 0
+            else:
+                offset = checkpoint["offset"]
+
+            if stat is None:
+                # 현재 파일이 없으면 지금까지 회전된 세그먼트를 읽었다고 기록하고, 새 파일이 생기면 처음부터 읽음
+                checkpoint = {"inode": None, "offset": 0, "head_size": 0, "head": "", "mtime": time.time()}
+            elif rotated or offset != checkpoint["offset"] or stat.st_size > offset:
+                offset = self._ingest_file(self.log_file_path, offset, complete_lines_only=True)
+                checkpoint = self._make_checkpoint(os.stat(self.log_file_path), offset)
+            else:
+                return 0
+
+            self.store.save(conn, self.log_file_path, checkpoint, self._cells, self._errors, self._retention_cutoff_hour)
+        return self._ingested
+
+    def ingest_on_request(self) -> int:
+        """
+        대시보드 요청에서 호출하는 수집. 요청마다 한 번 호출한 뒤 analyze_logs, get_error_trends로 조회합니다.
+        LOG_ROLLUP_INGEST_ON_REQUEST=false이면 수집 작업에 맡기고 0을 반환합니다.
+        """
+        return self.ingest() if LOG_ROLLUP_INGEST_ON_REQUEST else 0
+
+    def _since_hour(self, days: int) -> str:
+        """최근 N일의 시작 시간대. 롤업은 시간 단위이므로 기준 시각이 속한 시간대부터 포함합니다."""
+        return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:00")
     
     def analyze_logs(self, days: int = 7) -> LogAnalysisResponse:
-        """로그를 분석하여 통계 정보 반환"""
-        log_entries = self.parse_log_file()
-        
-        # 최근 N일 데이터만 필터링
+        """
+        로그를 분석하여 통계 정보 반환
+        통계는 원본 로그 대신 기간에 해당하는 롤업 행을 합쳐 계산합니다. p95/p99는 응답 시간 스케치로 근사합니다.
+        """
         cutoff_date = datetime.now() - timedelta(days=days)
-        recent_logs = [log for log in log_entries if log.timestamp >= cutoff_date]
+        since_hour = self._since_hour(days)
+        summary = self.store.summary(since_hour)
+        hourly_counts = self.store.hourly_counts(since_hour)
         
         # 기본 통계
-        total_requests = len(recent_logs)
-        success_count = len([log for log in recent_logs if log.level == "INFO" and log.status == "success"])
-        error_count = len([log for log in recent_logs if log.level == "ERROR"])
-        warning_count = len([log for log in recent_logs if log.level == "WARNING"])
-        
-        success_rate = (success_count / total_requests * 100) if total_requests > 0 else 0
+        total_requests = summary["total"]
+        success_rate = (summary["success"] / total_requests * 100) if total_requests > 0 else 0
         
         # 응답 시간 분석
-        response_times = [log.response_time_ms for log in recent_logs if log.response_time_ms is not None]
-        average_response_time = sum(response_times) / len(response_times) if response_times else None
+        average_response_time = summary["response_sum"] / summary["response_count"] if summary["response_count"] else None
         
         # 엔드포인트 분석
-        endpoint_counter = Counter([log.endpoint for log in recent_logs if log.endpoint])
-        top_endpoints = [{"endpoint": endpoint, "count": count} 
-                        for endpoint, count in endpoint_counter.most_common(10)]
-        
-        # 에러 분포
-        error_messages = [log.error_message for log in recent_logs if log.error_message]
-        error_distribution = dict(Counter(error_messages))
-        
-        # 시간별 요청 분석
-        hourly_requests = self._get_hourly_requests(recent_logs)
-        daily_requests = self._get_daily_requests(recent_logs)
-        
-        # 상태 분포
-        status_counter = Counter([log.status for log in recent_logs if log.status])
-        status_distribution = dict(status_counter)
-        
-        # 서비스 사용량
-        service_counter = Counter([log.service_name for log in recent_logs if log.service_name])
-        service_usage = dict(service_counter)
+        top_endpoints = [{"endpoint": endpoint, "count": count}
+                        for endpoint, count in self.store.distribution("endpoint", since_hour, limit=10)]
         
         # 최근 에러들
-        recent_errors = [log for log in recent_logs if log.level == "ERROR"][:10]
+        recent_errors = self.store.recent_errors(cutoff_date.isoformat(), 10)
         
         # 성능 메트릭
+        latency = self.store.latency(since_hour)
         performance_metrics = {
-            "max_response_time": max(response_times) if response_times else 0,
-            "min_response_time": min(response_times) if response_times else 0,
-            "p95_response_time": self._calculate_percentile(response_times, 95) if response_times else 0,
-            "p99_response_time": self._calculate_percentile(response_times, 99) if response_times else 0,
+            "max_response_time": summary["response_max"] or 0,
+            "min_response_time": summary["response_min"] or 0,
+            "p95_response_time": self._percentile(latency, summary, 95),
+            "p99_response_time": self._percentile(latency, summary, 99),
         }
         
         statistics = LogStatistics(
             total_requests=total_requests,
-            success_count=success_count,
-            error_count=error_count,
-            warning_count=warning_count,
+            success_count=summary["success"],
+            error_count=summary["errors"],
+            warning_count=summary["warnings"],
             success_rate=round(success_rate, 2),
             average_response_time=round(average_response_time, 2) if average_response_time else None,
             top_endpoints=top_endpoints,
-            error_distribution=error_distribution,
-            hourly_requests=hourly_requests,
-            daily_requests=daily_requests,
-            status_distribution=status_distribution,
-            service_usage=service_usage
+            error_distribution=self.store.error_counts("error_messages", since_hour),
+            hourly_requests=[{"hour": row["hour"], "count": row["total"]} for row in hourly_counts],
+            daily_requests=self._get_daily_requests(hourly_counts),
+            status_distribution=dict(self.store.distribution("status", since_hour)),
+            service_usage=dict(self.store.distribution("service", since_hour))
         )
         
         return LogAnalysisResponse(
@@ -132,70 +285,30 @@ class LogAnalyzer:
             performance_metrics=performance_metrics
         )
     
-    def _get_hourly_requests(self, logs: List[LogEntry]) -> List[Dict[str, Any]]:
-        """시간별 요청 수 계산"""
-        hourly_count = defaultdict(int)
-        
-        for log in logs:
-            hour_key = log.timestamp.strftime("%Y-%m-%d %H:00")
-            hourly_count[hour_key] += 1
-        
-        return [{"hour": hour, "count": count} 
-                for hour, count in sorted(hourly_count.items())]
-    
-    def _get_daily_requests(self, logs: List[LogEntry]) -> List[Dict[str, Any]]:
+    def _get_daily_requests(self, hourly_counts) -> List[Dict[str, Any]]:
         """일별 요청 수 계산"""
         daily_count = defaultdict(int)
         
-        for log in logs:
-            day_key = log.timestamp.strftime("%Y-%m-%d")
-            daily_count[day_key] += 1
+        for row in hourly_counts:
+            daily_count[row["hour"][:10]] += row["total"]
         
         return [{"date": date, "count": count} 
                 for date, count in sorted(daily_count.items())]
     
-    def _calculate_percentile(self, values: List[float], percentile: int) -> float:
-        """백분위수 계산"""
-        if not values:
+    def _percentile(self, latency: LatencySketch, summary, percentile: int) -> float:
+        """응답 시간 백분위수 근사값. 버킷 대표값이 실제 최소/최대를 벗어나지 않도록 제한합니다."""
+        if not summary["response_count"]:
             return 0
-        
-        sorted_values = sorted(values)
-        index = int(len(sorted_values) * percentile / 100)
-        if index >= len(sorted_values):
-            index = len(sorted_values) - 1
-        return sorted_values[index]
+        return min(max(latency.percentile(percentile), summary["response_min"]), summary["response_max"])
     
     def get_error_trends(self, days: int = 7) -> Dict[str, Any]:
         """에러 트렌드 분석"""
-        log_entries = self.parse_log_file()
-        cutoff_date = datetime.now() - timedelta(days=days)
-        recent_logs = [log for log in log_entries if log.timestamp >= cutoff_date]
-        
-        error_logs = [log for log in recent_logs if log.level == "ERROR"]
-        
-        # 시간별 에러 발생량
-        error_by_hour = defaultdict(int)
-        for log in error_logs:
-            hour_key = log.timestamp.strftime("%Y-%m-%d %H:00")
-            error_by_hour[hour_key] += 1
-        
-        # 에러 타입별 분류
-        error_types = defaultdict(int)
-        for log in error_logs:
-            if "connection failed" in log.message.lower():
-                error_types["Connection Error"] += 1
-            elif "status code" in log.message.lower():
-                error_types["HTTP Error"] += 1
-            elif "validation error" in log.message.lower():
-                error_types["Validation Error"] += 1
-            elif "unexpected error" in log.message.lower():
-                error_types["Unexpected Error"] += 1
-            else:
-                error_types["Other"] += 1
+        since_hour = self._since_hour(days)
+        hourly_counts = self.store.hourly_counts(since_hour)
         
         return {
-            "error_by_hour": [{"hour": hour, "count": count} 
-                             for hour, count in sorted(error_by_hour.items())],
-            "error_types": dict(error_types),
-            "total_errors": len(error_logs)
+            "error_by_hour": [{"hour": row["hour"], "count": row["errors"]}
+                              for row in hourly_counts if row["errors"]],
+            "error_types": self.store.error_counts("error_types", since_hour),
+            "total_errors": sum(row["errors"] for row in hourly_counts)
         }
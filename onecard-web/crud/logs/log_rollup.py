@@ -0,0 +1,201 @@
+import json
+import os
+import sqlite3
+from collections import Counter
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from schemas.logs import LogEntry
+from crud.logs.log_aggregate import LatencySketch, RollupCell
+
+# 보관하는 최근 에러 로그 개수
+RECENT_ERROR_LIMIT = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_rollup (
+    hour TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    service TEXT NOT NULL,
+    status TEXT NOT NULL,
+    level TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    response_count INTEGER NOT NULL,
+    response_sum REAL NOT NULL,
+    response_max REAL,
+    response_min REAL,
+    latency TEXT NOT NULL,
+    error_messages TEXT NOT NULL,
+    error_types TEXT NOT NULL,
+    PRIMARY KEY (hour, endpoint, service, status, level)
+);
+CREATE TABLE IF NOT EXISTS log_recent_errors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS log_checkpoint (
+    log_file_path TEXT PRIMARY KEY,
+    checkpoint TEXT NOT NULL
+);
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO log_rollup (hour, endpoint, service, status, level, total, response_count, response_sum,
+                        response_max, response_min, latency, error_messages, error_types)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hour, endpoint, service, status, level) DO UPDATE SET
+    total = total + excluded.total,
+    response_count = response_count + excluded.response_count,
+    response_sum = response_sum + excluded.response_sum,
+    response_max = MAX(COALESCE(response_max, excluded.response_max), COALESCE(excluded.response_max, response_max)),
+    response_min = MIN(COALESCE(response_min, excluded.response_min), COALESCE(excluded.response_min, response_min)),
+    latency = ?,
+    error_messages = ?,
+    error_types = ?
+"""
+
+
+def _merge_json_counter(stored: str, delta: Dict[Any, int]) -> str:
+    counter = Counter(json.loads(stored))
+    counter.update({str(key): count for key, count in delta.items()})
+    return json.dumps(counter, ensure_ascii=False)
+
+
+class LogRollupStore:
+    """
+    시간별 로그 롤업 저장소 (SQLite)
+    - log_rollup: (시간, 엔드포인트, 서비스, 상태, 레벨)마다 한 행. 요청 수, 응답 시간 통계와 스케치, 에러 메시지/타입별 개수
+    - log_recent_errors: 최근 에러 로그 RECENT_ERROR_LIMIT개
+    - log_checkpoint: 로그 파일을 어디까지 집계했는지. 롤업과 같은 트랜잭션에서 갱신되므로 둘이 어긋나지 않습니다.
+    대시보드 통계는 원본 로그 대신 기간에 해당하는 롤업 행만 읽어 계산합니다.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        쓰기 트랜잭션. BEGIN IMMEDIATE로 시작하므로 여러 워커나 수집 작업이 동시에 실행되어도
+        체크포인트를 읽고 갱신하는 과정이 순서대로 처리되어 같은 로그를 두 번 집계하지 않습니다.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def load_checkpoint(self, conn: sqlite3.Connection, log_file_path: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute("SELECT checkpoint FROM log_checkpoint WHERE log_file_path = ?", (log_file_path,)).fetchone()
+        return json.loads(row["checkpoint"]) if row else None
+
+    def save(self,
+             conn: sqlite3.Connection,
+             log_file_path: str,
+             checkpoint: Dict[str, Any],
+             cells: Dict[Tuple[str, str, str, str, str], RollupCell],
+             errors: Iterable[LogEntry],
+             retention_cutoff_hour: str):
+        """
+        새로 읽은 로그의 집계를 기존 행에 더하고 체크포인트를 갱신
+        Args:
+        - cells: rollup_key -> 새로 읽은 로그의 RollupCell
+        - errors: 새로 읽은 에러 로그
+        - retention_cutoff_hour: 이 시간 이전의 롤업 행은 삭제
+        """
+        for key, cell in cells.items():
+            stored = conn.execute(
+                "SELECT latency, error_messages, error_types FROM log_rollup "
+                "WHERE hour = ? AND endpoint = ? AND service = ? AND status = ? AND level = ?", key
+            ).fetchone()
+            latency = cell.latency
+            if stored:
+                latency = LatencySketch.from_dict(json.loads(stored["latency"]))
+                latency.merge(cell.latency)
+            merged = (json.dumps(latency.to_dict()),
+                      _merge_json_counter(stored["error_messages"] if stored else "{}", cell.error_messages),
+                      _merge_json_counter(stored["error_types"] if stored else "{}", cell.error_types))
+            conn.execute(UPSERT_ROLLUP, (*key, cell.total, cell.response_count, cell.response_sum,
+                                         cell.response_max, cell.response_min, *merged, *merged))
+        conn.executemany("INSERT INTO log_recent_errors (timestamp, entry) VALUES (?, ?)",
+                         [(log.timestamp.isoformat(), log.model_dump_json()) for log in errors])
+        conn.execute("DELETE FROM log_recent_errors WHERE id <= (SELECT MAX(id) FROM log_recent_errors) - ?",
+                     (RECENT_ERROR_LIMIT,))
+        conn.execute("DELETE FROM log_rollup WHERE hour < ?", (retention_cutoff_hour,))
+        conn.execute("INSERT INTO log_checkpoint (log_file_path, checkpoint) VALUES (?, ?) "
+                     "ON CONFLICT (log_file_path) DO UPDATE SET checkpoint = excluded.checkpoint",
+                     (log_file_path, json.dumps(checkpoint)))
+
+    def hourly_counts(self, since_hour: str) -> List[sqlite3.Row]:
+        """시간별 요청 수와 에러 수 (hour, total, errors)"""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT hour, SUM(total) AS total, SUM(CASE WHEN level = 'ERROR' THEN total ELSE 0 END) AS errors "
+                "FROM log_rollup WHERE hour >= ? GROUP BY hour ORDER BY hour", (since_hour,)
+            ).fetchall()
+
+    def summary(self, since_hour: str) -> sqlite3.Row:
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT COALESCE(SUM(total), 0) AS total, "
+                "COALESCE(SUM(CASE WHEN level = 'INFO' AND status = 'success' THEN total ELSE 0 END), 0) AS success, "
+                "COALESCE(SUM(CASE WHEN level = 'ERROR' THEN total ELSE 0 END), 0) AS errors, "
+                "COALESCE(SUM(CASE WHEN level = 'WARNING' THEN total ELSE 0 END), 0) AS warnings, "
+                "COALESCE(SUM(response_count), 0) AS response_count, COALESCE(SUM(response_sum), 0) AS response_sum, "
+                "MAX(response_max) AS response_max, MIN(response_min) AS response_min "
+                "FROM log_rollup WHERE hour >= ?", (since_hour,)
+            ).fetchone()
+
+    def distribution(self, column: str, since_hour: str, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """column(endpoint, service, status)별 요청 수, 많은 순서"""
+        if column not in ("endpoint", "service", "status"):
+            raise ValueError(f"Unknown rollup column: {column}")
+        query = (f"SELECT {column} AS value, SUM(total) AS count FROM log_rollup "
+                 f"WHERE hour >= ? AND {column} != '' GROUP BY {column} ORDER BY count DESC, {column}")
+        params: Tuple[Any, ...] = (since_hour,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        with closing(self._connect()) as conn:
+            return [(row["value"], row["count"]) for row in conn.execute(query, params)]
+
+    def latency(self, since_hour: str) -> LatencySketch:
+        """기간의 응답 시간 스케치. 행마다 저장된 스케치의 버킷 개수를 SQLite JSON 함수로 합칩니다."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT CAST(bucket.key AS INTEGER) AS bucket, SUM(bucket.value) AS count "
+                "FROM log_rollup, json_each(log_rollup.latency) AS bucket "
+                "WHERE hour >= ? AND response_count > 0 GROUP BY bucket.key", (since_hour,)
+            ).fetchall()
+        return LatencySketch({row["bucket"]: row["count"] for row in rows})
+
+    def error_counts(self, column: str, since_hour: str) -> Dict[str, int]:
+        """error_messages 또는 error_types 별 개수"""
+        if column not in ("error_messages", "error_types"):
+            raise ValueError(f"Unknown rollup column: {column}")
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT item.key AS key, SUM(item.value) AS count "
+                f"FROM log_rollup, json_each(log_rollup.{column}) AS item "
+                f"WHERE hour >= ? AND {column} != '{{}}' GROUP BY item.key", (since_hour,)
+            ).fetchall()
+        return {row["key"]: row["count"] for row in rows}
+
+    def recent_errors(self, since: str, limit: int) -> List[LogEntry]:
+        """since(ISO 시각) 이후의 최근 에러 로그 limit개, 오래된 순서"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT entry FROM log_recent_errors WHERE timestamp >= ? ORDER BY id DESC LIMIT ?",
+                                (since, limit)).fetchall()
+        return [LogEntry.model_validate_json(row["entry"]) for row in reversed(rows)]
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from models.employee import Employee
 from models.service import Services
 from models.permission import permission_table
+from utils.perm_blocklist import add_blocked, remove_blocked
 
 def block_department_from_service(client_id: str, 
                                   department_name: str,
@@ -26,6 +27,7 @@ def block_department_from_service(client_id: str,
             
     db.commit()
     db.refresh(service)
+    add_blocked(service, db, [emp.emp_no for emp in employees_in_dept])
     print(f"Success: Blocked {len(employees_in_dept)} employees from department '{department_name}' for service '{service.name}'.")
     
     return service
@@ -64,6 +66,7 @@ def unblock_department_from_service(client_id:str,
         ) 
         result = db.execute(perm)
         db.commit()
+        remove_blocked(service, db, emp_no_in_dept)
         print(f"Success: Unblocked employees from department '{department_name}' for service '{service.name}'.")
     else:
         print(f"Info: No employees to unblock in department '{department_name}'.")         
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from models.employee import Employee
 from models.service import Services
 from models.permission import permission_table
+from utils.perm_blocklist import add_blocked, remove_blocked
 
 def block_employee_from_service(client_id:str,
                                 emp_no:str,
@@ -31,6 +32,7 @@ def block_employee_from_service(client_id:str,
         service.employees.append(employee)
         db.commit()
         db.refresh(service)
+    add_blocked(service, db, [employee.emp_no])
     
     return service
 
@@ -63,6 +65,7 @@ def unblock_employee_from_service(client_id:str,
     )
     result = db.execute(perm)
     db.commit()
+    remove_blocked(service, db, [employee.emp_no])
     
     if result.rowcount > 0:
         print(f"Success: Unblocked Employee{employee.name}")
@@ -4,7 +4,11 @@ from sqlalchemy.exc import IntegrityError
 from models.employee import Employee
 from models.pubkey import Pubkey
 from schemas.card import ManageCard
+from utils.invalidate import publish_invalidation
+from utils.session_revoke import revoke_card_sessions
+from utils.redis_const import REDIS_PUBKEY_INVALIDATE_CHANNEL
 import logging
+import redis
 
 def manage_card(request:ManageCard, db:Session, current_user:dict):
     """
@@ -21,11 +25,22 @@ def manage_card(request:ManageCard, db:Session, current_user:dict):
         if not existing_pubkey:
             raise HTTPException(status_code=404,
                                 detail="No existing public key found for this employee to update")
+        old_pubkey = existing_pubkey.pubkey
         existing_pubkey.pubkey = request.pubkey
         db.commit()
         db.refresh(existing_pubkey)
         logging.info(f"Updated public key for emp_no:{request.emp_no}")
-        return {"message" : f"Successfully updated public key {request.emp_no}"}
+        # Drop the stale parsed key cached by onecard-api
+        publish_invalidation(REDIS_PUBKEY_INVALIDATE_CHANNEL, old_pubkey)
+        response = {"message" : f"Successfully updated public key {request.emp_no}"}
+        # Sessions opened with the replaced card must not outlive it. The new key is already committed,
+        # so a Redis failure is reported with the response instead of failing the request
+        try:
+            revoke_card_sessions(old_pubkey)
+        except redis.RedisError as e:
+            logging.error(f"Failed to revoke sessions of the replaced card of emp_no:{request.emp_no}:{e}")
+            response["warning"] = "Sessions opened with the replaced card could not be revoked. Retry with /api/revoke/card"
+        return response
     else:
         pubkey_data = Pubkey(
             pubkey=request.pubkey,
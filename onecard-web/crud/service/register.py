@@ -4,6 +4,9 @@ from uuid import UUID
 from models.service import Services, RedirectUris
 from schemas.service import RegisterService, AddRedirectUris
 from utils.gen import gen_client_secret, gen_client_id
+from utils.invalidate import publish_invalidation
+from utils.redis_const import REDIS_CLIENT_INVALIDATE_CHANNEL
+from utils.perm_blocklist import init_blocklist
 
 def create_service(service:RegisterService, 
                      db:Session,
@@ -32,6 +35,8 @@ def create_service(service:RegisterService,
     db.add(new_service)
     db.commit()
     db.refresh(new_service)
+    publish_invalidation(REDIS_CLIENT_INVALIDATE_CHANNEL, client_id)
+    init_blocklist(new_service, db)
     
     return new_service 
         
@@ -68,6 +73,7 @@ def add_or_update_redirect_uris(client_id:str,
                                     uris=str(uri))
         db.add(redirect_uri)
     db.commit()
+    publish_invalidation(REDIS_CLIENT_INVALIDATE_CHANNEL, client_id)
     return {"message" : f"Successfully added Redirect URIs"}
     
     # exisiting_uris = {uri.uris for uri in service.redirect_uris}
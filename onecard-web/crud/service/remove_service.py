@@ -2,6 +2,9 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from uuid import UUID
 from models.service import Services
+from utils.invalidate import publish_invalidation
+from utils.redis_const import REDIS_CLIENT_INVALIDATE_CHANNEL
+from utils.perm_blocklist import drop_blocklist
 
 def remove_service(client_id:str,
                    db:Session,
@@ -16,5 +19,7 @@ def remove_service(client_id:str,
                             detail="Only the owner can delete this service")
     db.delete(service)
     db.commit()
+    publish_invalidation(REDIS_CLIENT_INVALIDATE_CHANNEL, client_id)
+    drop_blocklist(client_id)
     
     return {"message" : "Serivce deleted successfully"}
\ No newline at end of file
@@ -5,6 +5,7 @@ from api.v1.service import service_router
 from api.v1.permission import perm_router
 from api.v1.manage_card import card_router
 from api.v1.logs import router as logs_router
+from api.v1.session import session_router
 from routers.routers import admin_router
 
 app = FastAPI()
@@ -15,6 +16,7 @@ app.include_router(service_router)
 app.include_router(perm_router)
 app.include_router(card_router)
 app.include_router(logs_router)
+app.include_router(session_router)
 
 if __name__ == "__main__":
     uvicorn.run(app, 
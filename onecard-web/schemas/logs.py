@@ -15,8 +15,9 @@ class LogEntry(BaseModel):
     timestamp: datetime
     level: LogLevel
     message: str
-    pathname: str
-    lineno: int
+    pathname: Optional[str] = None  # Written by older onecard-api releases, replaced by logger
+    logger: Optional[str] = None
+    lineno: Optional[int] = None
     taskName: Optional[str] = None
     service_name: Optional[str] = None
     client_id: Optional[str] = None
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+class RevokeEmployeeSessions(BaseModel):
+    emp_no:str
+
+class RevokeCardSessions(BaseModel):
+    pubkey:str
@@ -0,0 +1,33 @@
+"""
+Shared fixtures of the onecard-web tests
+Every module that calls core.redis.redis_config() at import time gets the same fakeredis client
+(Lua scripts run on lupa), so the tests need no running Redis or Postgres.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("REDIS_DATABASE", "0")
+os.environ.setdefault("ACCESS_SECRET_KEY", "test_access_secret")
+os.environ.setdefault("REFRESH_SECRET_KEY", "test_refresh_secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("AT_EXPIRE_MINUTES", "5")
+os.environ.setdefault("RT_EXPIRE_DAYS", "1")
+os.environ.setdefault("SECRET_KEY", "test_session_secret")
+# api.v1.logs opens the rollup store at import time, keep it out of the repository's logs directory
+os.environ.setdefault("LOG_ROLLUP_DB", os.path.join(tempfile.mkdtemp(), "log_rollup.sqlite3"))
+
+import fakeredis
+import pytest
+import core.redis
+
+fake_redis = fakeredis.FakeRedis()
+core.redis.redis_config = lambda: fake_redis
+
+@pytest.fixture
+def rd():
+    fake_redis.flushall()
+    yield fake_redis
+    fake_redis.flushall()
@@ -0,0 +1,128 @@
+"""
+LogAnalyzer.ingest: incremental tailing of the access log across appends, partial lines, rotation, gzip, truncation and restarts
+"""
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+import pytest
+from crud.logs.log_analyzer import LogAnalyzer
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_ROLLUP_DB", str(tmp_path / "log_rollup.sqlite3"))
+    return str(tmp_path / "api_access_log.jsonl")
+
+def make_analyzer(log_path:str)->LogAnalyzer:
+    analyzer = LogAnalyzer()
+    analyzer.log_file_path = log_path
+    return analyzer
+
+def write_logs(path:str, count:int, days_ago:int=0, level:str="INFO"):
+    with open(path, 'a', encoding="utf-8") as file:
+        for index in range(count):
+            timestamp = datetime.now() - timedelta(days=days_ago, seconds=count - index)
+            file.write(json.dumps({"timestamp" : timestamp.isoformat(), "level" : level, "message" : "request",
+                                   "endpoint" : "POST /api/v1/token", "status" : "success",
+                                   "response_time_ms" : 10.0}, separators=(',', ':')) + "\n")
+
+def rotate(path:str, day:datetime, compress:bool=True)->str:
+    segment = f"{path}.{day.strftime('%Y-%m-%d')}"
+    os.rename(path, segment)
+    if not compress:
+        return segment
+    with open(segment, 'rb') as source, gzip.open(f"{segment}.gz", 'wb') as archive:
+        shutil.copyfileobj(source, archive)
+    shutil.copystat(segment, f"{segment}.gz")
+    os.remove(segment)
+    return f"{segment}.gz"
+
+def total(analyzer:LogAnalyzer)->int:
+    return analyzer.store.summary("0000-00-00 00:00")["total"]
+
+def test_first_ingest_reads_every_segment_in_the_retention(log_path):
+    write_logs(log_path, 4, days_ago=40)
+    rotate(log_path, datetime.now() - timedelta(days=40))
+    write_logs(log_path, 5, days_ago=2)
+    rotate(log_path, datetime.now() - timedelta(days=2))
+    write_logs(log_path, 3, days_ago=1)
+    rotate(log_path, datetime.now() - timedelta(days=1), compress=False)
+    write_logs(log_path, 2)
+
+    analyzer = make_analyzer(log_path)
+    assert analyzer.ingest() == 10
+    assert total(analyzer) == 10
+
+def test_only_appended_lines_are_read(log_path):
+    write_logs(log_path, 3)
+    analyzer = make_analyzer(log_path)
+    assert analyzer.ingest() == 3
+    assert analyzer.ingest() == 0
+
+    write_logs(log_path, 2, level="ERROR")
+    assert analyzer.ingest() == 2
+    assert total(analyzer) == 5
+    assert analyzer.store.summary("0000-00-00 00:00")["errors"] == 2
+
+def test_partial_line_waits_for_its_newline(log_path):
+    write_logs(log_path, 1)
+    analyzer = make_analyzer(log_path)
+    with open(log_path, 'a', encoding="utf-8") as file:
+        file.write('{"timestamp":"')
+    assert analyzer.ingest() == 1
+
+    with open(log_path, 'a', encoding="utf-8") as file:
+        file.write(f'{datetime.now().isoformat()}","level":"INFO","message":"late"}}\n')
+    assert analyzer.ingest() == 1
+    assert total(analyzer) == 2
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_rotation_reads_the_missed_tail_and_the_new_file(log_path, compress):
+    write_logs(log_path, 5)
+    analyzer = make_analyzer(log_path)
+    assert analyzer.ingest() == 5
+
+    write_logs(log_path, 3)
+    rotate(log_path, datetime.now(), compress=compress)
+    write_logs(log_path, 2)
+    assert analyzer.ingest() == 5
+    assert total(analyzer) == 10
+
+def test_segment_being_compressed_is_read_once(log_path):
+    write_logs(log_path, 5)
+    analyzer = make_analyzer(log_path)
+    analyzer.ingest()
+
+    write_logs(log_path, 3)
+    segment = rotate(log_path, datetime.now(), compress=False)
+    with open(segment, 'rb') as source, gzip.open(f"{segment}.gz", 'wb') as archive:
+        shutil.copyfileobj(source, archive)
+    write_logs(log_path, 2)
+    assert analyzer.ingest() == 5
+
+def test_truncated_file_is_read_from_the_start(log_path):
+    write_logs(log_path, 5)
+    analyzer = make_analyzer(log_path)
+    analyzer.ingest()
+
+    open(log_path, 'w').close()
+    write_logs(log_path, 2)
+    assert analyzer.ingest() == 2
+    assert total(analyzer) == 7
+
+def test_restart_continues_from_the_checkpoint(log_path):
+    write_logs(log_path, 5)
+    make_analyzer(log_path).ingest()
+
+    write_logs(log_path, 2)
+    restarted = make_analyzer(log_path)
+    assert restarted.ingest() == 2
+    assert total(restarted) == 7
+
+def test_missing_log_file_is_not_an_error(log_path):
+    analyzer = make_analyzer(log_path)
+    assert analyzer.ingest() == 0
+
+    write_logs(log_path, 2)
+    assert analyzer.ingest() == 2
@@ -0,0 +1,188 @@
+"""
+Hourly SQLite rollup: LogRollupStore merging and retention, LogAnalyzer statistics against the raw logs, and the logs routes
+"""
+import inspect
+import json
+import math
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from api.v1 import logs as logs_api
+from crud.logs import log_analyzer as log_analyzer_module
+from crud.logs.log_aggregate import RollupCell, rollup_key
+from crud.logs.log_analyzer import LogAnalyzer
+from crud.logs.log_rollup import LogRollupStore, RECENT_ERROR_LIMIT
+from schemas.logs import LogEntry
+
+ALL_HOURS = "0000-00-00 00:00"
+
+def log_entry(timestamp:datetime, level:str="INFO", endpoint:str="POST /api/v1/token", status:str="success",
+              response_time_ms:float=10.0, error_message:str=None, message:str="request")->LogEntry:
+    return LogEntry(timestamp=timestamp, level=level, message=message, endpoint=endpoint, service_name="svc",
+                    status=status, response_time_ms=response_time_ms, error_message=error_message)
+
+def cells_of(*logs:LogEntry)->dict:
+    cells = {}
+    for log in logs:
+        cells.setdefault(rollup_key(log), RollupCell()).add(log)
+    return cells
+
+def save(store:LogRollupStore, logs, cutoff_hour:str=ALL_HOURS, errors=()):
+    with store.transaction() as conn:
+        store.save(conn, "api_access_log.jsonl", {"offset" : 0}, cells_of(*logs), errors, cutoff_hour)
+
+@pytest.fixture
+def store(tmp_path):
+    return LogRollupStore(str(tmp_path / "log_rollup.sqlite3"))
+
+def test_save_adds_to_the_stored_rows(store):
+    hour = datetime(2025, 1, 31, 10, 5)
+    save(store, [log_entry(hour, response_time_ms=10.0), log_entry(hour, response_time_ms=30.0)])
+    save(store, [log_entry(hour + timedelta(minutes=1), response_time_ms=5.0),
+                 log_entry(hour, level="ERROR", status="failed", response_time_ms=None,
+                           error_message="boom", message="connection failed")])
+
+    summary = store.summary(ALL_HOURS)
+    assert (summary["total"], summary["success"], summary["errors"]) == (4, 3, 1)
+    assert (summary["response_count"], summary["response_sum"]) == (3, 45.0)
+    assert (summary["response_max"], summary["response_min"]) == (30.0, 5.0)
+    assert sum(store.latency(ALL_HOURS).buckets.values()) == 3
+    assert store.error_counts("error_messages", ALL_HOURS) == {"boom" : 1}
+    assert store.error_counts("error_types", ALL_HOURS) == {"Connection Error" : 1}
+    assert [tuple(row) for row in store.hourly_counts(ALL_HOURS)] == [("2025-01-31 10:00", 4, 1)]
+
+def test_queries_only_read_the_window(store):
+    save(store, [log_entry(datetime(2025, 1, 30, 23, 59)), log_entry(datetime(2025, 1, 31, 0, 0), endpoint="GET /a"),
+                 log_entry(datetime(2025, 1, 31, 1, 0), endpoint="GET /a")])
+    assert store.summary("2025-01-31 00:00")["total"] == 2
+    assert store.distribution("endpoint", "2025-01-31 00:00") == [("GET /a", 2)]
+    assert store.distribution("endpoint", ALL_HOURS, limit=1) == [("GET /a", 2)]
+    with pytest.raises(ValueError):
+        store.distribution("hour; DROP TABLE log_rollup", ALL_HOURS)
+
+def test_retention_and_recent_errors_are_bounded(store):
+    save(store, [log_entry(datetime(2025, 1, 1, 0, 0))])
+    errors = [log_entry(datetime(2025, 1, 31, 0, 0) + timedelta(seconds=index), level="ERROR") for index in range(RECENT_ERROR_LIMIT + 5)]
+    save(store, [log_entry(datetime(2025, 1, 31, 0, 0))], cutoff_hour="2025-01-02 00:00", errors=errors)
+
+    assert store.summary(ALL_HOURS)["total"] == 1
+    recent = store.recent_errors(ALL_HOURS, RECENT_ERROR_LIMIT + 5)
+    assert len(recent) == RECENT_ERROR_LIMIT
+    assert recent[-1].timestamp == errors[-1].timestamp
+
+def test_failed_transaction_keeps_the_previous_rollup(store):
+    save(store, [log_entry(datetime(2025, 1, 31, 0, 0))])
+    with pytest.raises(RuntimeError):
+        with store.transaction() as conn:
+            store.save(conn, "api_access_log.jsonl", {"offset" : 99}, cells_of(log_entry(datetime(2025, 1, 31, 0, 0))), [], ALL_HOURS)
+            raise RuntimeError("ingest failed")
+    assert store.summary(ALL_HOURS)["total"] == 1
+    with store.transaction() as conn:
+        assert store.load_checkpoint(conn, "api_access_log.jsonl") == {"offset" : 0}
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_ROLLUP_DB", str(tmp_path / "log_rollup.sqlite3"))
+    analyzer = LogAnalyzer()
+    analyzer.log_file_path = str(tmp_path / "api_access_log.jsonl")
+    return analyzer
+
+def write_logs(analyzer:LogAnalyzer, logs):
+    with open(analyzer.log_file_path, 'a', encoding="utf-8") as file:
+        for log in logs:
+            file.write(json.dumps(log.model_dump(mode="json", exclude_none=True)) + "\n")
+
+def sample_logs():
+    now = datetime.now()
+    logs = []
+    for index in range(200):
+        timestamp = now - timedelta(hours=index % 96, minutes=index % 7)
+        if index % 10 == 0:
+            logs.append(log_entry(timestamp, level="ERROR", status="failed", endpoint="GET /b",
+                                  error_message="boom", message="status code 500", response_time_ms=None))
+        elif index % 13 == 0:
+            logs.append(log_entry(timestamp, level="WARNING", status="failed", response_time_ms=float(index)))
+        else:
+            logs.append(log_entry(timestamp, endpoint="POST /a" if index % 2 else "GET /b", response_time_ms=float(index)))
+    return logs
+
+@pytest.mark.parametrize("days", [1, 3, 7])
+def test_analysis_matches_the_raw_logs(analyzer, days):
+    logs = sample_logs()
+    write_logs(analyzer, logs)
+    assert analyzer.ingest() == len(logs)
+
+    since_hour = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:00")
+    window = [log for log in logs if log.timestamp.strftime("%Y-%m-%d %H:00") >= since_hour]
+    statistics = analyzer.analyze_logs(days=days).statistics
+    assert statistics.total_requests == len(window)
+    assert statistics.error_count == sum(log.level == "ERROR" for log in window)
+    assert statistics.warning_count == sum(log.level == "WARNING" for log in window)
+    assert statistics.success_count == sum(log.level == "INFO" and log.status == "success" for log in window)
+    assert {item["endpoint"] : item["count"] for item in statistics.top_endpoints} == dict(Counter(log.endpoint for log in window))
+    assert statistics.status_distribution == dict(Counter(log.status for log in window))
+    assert sum(item["count"] for item in statistics.daily_requests) == len(window)
+
+    times = sorted(log.response_time_ms for log in window if log.response_time_ms is not None)
+    exact_p95 = times[min(math.ceil(len(times) * 0.95) - 1, len(times) - 1)]
+    assert analyzer.analyze_logs(days=days).performance_metrics["p95_response_time"] == pytest.approx(exact_p95, rel=0.05)
+
+    trends = analyzer.get_error_trends(days=days)
+    assert trends["total_errors"] == statistics.error_count
+    assert trends["error_types"] == {"HTTP Error" : statistics.error_count}
+
+def test_queries_do_not_ingest(analyzer):
+    write_logs(analyzer, sample_logs())
+    assert analyzer.analyze_logs(days=7).statistics.total_requests == 0
+    assert analyzer.get_error_trends(days=7)["total_errors"] == 0
+
+def test_ingest_on_request_can_be_turned_off(analyzer, monkeypatch):
+    write_logs(analyzer, sample_logs())
+    monkeypatch.setattr(log_analyzer_module, "LOG_ROLLUP_INGEST_ON_REQUEST", False)
+    assert analyzer.ingest_on_request() == 0
+    monkeypatch.setattr(log_analyzer_module, "LOG_ROLLUP_INGEST_ON_REQUEST", True)
+    assert analyzer.ingest_on_request() == 200
+
+def test_concurrent_ingests_count_each_line_once(analyzer):
+    write_logs(analyzer, sample_logs())
+    threads = [threading.Thread(target=analyzer.ingest) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert analyzer.store.summary(ALL_HOURS)["total"] == 200
+
+@pytest.fixture
+def client(analyzer, monkeypatch):
+    ingests = []
+    real_ingest = analyzer.ingest
+    def counting_ingest():
+        ingests.append(threading.current_thread().name)
+        return real_ingest()
+    monkeypatch.setattr(analyzer, "ingest", counting_ingest)
+    monkeypatch.setattr(logs_api, "log_analyzer", analyzer)
+    app = FastAPI()
+    app.include_router(logs_api.router)
+    with TestClient(app) as test_client:
+        test_client.ingests = ingests
+        yield test_client
+
+def test_routes_run_in_the_threadpool():
+    for route in logs_api.router.routes:
+        assert not inspect.iscoroutinefunction(route.endpoint), route.path
+
+@pytest.mark.parametrize("path", ["/api/v1/logs/analysis", "/api/v1/logs/error-trends", "/api/v1/logs/dashboard-data"])
+def test_each_request_ingests_once(client, analyzer, path):
+    write_logs(analyzer, sample_logs())
+    response = client.get(path, params={"days" : 7})
+    assert response.status_code == 200
+    assert len(client.ingests) == 1
+
+def test_dashboard_data(client, analyzer):
+    write_logs(analyzer, sample_logs())
+    body = client.get("/api/v1/logs/dashboard-data", params={"days" : 7}).json()
+    assert body["summary"]["total_requests"] == 200
+    assert body["error_trends"]["total_errors"] == body["summary"]["error_count"] == 20
@@ -0,0 +1,120 @@
+"""
+Per-service blocklist sets and their generation counter
+"""
+import pytest
+import redis
+from types import SimpleNamespace
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from core.database import Base
+from models.employee import Employee # noqa: F401, registers the tables referenced by permission
+from models.service import Services # noqa: F401
+from models.user import Users # noqa: F401
+from models.permission import permission_table
+from utils import perm_blocklist
+from utils.perm_blocklist import add_blocked, remove_blocked, rebuild_blocklist, drop_blocklist, init_blocklist
+
+SERVICE = SimpleNamespace(id=1, client_id="client-1")
+KEY = "perm_block:client-1"
+GENERATION_KEY = "perm_block_gen:client-1"
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'perm.sqlite3'}")
+    Base.metadata.create_all(engine, tables=[permission_table])
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def db(session_factory):
+    with session_factory() as session:
+        yield session
+
+def block(db, *emp_nos:str):
+    db.execute(insert(permission_table), [{"service_id" : SERVICE.id, "emp_no" : emp_no} for emp_no in emp_nos])
+    db.commit()
+
+def members(rd)->set:
+    return {member.decode() for member in rd.smembers(KEY)}
+
+def test_rebuild_materializes_the_permission_table(rd, db):
+    block(db, "E001", "E002")
+    assert rebuild_blocklist(SERVICE, db) == 2
+    assert members(rd) == {"__ready__", "E001", "E002"}
+
+def test_init_blocklist_marks_an_empty_set_ready(rd, db):
+    init_blocklist(SERVICE, db)
+    assert members(rd) == {"__ready__"}
+
+def test_changes_update_a_ready_set_and_move_the_generation(rd, db):
+    rebuild_blocklist(SERVICE, db)
+    block(db, "E001")
+
+    add_blocked(SERVICE, db, ["E001"])
+    assert members(rd) == {"__ready__", "E001"}
+    remove_blocked(SERVICE, db, ["E001"])
+    assert members(rd) == {"__ready__"}
+    assert rd.get(GENERATION_KEY) == b"2"
+    assert rd.ttl(GENERATION_KEY) > 0
+
+def test_change_without_a_set_rebuilds_it(rd, db):
+    block(db, "E001", "E002")
+    add_blocked(SERVICE, db, ["E002"])
+    assert members(rd) == {"__ready__", "E001", "E002"}
+
+def test_stale_rebuild_does_not_overwrite_a_concurrent_change(rd, db, session_factory, monkeypatch):
+    """
+    Another worker commits and syncs a change between this rebuild's snapshot and its write.
+    The stale snapshot is refused and the rebuild retried with a snapshot that holds the change
+    """
+    block(db, "E001")
+    execute = db.execute
+    snapshots = []
+
+    def execute_then_concurrent_change(*args, **kwargs):
+        emp_nos = execute(*args, **kwargs).scalars().all()
+        snapshots.append(emp_nos)
+        if len(snapshots) == 1:
+            with session_factory() as other_db:
+                block(other_db, "E002")
+                add_blocked(SERVICE, other_db, ["E002"])
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: emp_nos))
+
+    monkeypatch.setattr(db, "execute", execute_then_concurrent_change)
+    assert rebuild_blocklist(SERVICE, db) == 2
+
+    assert snapshots[0] == ["E001"]
+    assert members(rd) == {"__ready__", "E001", "E002"}
+
+def test_rebuild_that_keeps_losing_drops_the_set(rd, db, monkeypatch):
+    rd.sadd(KEY, "__ready__", "E009")
+    execute = db.execute
+
+    def execute_then_concurrent_change(*args, **kwargs):
+        rd.incr(GENERATION_KEY)
+        return execute(*args, **kwargs)
+
+    monkeypatch.setattr(db, "execute", execute_then_concurrent_change)
+    assert rebuild_blocklist(SERVICE, db) is None
+    assert rd.exists(KEY) == 0
+
+def test_drop_moves_the_generation(rd):
+    rd.sadd(KEY, "__ready__")
+    drop_blocklist(SERVICE.client_id)
+    assert rd.exists(KEY) == 0
+    assert rd.get(GENERATION_KEY) == b"1"
+
+def test_large_blocklist_is_written_in_chunks(rd, db):
+    emp_nos = [f"E{i:05d}" for i in range(2500)]
+    block(db, *emp_nos)
+    assert rebuild_blocklist(SERVICE, db) == 2500
+    assert rd.scard(KEY) == 2501
+
+def test_redis_failure_drops_the_set(rd, db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise redis.ConnectionError("down")
+
+    rd.sadd(KEY, "__ready__")
+    monkeypatch.setattr(perm_blocklist, "_update_if_ready", fail)
+    add_blocked(SERVICE, db, ["E001"])
+    assert rd.exists(KEY) == 0
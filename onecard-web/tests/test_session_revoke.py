@@ -0,0 +1,117 @@
+"""
+Bulk session revocation (employee / card), its endpoints and the card replacement that triggers it
+"""
+import datetime
+import pytest
+import redis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core.database import Base, get_db
+from models.employee import Employee
+from models.pubkey import Pubkey
+from models.service import Services # noqa: F401, registers the tables referenced by Employee
+from models.user import Users # noqa: F401
+from api.v1 import session as session_api
+from api.v1.session import session_router
+from crud.register_card import manage_card as manage_card_module
+from crud.register_card.manage_card import manage_card
+from schemas.card import ManageCard
+from utils.current_user import current_user_info
+from utils.session_revoke import revoke_employee_sessions, revoke_card_sessions
+
+SESSION_TTL = 3600
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'web.sqlite3'}")
+    Base.metadata.create_all(engine, tables=[Employee.__table__, Pubkey.__table__])
+    with sessionmaker(bind=engine)() as session:
+        for emp_no, pubkey in (("E001", "04aa"), ("E002", "04bb")):
+            session.add(Employee(emp_no=emp_no, name="test", phone_num="010", position="staff", department="test",
+                                 birth=datetime.date(2000, 1, 1), email="test@example.com"))
+            session.add(Pubkey(pubkey=pubkey, emp_no=emp_no, created_at=datetime.datetime.now()))
+        session.commit()
+        yield session
+    engine.dispose()
+
+def open_session(rd, s_id:str, emp_no:str, pubkey:str, indexed:bool=True):
+    """
+    Keys written by onecard-api for one OAuth session
+    """
+    rd.set(f"sess_pub:{s_id}", pubkey, ex=SESSION_TTL)
+    rd.set(f"pub_sess:{pubkey}", s_id, ex=SESSION_TTL)
+    rd.hset(f"sess_claims:{s_id}", mapping={"sub" : emp_no, "name" : "test", "email" : "test@example.com"})
+    rd.set(f"refresh_token:{s_id}", f"rt-{s_id}", ex=SESSION_TTL)
+    if indexed:
+        rd.sadd(f"emp_sess:{emp_no}", s_id)
+        rd.sadd(f"card_sess:{pubkey}", s_id)
+
+def session_exists(rd, s_id:str)->bool:
+    return rd.exists(f"sess_pub:{s_id}", f"sess_claims:{s_id}", f"refresh_token:{s_id}") > 0
+
+def test_revoke_employee_sessions(rd, db):
+    open_session(rd, "s1", "E001", "04aa")
+    open_session(rd, "s2", "E001", "04aa")
+    open_session(rd, "s3", "E002", "04bb")
+
+    assert revoke_employee_sessions("E001", db) == 2
+
+    assert not session_exists(rd, "s1") and not session_exists(rd, "s2")
+    assert rd.exists("emp_sess:E001", "card_sess:04aa", "pub_sess:04aa") == 0
+    assert session_exists(rd, "s3")
+    assert rd.get("pub_sess:04bb") == b"s3"
+    assert revoke_employee_sessions("E001", db) == 0
+
+def test_revoke_employee_sessions_opened_before_the_index(rd, db):
+    open_session(rd, "s1", "E001", "04aa", indexed=False)
+    assert revoke_employee_sessions("E001", db) == 1
+    assert not session_exists(rd, "s1")
+
+def test_revoke_card_sessions_keeps_the_other_cards(rd):
+    open_session(rd, "s1", "E001", "04aa")
+    open_session(rd, "s2", "E001", "04cc")
+
+    assert revoke_card_sessions("04aa") == 1
+
+    assert not session_exists(rd, "s1")
+    assert session_exists(rd, "s2")
+    assert rd.smembers("emp_sess:E001") == {b"s2"}
+    assert rd.get("pub_sess:04cc") == b"s2"
+
+def failing_revoke(*args, **kwargs):
+    raise redis.ConnectionError("Redis is down")
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(session_router)
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[current_user_info] = lambda: {"id" : "admin"}
+    return TestClient(app)
+
+def test_revoke_endpoints(rd, client):
+    open_session(rd, "s1", "E001", "04aa")
+    response = client.post("/api/revoke/card", json={"pubkey" : "04aa"})
+    assert response.status_code == 200
+    assert response.json()["revoked"] == 1
+    assert client.post("/api/revoke/employee", json={"emp_no" : "E999"}).status_code == 404
+
+def test_revoke_endpoints_answer_503_when_redis_fails(client, monkeypatch):
+    monkeypatch.setattr(session_api, "revoke_employee_sessions", failing_revoke)
+    monkeypatch.setattr(session_api, "revoke_card_sessions", failing_revoke)
+    assert client.post("/api/revoke/employee", json={"emp_no" : "E001"}).status_code == 503
+    assert client.post("/api/revoke/card", json={"pubkey" : "04aa"}).status_code == 503
+
+def test_card_replacement_revokes_the_old_card_sessions(rd, db):
+    open_session(rd, "s1", "E001", "04aa")
+    response = manage_card(ManageCard(emp_no="E001", pubkey="04dd", existing=True), db, {"id" : "admin"})
+    assert "warning" not in response
+    assert not session_exists(rd, "s1")
+
+def test_card_replacement_succeeds_with_a_warning_when_redis_fails(rd, db, monkeypatch):
+    monkeypatch.setattr(manage_card_module, "revoke_card_sessions", failing_revoke)
+    response = manage_card(ManageCard(emp_no="E001", pubkey="04dd", existing=True), db, {"id" : "admin"})
+    assert "warning" in response
+    assert db.query(Pubkey).filter(Pubkey.emp_no == "E001").one().pubkey == "04dd"
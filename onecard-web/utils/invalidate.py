@@ -0,0 +1,16 @@
+from core.redis import redis_config
+import logging
+import redis
+
+rd = redis_config()
+
+def publish_invalidation(channel:str, message:str):
+    """
+    Notify onecard-api workers that a cached record changed.
+    A publish failure is logged but does not fail the admin request: the DB change is already committed
+    and onecard-api caches also expire on their own.
+    """
+    try:
+        rd.publish(channel, message)
+    except redis.RedisError as e:
+        logging.warning(f"Failed to publish invalidation on {channel}:{e}")
@@ -0,0 +1,147 @@
+"""
+Per-service blocklist materialized in Redis for onecard-api login checks
+- perm_block:{client_id} : set of blocked emp_no plus the READY member, which marks the set as complete
+- perm_block_gen:{client_id} : generation counter, incremented by every change and drop of the set
+onecard-api only trusts a set that contains READY, and falls back to the permission table otherwise.
+Every write here either updates a complete set or rebuilds it from Postgres, so a partial set never carries READY.
+A rebuild reads the generation before its Postgres snapshot and is written only if the generation is unchanged,
+so a snapshot taken before a concurrent change can never overwrite the set that change updated.
+
+Rebuild command (run from onecard-web, e.g. after a Redis flush or a failed sync):
+    python -m utils.perm_blocklist                  # every service
+    python -m utils.perm_blocklist <client_id> ...  # selected services
+"""
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Iterable, Optional
+from core.redis import redis_config
+from models.service import Services
+from models.permission import permission_table
+from utils.redis_const import REDIS_PERM_BLOCK_PREFIX, PERM_BLOCK_READY_MEMBER, REDIS_PERM_BLOCK_GEN_PREFIX
+import logging
+import redis
+
+rd = redis_config()
+
+PERM_BLOCK_GEN_TTL = 86400 # Seconds a generation counter outlives the last change, far longer than any rebuild
+REBUILD_ATTEMPTS = 3 # Rebuilds refused because of concurrent changes before the set is dropped
+
+# Count the change, then apply it only to a complete set. Returns 0 when the set is missing and must be rebuilt
+# KEYS[1]: perm_block:{client_id}, KEYS[2]: perm_block_gen:{client_id}
+# ARGV[1]: READY member, ARGV[2]: SADD or SREM, ARGV[3]: generation TTL, ARGV[4..]: emp_no
+_UPDATE_IF_READY_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+for i = 4, #ARGV do
+    redis.call(ARGV[2], KEYS[1], ARGV[i])
+end
+return 1
+"""
+_update_if_ready = rd.register_script(_UPDATE_IF_READY_SCRIPT)
+
+# Replace the set with a Postgres snapshot unless the generation moved since the snapshot was taken
+# KEYS[1]: perm_block:{client_id}, KEYS[2]: perm_block_gen:{client_id}
+# ARGV[1]: generation read before the snapshot, ARGV[2]: READY member, ARGV[3..]: blocked emp_no
+# Returns 1 when written, 0 when refused
+_REBUILD_IF_CURRENT_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 2, #ARGV, 1000 do
+    redis.call('SADD', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+return 1
+"""
+_rebuild_if_current = rd.register_script(_REBUILD_IF_CURRENT_SCRIPT)
+
+def _blocklist_key(client_id:str)->str:
+    return f"{REDIS_PERM_BLOCK_PREFIX}{client_id}"
+
+def _generation_key(client_id:str)->str:
+    return f"{REDIS_PERM_BLOCK_GEN_PREFIX}{client_id}"
+
+def rebuild_blocklist(service:Services, db:Session)->Optional[int]:
+    """
+    Replace perm_block:{client_id} with the blocked employees currently stored in Postgres.
+    A rebuild overtaken by a concurrent change is retried with a new snapshot, REBUILD_ATTEMPTS times at most,
+    then the set is dropped so onecard-api reads the permission table until the next rebuild
+    Returns:
+    - int: number of blocked employees, or None if the set was dropped
+    """
+    key = _blocklist_key(service.client_id)
+    generation_key = _generation_key(service.client_id)
+    for _ in range(REBUILD_ATTEMPTS):
+        generation = rd.get(generation_key) or b"0"
+        emp_nos = db.execute(
+            select(permission_table.c.emp_no).where(permission_table.c.service_id == service.id)
+        ).scalars().all()
+        if _rebuild_if_current(keys=[key, generation_key], args=[generation, PERM_BLOCK_READY_MEMBER, *emp_nos]):
+            return len(emp_nos)
+    logging.warning(f"Blocklist of {service.client_id} kept changing during the rebuild, dropped it")
+    drop_blocklist(service.client_id)
+    return None
+
+def _sync(service:Services, db:Session, command:str, emp_nos:Iterable[str]):
+    """
+    Called after the permission change is committed.
+    On a Redis failure the set is dropped, so onecard-api reads the permission table instead of a stale set
+    """
+    key = _blocklist_key(service.client_id)
+    try:
+        if not _update_if_ready(keys=[key, _generation_key(service.client_id)],
+                                args=[PERM_BLOCK_READY_MEMBER, command, PERM_BLOCK_GEN_TTL, *emp_nos]):
+            rebuild_blocklist(service, db)
+    except redis.RedisError as e:
+        logging.error(f"Failed to sync blocklist of {service.client_id}:{e}")
+        drop_blocklist(service.client_id)
+
+def init_blocklist(service:Services, db:Session):
+    """
+    Materialize the set of a newly created service, so its logins never need the permission table
+    """
+    _sync(service, db, "SADD", [])
+
+def add_blocked(service:Services, db:Session, emp_nos:Iterable[str]):
+    _sync(service, db, "SADD", emp_nos)
+
+def remove_blocked(service:Services, db:Session, emp_nos:Iterable[str]):
+    _sync(service, db, "SREM", emp_nos)
+
+def drop_blocklist(client_id:str):
+    """
+    Delete the set and move its generation, so a rebuild still in flight cannot write it back
+    """
+    try:
+        pipe = rd.pipeline(transaction=True)
+        pipe.delete(_blocklist_key(client_id))
+        pipe.incr(_generation_key(client_id))
+        pipe.expire(_generation_key(client_id), PERM_BLOCK_GEN_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        logging.error(f"Failed to drop blocklist of {client_id}, run the rebuild command:{e}")
+
+if __name__ == "__main__":
+    import argparse
+    from core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild Redis blocklist sets from the permission table")
+    parser.add_argument("client_ids", nargs="*", help="client_id of the services to rebuild (default: all)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(Services)
+        if args.client_ids:
+            query = query.filter(Services.client_id.in_(args.client_ids))
+        for service in query.all():
+            count = rebuild_blocklist(service, db)
+            if count is None:
+                print(f"Dropped {_blocklist_key(service.client_id)}: changed during the rebuild, run it again")
+            else:
+                print(f"Rebuilt {_blocklist_key(service.client_id)}: {count} blocked employees")
+    finally:
+        db.close()
@@ -0,0 +1,18 @@
+"""
+Redis Pub/Sub Channels shared with onecard-api
+"""
+REDIS_PUBKEY_INVALIDATE_CHANNEL = "pubkey_invalidate"   # Replaced card public key (hex). onecard-api drops its parsed key
+REDIS_CLIENT_INVALIDATE_CHANNEL = "client_invalidate"   # client_id of a created/edited/removed service. onecard-api reloads it
+
+"""
+Redis Key Prefix shared with onecard-api
+"""
+REDIS_PERM_BLOCK_PREFIX = "perm_block:"                 # Set of emp_no blocked from a service, keyed by client_id
+PERM_BLOCK_READY_MEMBER = "__ready__"                   # Member present only in a completely built blocklist set
+REDIS_PERM_BLOCK_GEN_PREFIX = "perm_block_gen:"         # Change counter of a blocklist set. A rebuild is written only if no change happened meanwhile
+REDIS_SESSION_PUB_MAP_PREFIX = "sess_pub:"              # s_id -> card public key of an OAuth session
+REDIS_PUB_SESSION_MAP_PREFIX = "pub_sess:"              # card public key -> latest s_id
+REDIS_SESSION_CLAIMS_PREFIX = "sess_claims:"            # Hash of the session user's claims (sub, name, email)
+REDIS_REFRESH_TOKEN_PREFIX = "refresh_token:"           # Refresh token of a session, keyed by s_id
+REDIS_EMPLOYEE_SESSIONS_PREFIX = "emp_sess:"            # Set of s_id opened by an employee, keyed by emp_no
+REDIS_CARD_SESSIONS_PREFIX = "card_sess:"               # Set of s_id opened with a card, keyed by public key
@@ -0,0 +1,101 @@
+"""
+Bulk revocation of onecard-api OAuth sessions
+onecard-api indexes every session it opens in two Redis sets
+- emp_sess:{emp_no} : s_id opened by the employee
+- card_sess:{pubkey} : s_id opened with the card
+Revoking deletes, for every indexed s_id, the session mapping, the cached claims and the refresh token,
+so the refresh grant and /userinfo fail right away. Issued access tokens stay valid until they expire.
+"""
+from sqlalchemy.orm import Session
+from typing import Iterable, List
+from core.redis import redis_config
+from models.pubkey import Pubkey
+from utils.redis_const import (
+    REDIS_SESSION_PUB_MAP_PREFIX,
+    REDIS_PUB_SESSION_MAP_PREFIX,
+    REDIS_SESSION_CLAIMS_PREFIX,
+    REDIS_REFRESH_TOKEN_PREFIX,
+    REDIS_EMPLOYEE_SESSIONS_PREFIX,
+    REDIS_CARD_SESSIONS_PREFIX
+)
+import logging
+
+rd = redis_config()
+
+# Revoke every session found in the index sets, atomically and in one round trip
+# KEYS: emp_sess / card_sess index sets
+# ARGV[1..6]: sess_pub, pub_sess, sess_claims, refresh_token, emp_sess, card_sess prefixes
+# ARGV[7..]: card public keys whose pub_sess session is revoked too (sessions opened before the index existed)
+# Returns the number of revoked sessions
+_REVOKE_SESSIONS_SCRIPT = """
+local s_ids = {}
+for _, key in ipairs(KEYS) do
+    for _, s_id in ipairs(redis.call('SMEMBERS', key)) do
+        s_ids[s_id] = true
+    end
+end
+for i = 7, #ARGV do
+    local s_id = redis.call('GET', ARGV[2] .. ARGV[i])
+    if s_id then
+        s_ids[s_id] = true
+    end
+end
+local revoked = 0
+for s_id in pairs(s_ids) do
+    local pubkey = redis.call('GET', ARGV[1] .. s_id)
+    local sub = redis.call('HGET', ARGV[3] .. s_id, 'sub')
+    if redis.call('DEL', ARGV[1] .. s_id, ARGV[3] .. s_id, ARGV[4] .. s_id) > 0 then
+        revoked = revoked + 1
+    end
+    if pubkey then
+        if redis.call('GET', ARGV[2] .. pubkey) == s_id then
+            redis.call('DEL', ARGV[2] .. pubkey)
+        end
+        redis.call('SREM', ARGV[6] .. pubkey, s_id)
+    end
+    if sub then
+        redis.call('SREM', ARGV[5] .. sub, s_id)
+    end
+end
+redis.call('DEL', unpack(KEYS))
+return revoked
+"""
+_revoke_sessions = rd.register_script(_REVOKE_SESSIONS_SCRIPT)
+
+_PREFIX_ARGS = [REDIS_SESSION_PUB_MAP_PREFIX,
+                REDIS_PUB_SESSION_MAP_PREFIX,
+                REDIS_SESSION_CLAIMS_PREFIX,
+                REDIS_REFRESH_TOKEN_PREFIX,
+                REDIS_EMPLOYEE_SESSIONS_PREFIX,
+                REDIS_CARD_SESSIONS_PREFIX]
+
+def _revoke(index_keys:List[str], pubkeys:Iterable[str])->int:
+    return int(_revoke_sessions(keys=index_keys, args=_PREFIX_ARGS + list(pubkeys)))
+
+def revoke_card_sessions(pubkey:str)->int:
+    """
+    Revoke every session opened with a card (lost or replaced card)
+    Args:
+    - pubkey: Card public key (hex)
+    Returns:
+    - int: number of revoked sessions
+    """
+    revoked = _revoke([f"{REDIS_CARD_SESSIONS_PREFIX}{pubkey}"], [pubkey])
+    logging.info(f"Revoked {revoked} session(s) of card {pubkey[:16]}")
+    return revoked
+
+def revoke_employee_sessions(emp_no:str, db:Session)->int:
+    """
+    Revoke every session of an employee, whichever card opened it (offboarding)
+    Args:
+    - emp_no: Employee number
+    - db: Used to find the employee's cards
+    Returns:
+    - int: number of revoked sessions
+    """
+    pubkeys = [row.pubkey for row in db.query(Pubkey.pubkey).filter(Pubkey.emp_no == emp_no)]
+    index_keys = [f"{REDIS_EMPLOYEE_SESSIONS_PREFIX}{emp_no}"]
+    index_keys += [f"{REDIS_CARD_SESSIONS_PREFIX}{pubkey}" for pubkey in pubkeys]
+    revoked = _revoke(index_keys, pubkeys)
+    logging.info(f"Revoked {revoked} session(s) of emp_no:{emp_no}")
+    return revoked